@@ -2,6 +2,16 @@ from permutation import *
 from fields import *
 from matrix import *
 from isomorphism import *
+from tablecache import *
+from arraymatrix import *
+from permgroup import *
+from closure import *
+from lineargroup import *
+from elimination import *
+from binarymatrix import *
+from parallel import *
+from polynomial import *
+from fieldkernels import *
 import sys
 import random
 
@@ -11,6 +21,16 @@ matrix_vector_tests()
 permutation_tests()
 field_tests()
 isomorphism_tests()
+table_cache_tests()
+array_matrix_tests()
+permutation_group_tests()
+closure_tests()
+linear_group_tests()
+elimination_tests()
+binary_matrix_tests()
+parallel_tests()
+polynomial_tests()
+field_array_tests()
 print "Checks completed.\n"
 
 
@@ -33,9 +53,7 @@ while True:
         continue
 
     poly = cls.irreducible_poly
-    field_member = cls("0")
-    field_member.coefficients = poly
-    print "Irreducible polynomial used for the selected field is", unicode(field_member), "."
+    print "Irreducible polynomial used for the selected field is", FiniteField.coefficients_string(poly), "."
 
     a_string = raw_input("\nSpecify first field member in standard polynomial order. Use smallest positive integer for coefficients (e.g. x^2 + 1).\n> a = ")
     b_string = raw_input("\nSpecify second field member in standard polynomial order. Use smallest positive integer for coefficients (e.g. x^2 + 1).\n> b = ")
@@ -77,7 +95,7 @@ while True:
     a4_str = raw_input(CURSOR_UP_ONE + ERASE_LINE + "> a = [[" + a1_str + ", " + a2_str + "], [" + a3_str + ", ")
     print CURSOR_UP_ONE + ERASE_LINE + "> a = [[" + a1_str + ", " + a2_str + "], [" + a3_str + ", " + a4_str + "]]\n"
 
-    a = Matrix.from_list([[cls(a1_str), cls(a2_str)], [cls(a3_str), cls(a4_str)]])
+    a = Matrix.from_strings(cls, [[a1_str, a2_str], [a3_str, a4_str]])
 
     print("\nSpecify second matrix entry by entry, in reading order. Use field-specifying rules from before.")
     b1_str = raw_input("> b = [[")
@@ -86,7 +104,7 @@ while True:
     b4_str = raw_input(CURSOR_UP_ONE + ERASE_LINE + "> b = [[" + b1_str + ", " + b2_str + "], [" + b3_str + ", ")
     print CURSOR_UP_ONE + ERASE_LINE + "> b = [[" + b1_str + ", " + b2_str + "], [" + b3_str + ", " + b4_str + "]]\n"
 
-    b = Matrix.from_list([[cls(b1_str), cls(b2_str)], [cls(b3_str), cls(b4_str)]])
+    b = Matrix.from_strings(cls, [[b1_str, b2_str], [b3_str, b4_str]])
 
     print "a * b =", unicode(a * b)
 
@@ -110,7 +128,7 @@ while True:
 
 print "EXPLORATORY PROBLEMS 3: #12 - MATRIX ISOMORPHISMS (Matrix -> Permutation)"
 while True:
-    field_string = raw_input("Enter in a field name: either F4 or F5, *OR leave empty* to move on to the next question.\n> ")
+    field_string = raw_input("Enter in a field name e.g. F4 or F5, *OR leave empty* to move on to the next question.\n> ")
     if not field_string: break
 
     # Get class
@@ -131,25 +149,13 @@ while True:
     a4_str = raw_input(CURSOR_UP_ONE + ERASE_LINE + "> m = [[" + a1_str + ", " + a2_str + "], [" + a3_str + ", ")
     print CURSOR_UP_ONE + ERASE_LINE + "> m = [[" + a1_str + ", " + a2_str + "], [" + a3_str + ", " + a4_str + "]]\n"
 
-    a1 = cls(a1_str)
-    a2 = cls(a2_str)
-    a3 = cls(a3_str)
-    a4 = cls(a4_str)
-    if (a1 * a4) + (a2 * a3) * cls("-1") != cls.mult_id():
+    a = Matrix.from_strings(cls, [[a1_str, a2_str], [a3_str, a4_str]])
+    if a.det() != cls.mult_id():
         print "Determinant is not 1!"
         print ""
         continue
 
-    a = Matrix.from_list([[a1, a2], [a3, a4]])
-
-    lines = None
-    if field_string == "F4":
-        lines = lines_f4
-    elif field_string == "F5" or field_string == "Z5": 
-        lines = lines_f5
-    else:
-        print "Fields other than F4 or F5 don't have lines loaded in to check for a permutation."
-        continue
+    lines = projective_line(cls)
 
     print "m corresponds to permutation:", unicode(matrix_to_permutation(a, lines))
     print "0 is the lowest symbol. These lines are being used:"
@@ -159,7 +165,7 @@ while True:
 
 print "EXPLORATORY PROBLEMS 3: #12 - MATRIX ISOMORPHISMS (Demonstrate isomorphism)"
 while True:
-    field_string = raw_input("Enter in a field name: either F4 or F5, *OR leave empty* to move on to the next question.\n> ")
+    field_string = raw_input("Enter in a field name e.g. F4 or F5, *OR leave empty* to move on to the next question.\n> ")
     if not field_string: break
 
     # Get class
@@ -171,58 +177,19 @@ while True:
         continue
     print ""
 
-    lines = None
-    if field_string == "F4":
-        lines = lines_f4
-    elif field_string == "F5" or field_string == "Z5": 
-        lines = lines_f5
-    else:
-        print "Fields other than F4 or F5 don't have lines loaded in to check for a permutation."
-        continue
+    lines = projective_line(cls)
 
     print "Finding two random members of SL(2,", field_string + ")..."
 
-    # Find all members
-    all_members = []
-    for member in cls.all_values():
-        all_members.append(member)
-
-    a1 = None
-    a2 = None
-    a3 = None
-    a4 = None
-
-    # Find at random
-    while (True):
-        a1 = random.choice(all_members)
-        a2 = random.choice(all_members)
-        a3 = random.choice(all_members)
-        a4 = random.choice(all_members)
-
-        if (a1 * a4) + (a2 * a3) * cls("-1") == cls.mult_id(): break
-
-    a = Matrix.from_list([[a1, a2], [a3, a4]])
+    group = SpecialLinearGroup(cls)
+    a = group.random_element()
     print "Selected matrix a:", unicode(a),
 
     p_a = matrix_to_permutation(a, lines)
     print "Corresponding permutation:", unicode(p_a)
 
 
-    b1 = None
-    b2 = None
-    b3 = None
-    b4 = None
-
-    # Find at random
-    while (True):
-        b1 = random.choice(all_members)
-        b2 = random.choice(all_members)
-        b3 = random.choice(all_members)
-        b4 = random.choice(all_members)
-
-        if (b1 * b4) + (b2 * b3) * cls("-1") == cls.mult_id(): break
-
-    b = Matrix.from_list([[b1, b2], [b3, b4]])
+    b = group.random_element()
     print "Selected matrix b:", unicode(b),
 
     p_b = matrix_to_permutation(b, lines)
@@ -0,0 +1,294 @@
+from fields import *
+from matrix import *
+from fieldkernels import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# A vector whose entries are kept in a NumPy array
+class ArrayVector(Vector):
+    __slots__ = ("field", "array")
+
+    def __init__(self, field, array):
+        if np == None:
+            raise ImportError("ArrayVector needs numpy")
+        self.field = field
+        self.array = array
+
+    # The field is pickled as the arguments that make it
+    def __getstate__(self):
+        return (field_recipe(self.field), self.array)
+
+    def __setstate__(self, state):
+        recipe, self.array = state
+        self.field = field_from_recipe(recipe)
+
+    @staticmethod
+    def from_vector(vector, field=None):
+        field = field or type(vector[0])
+        return ArrayVector(field, to_array(field, vector.list_form))
+
+    # Members are only made when asked for
+    @property
+    def list_form(self):
+        return from_array(self.field, self.array)
+
+    def __add__(self, other):
+        other = other if isinstance(other, ArrayVector) else ArrayVector.from_vector(other, self.field)
+        return ArrayVector(self.field, field_add(self.field, self.array, other.array))
+
+    def __mul__(self, other):
+        if isinstance(other, Vector):
+            raise TypeError("Vector multiplication is ambiguous")
+        scalar = to_array(self.field, [other])[0]
+        return ArrayVector(self.field, field_mul(self.field, self.array, scalar))
+
+    def __eq__(self, other):
+        if isinstance(other, ArrayVector):
+            return self.field == other.field and np.array_equal(self.array, other.array)
+        if isinstance(other, Vector):
+            return self.list_form == other.list_form
+        return False
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        return from_array(self.field, [self.array[index]])[0]
+
+    def __setitem__(self, index, val):
+        self.array[index] = to_array(self.field, [val])[0]
+
+
+# A matrix whose entries are kept in a 2D NumPy array (row, column), so that
+# products are done with vectorised modular arithmetic instead of per-entry calls
+class ArrayMatrix(Matrix):
+    __slots__ = ("field", "array")
+
+    def __init__(self, field, array):
+        if np == None:
+            raise ImportError("ArrayMatrix needs numpy")
+        self.field = field
+        self.array = array
+
+    def __getstate__(self):
+        return (field_recipe(self.field), self.array)
+
+    def __setstate__(self, state):
+        recipe, self.array = state
+        self.field = field_from_recipe(recipe)
+
+    @staticmethod
+    def from_matrix(matrix, field=None):
+        if isinstance(matrix, ArrayMatrix):
+            return matrix
+        field = field or matrix.get_field()
+        array = np.array([to_array(field, row) for row in matrix.rows()])
+        return ArrayMatrix(field, array.reshape(matrix.height(), matrix.width()))
+
+    @staticmethod
+    def from_list(list2D, field=None):
+        return ArrayMatrix.from_matrix(Matrix.from_list(list2D), field)
+
+    # Converts back to a list-based matrix
+    def to_matrix(self):
+        return Matrix.from_list([from_array(self.field, row) for row in self.array])
+
+    # Columns are only made when asked for
+    @property
+    def vector_list(self):
+        return tuple(self.get_column(c) for c in xrange(self.width()))
+
+    def width(self):
+        return self.array.shape[1]
+    def height(self):
+        return self.array.shape[0]
+
+    # Rows, columns and blocks are NumPy views of the same array
+    def get_row(self, i):
+        return ArrayVector(self.field, self.array[i])
+
+    def get_column(self, j):
+        return ArrayVector(self.field, self.array[:, j])
+
+    def submatrix(self, top, left, height, width):
+        if top < 0 or left < 0 or top + height > self.height() or left + width > self.width():
+            raise IndexError("Submatrix out of range")
+        return ArrayMatrix(self.field, self.array[top:top + height, left:left + width])
+
+    def rows(self):
+        return [from_array(self.field, row) for row in self.array]
+
+    def get_field(self):
+        return self.field
+
+    def __mul__(self, other):
+
+        # Vector multiplication
+        if isinstance(other, Vector):
+            if len(other) != self.width():
+                raise IndexError("Attempting to multiply matrix with a vector of incompatible dimensions.")
+            other = other if isinstance(other, ArrayVector) else ArrayVector.from_vector(other, self.field)
+            column = field_matmul(self.field, self.array, other.array[:, None])
+            return ArrayVector(self.field, column[:, 0])
+
+        # Matrix multiplication
+        elif isinstance(other, Matrix):
+            if other.height() != self.width():
+                raise IndexError("Attempting to multiply matrix with another matrix of incompatible dimensions.")
+            other = ArrayMatrix.from_matrix(other, self.field)
+            return ArrayMatrix(self.field, strassen_matmul(self.field, self.array, other.array))
+
+        # Scalar multiplication
+        else:
+            scalar = to_array(self.field, [other])[0]
+            return ArrayMatrix(self.field, field_mul(self.field, self.array, scalar))
+
+    def __eq__(self, other):
+        if isinstance(other, ArrayMatrix):
+            return self.field == other.field and np.array_equal(self.array, other.array)
+        if isinstance(other, Matrix):
+            return self.vector_list == other.vector_list
+        return False
+
+    def __repr__(self):
+        return "ArrayMatrix.from_list(" + self.__unicode__() + ")"
+
+
+# A stack of matrices of one shape over one field, kept in a single contiguous
+# (count, height, width) array so that they can all be multiplied at once
+class MatrixBatch(object):
+
+    def __init__(self, field, array):
+        super(MatrixBatch, self).__init__()
+        if np == None:
+            raise ImportError("MatrixBatch needs numpy")
+        self.field = field
+        self.array = np.ascontiguousarray(array)
+
+    @staticmethod
+    def from_matrices(matrices, field=None):
+        arrays = [ArrayMatrix.from_matrix(matrix, field) for matrix in matrices]
+        return MatrixBatch(field or arrays[0].field, np.array([matrix.array for matrix in arrays]))
+
+    # List-style access
+    def __len__(self):
+        return self.array.shape[0]
+
+    def __getitem__(self, index):
+        return ArrayMatrix(self.field, self.array[index])
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+    # Multiplies elementwise: the i-th matrix by the other i-th matrix. A batch
+    # of one matrix, or a single matrix, is multiplied against every matrix
+    def __mul__(self, other):
+        if isinstance(other, MatrixBatch):
+            if len(self) != len(other) and len(self) != 1 and len(other) != 1:
+                raise IndexError("Attempting to multiply batches of different lengths.")
+            other_array = other.array
+        elif isinstance(other, Matrix):
+            other_array = ArrayMatrix.from_matrix(other, self.field).array[None]
+        else:
+            raise TypeError("Batches can only be multiplied by batches or matrices")
+
+        if self.array.shape[2] != other_array.shape[1]:
+            raise IndexError("Attempting to multiply matrices of incompatible dimensions.")
+        return MatrixBatch(self.field, field_matmul(self.field, self.array, other_array))
+
+    # Multiplies every matrix by every matrix of another batch. Entry i * len(other) + j
+    # of the result is self[i] * other[j]
+    def all_pairs(self, other=None):
+        other = other if other != None else self
+        products = field_matmul(self.field, self.array[:, None], other.array[None, :])
+        return MatrixBatch(self.field, products.reshape((-1,) + products.shape[2:]))
+
+    # Gets one integer per matrix that identifies its entries
+    def keys(self):
+        if not is_finite(self.field):
+            raise TypeError("Only matrices over finite fields have keys")
+        size = self.field.size()
+        entries = self.array.shape[1] * self.array.shape[2]
+        if size ** entries >= 2 ** 63:
+            raise OverflowError("Matrices are too large to key with one integer")
+        places = size ** np.arange(entries, dtype=np.int64)
+        return np.dot(self.array.reshape(len(self), entries), places)
+
+    # Gets the multiplication table of the batch as indices into the batch:
+    # table[i, j] is the index of self[i] * self[j], or -1 if it is not in the
+    # batch. Rows are computed a block at a time to bound memory
+    def cayley_table(self, block_rows=256):
+        keys = self.keys()
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+
+        count = len(self)
+        table = np.empty((count, count), dtype=np.int64)
+        for start in xrange(0, count, block_rows):
+            block = MatrixBatch(self.field, self.array[start:start + block_rows]).all_pairs(self)
+            product_keys = block.keys()
+            positions = np.searchsorted(sorted_keys, product_keys).clip(0, count - 1)
+            found = sorted_keys[positions] == product_keys
+            table[start:start + block_rows] = np.where(found, order[positions], -1).reshape(-1, count)
+        return table
+
+
+def array_matrix_tests():
+
+    if np == None:
+        return
+
+    import random
+    generator = random.Random(5)
+
+    # Products agree with the list-based matrices over prime and extension fields
+    for field in [F5, F7, F4, F9, F16, F49, GF(101)]:
+        members = list(field.all_values())
+        a = Matrix.from_list([[generator.choice(members) for c in xrange(4)] for r in xrange(3)])
+        b = Matrix.from_list([[generator.choice(members) for c in xrange(2)] for r in xrange(4)])
+        v = Vector([generator.choice(members) for c in xrange(4)])
+        fast_a = ArrayMatrix.from_matrix(a)
+        assert fast_a * b == a * b
+        assert a * b == fast_a * ArrayMatrix.from_matrix(b)
+        assert (fast_a * v).list_form == (a * v).list_form
+        assert (fast_a * members[2]).to_matrix() == a * members[2]
+        assert pickle.loads(pickle.dumps(fast_a)) == fast_a and pickle.loads(pickle.dumps(fast_a * v)) == fast_a * v
+
+    # Strassen-Winograd gives exactly the naive products, with odd sizes peeled
+    state = np.random.RandomState(3)
+    for field in [F7, F9, F16, GF(2, 8), GF(101)]:
+        for m, k, n in [(16, 16, 16), (13, 11, 9), (20, 7, 33)]:
+            a = state.randint(0, field.size(), size=(m, k))
+            b = state.randint(0, field.size(), size=(k, n))
+            assert np.array_equal(strassen_matmul(field, a, b, crossover=2), field_matmul(field, a, b))
+        assert np.array_equal(field_sub(field, a, a), np.zeros_like(a))
+        assert np.array_equal(field_add(field, a, field_neg(field, a)), np.zeros_like(a))
+
+    m1 = ArrayMatrix.from_list([[R(0.5), R(0.3), R(4.5)], [R(2.0), R(-1.5), R(-2.2)]])
+    m2 = ArrayMatrix.from_list([[R(0.7), R(-1.6)], [R(2.2), R(0.0)], [R(0.5), R(1.0)]])
+    assert abs((m1 * m2).vector_list[1][1] - R(-5.4)) < 1e-9
+
+    # Batches agree with multiplying one matrix at a time
+    members = list(F4.all_values())
+    matrices = [Matrix.from_list([[generator.choice(members) for c in xrange(2)] for r in xrange(2)]) for i in xrange(6)]
+    batch = MatrixBatch.from_matrices(matrices)
+    pairs = batch * MatrixBatch.from_matrices(list(reversed(matrices)))
+    for i in xrange(6):
+        assert pairs[i] == matrices[i] * matrices[5 - i]
+        assert (batch * matrices[0])[i] == matrices[i] * matrices[0]
+    products = batch.all_pairs()
+    assert products[2 * 6 + 3] == matrices[2] * matrices[3]
+
+    # The Cayley table of SL(2, 3)
+    members = list(GF(3).all_values())
+    one = GF(3).mult_id()
+    group = [Matrix.from_list([[a, b], [c, d]]) for a in members for b in members for c in members for d in members
+             if a * d - b * c == one]
+    table = MatrixBatch.from_matrices(group).cayley_table(block_rows=5)
+    assert len(group) == 24 and (table >= 0).all()
+    assert group[table[7, 11]] == group[7] * group[11]
+    assert sorted(table[3]) == range(24)
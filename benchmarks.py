@@ -0,0 +1,83 @@
+import sys
+import timeit
+from permutation import *
+from fields import *
+from matrix import *
+from fieldkernels import *
+
+# Bytes taken by an object and its attribute dictionary, if it has one
+def instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+# The same attributes as a slotted object, held in an attribute dictionary the
+# way they were before the classes had __slots__. Used as the "before" side of
+# the memory and attribute benchmarks
+class Unslotted(object):
+
+    def __init__(self, sample):
+        super(Unslotted, self).__init__()
+        for cls in type(sample).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if hasattr(sample, name):
+                    setattr(self, name, getattr(sample, name))
+
+# Bytes per instance of the classes that are made in the largest numbers, with
+# their slots and with an attribute dictionary instead
+def memory_benchmark():
+    samples = [
+        ("FiniteField", F16.make_member(3)),
+        ("PackedFiniteField", F16.packed().make_member(3)),
+        ("LogFiniteField", F16.logarithmic().make_member(3)),
+        ("Vector", Vector([])),
+        ("Matrix", Matrix.from_list([])),
+        ("ChainedSymbol", ChainedSymbol("a")),
+    ]
+    return [(name, instance_size(sample), instance_size(Unslotted(sample))) for name, sample in samples]
+
+# Seconds for a million reads of the most used attributes, with slots and with
+# an attribute dictionary instead
+def attribute_benchmark(number=10 ** 6):
+    setup = "from benchmarks import F16, Vector, Matrix, ChainedSymbol, Unslotted; member = F16('x + 1'); " \
+            "vector = Vector([member]); matrix = Matrix.from_list([[member]]); symbol = ChainedSymbol('a'); " \
+            "samples = [member, vector, matrix, symbol]; slotted = dict(zip(['member', 'vector', 'matrix', 'symbol'], samples)); " \
+            "unslotted = dict((name, Unslotted(sample)) for name, sample in slotted.items())"
+    statements = ["member.value", "member.coefficients", "vector.list_form", "matrix.buffer", "symbol.next"]
+    results = []
+    for statement in statements:
+        name = statement.split(".")[0]
+        times = [min(timeit.repeat(statement, setup + "; " + name + " = " + side + "['" + name + "']", repeat=3, number=number))
+                 for side in ["slotted", "unslotted"]]
+        results.append((statement, times[0], times[1]))
+    return results
+
+# Seconds for a hundred thousand members made from polynomial strings, without
+# and with the parse cache
+def parse_benchmark(number=10 ** 5):
+    setup = "from benchmarks import GF; F256 = GF(2, 8)"
+    uncached = min(timeit.repeat("F256.parse_coefficients('x^7 + x^3 + 1')", setup, repeat=3, number=number))
+    cached = min(timeit.repeat("F256('x^7 + x^3 + 1')", setup, repeat=3, number=number))
+    return [("parse", uncached), ("cached", cached)]
+
+# Seconds for a dot product and a sum of two 10000 entry vectors over F256,
+# member by member and through FieldArray
+def field_array_benchmark(length=10000, number=20):
+    setup = "from benchmarks import GF, Vector, FieldArray; F256 = GF(2, 8); members = list(F256.all_values()); " \
+            "a = [members[(i * 7) % 256] for i in xrange(" + str(length) + ")]; b = a[::-1]; " \
+            "fa = FieldArray.from_members(F256, a); fb = FieldArray.from_members(F256, b)"
+    statements = [("dot", "total = F256('0')\nfor x, y in zip(a, b): total += x * y"), ("dot array", "fa.dot(fb)"),
+                  ("add", "[x + y for x, y in zip(a, b)]"), ("add array", "fa + fb")]
+    return [(name, min(timeit.repeat(statement, setup, repeat=3, number=number)) / number) for name, statement in statements]
+
+
+if __name__ == "__main__":
+    for name, slotted, unslotted in memory_benchmark():
+        print name, slotted, "bytes, without slots", unslotted, "bytes"
+    for statement, slotted, unslotted in attribute_benchmark():
+        print statement, "%.3f" % slotted, "s, without slots", "%.3f" % unslotted, "s"
+    for name, seconds in parse_benchmark():
+        print name, "%.3f" % seconds, "s"
+    for name, seconds in field_array_benchmark():
+        print name, "%.5f" % seconds, "s"
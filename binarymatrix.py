@@ -0,0 +1,396 @@
+import random
+from fields import *
+from matrix import *
+
+# Counts the set bits of an integer
+def popcount(value):
+    return bin(value).count('1')
+
+# Picks how many rows go in each Four Russians table: about log2 of the
+# matrix size, so a table costs no more than one pass over the rows
+def table_bits(n):
+    bits = 1
+    while bits < 8 and (1 << (bits + 1)) <= n:
+        bits += 1
+    return bits
+
+# Makes the table of the XOR of every subset of some rows. Entry i is the XOR
+# of the rows whose bits are set in i, and each entry takes one XOR
+def combination_table(rows):
+    table = [0] * (1 << len(rows))
+    for index in xrange(1, len(table)):
+        low = index & -index
+        table[index] = table[index ^ low] ^ rows[low.bit_length() - 1]
+    return table
+
+
+# A matrix over GF(2) whose rows are packed into integers, with entry (r, c) in
+# bit c of row r. Adding rows is one XOR of two integers, done in C: rows of up
+# to 63 bits are plain ints and take one machine XOR, and wider rows are longs,
+# which CPython stores and XORs in 30-bit digits. Multiplication and
+# elimination use the Method of Four Russians: a few rows at a time are
+# combined in every possible way once, and then each row needs one lookup and
+# one XOR per group of rows
+class BinaryMatrix(object):
+
+    def __init__(self, rows, width):
+        super(BinaryMatrix, self).__init__()
+        self.rows = rows
+        self.columns = width
+
+    @staticmethod
+    def zeros(height, width):
+        return BinaryMatrix([0] * height, width)
+
+    @staticmethod
+    def identity(n):
+        return BinaryMatrix([1 << r for r in xrange(n)], n)
+
+    @staticmethod
+    def random(height, width, generator=random):
+        return BinaryMatrix([generator.getrandbits(width) if width else 0 for r in xrange(height)], width)
+
+    # Makes a binary matrix from lists of 0/1 entries, or from a Matrix over F2
+    @staticmethod
+    def from_list(list2D):
+        height = len(list2D)
+        width = len(list2D[0]) if height != 0 else 0
+        rows = [sum(1 << c for c, entry in enumerate(row) if int(entry)) for row in list2D]
+        return BinaryMatrix(rows, width)
+
+    @staticmethod
+    def from_matrix(matrix):
+        field = matrix.get_field()
+        if not issubclass(field, FiniteField) or field.size() != 2:
+            raise TypeError("Binary matrices need entries in F2")
+        return BinaryMatrix.from_list([[hash(entry) for entry in row] for row in matrix.rows()])
+
+    def to_list(self):
+        return [[(row >> c) & 1 for c in xrange(self.columns)] for row in self.rows]
+
+    def to_matrix(self, field=F2):
+        return Matrix.from_list([[field.from_int(entry) for entry in row] for row in self.to_list()])
+
+    # Determines dimensions
+    def width(self):
+        return self.columns
+    def height(self):
+        return len(self.rows)
+
+    def __getitem__(self, index):
+        r, c = index
+        return (self.rows[r] >> c) & 1
+
+    def __setitem__(self, index, value):
+        r, c = index
+        self.rows[r] = (self.rows[r] | (1 << c)) if value else (self.rows[r] & ~(1 << c))
+
+    def copy(self):
+        return BinaryMatrix(list(self.rows), self.columns)
+
+    def transpose(self):
+        result = BinaryMatrix.zeros(self.columns, self.height())
+        for r, row in enumerate(self.rows):
+            bit = 1 << r
+            while row:
+                low = row & -row
+                result.rows[low.bit_length() - 1] |= bit
+                row ^= low
+        return result
+
+    def __add__(self, other):
+        if self.height() != other.height() or self.width() != other.width():
+            raise IndexError("Attempting to add matrices of different dimensions.")
+        return BinaryMatrix([a ^ b for a, b in zip(self.rows, other.rows)], self.columns)
+
+    # Multiply by another binary matrix (Four Russians), by a vector packed
+    # into an integer, or by a bit-sliced vector one slice at a time
+    def __mul__(self, other):
+
+        if isinstance(other, BinaryMatrix):
+            if other.height() != self.width():
+                raise IndexError("Attempting to multiply matrix with another matrix of incompatible dimensions.")
+            return BinaryMatrix(self.multiply_rows(other.rows), other.columns)
+
+        if isinstance(other, BitSlicedVector):
+            if len(other) != self.width():
+                raise IndexError("Attempting to multiply matrix with a vector of incompatible dimensions.")
+            return BitSlicedVector(other.field, [self.apply(bits) for bits in other.slices], self.height())
+
+        return self.apply(other)
+
+    # Computes self * B, for B given as a list of packed rows. Each group of
+    # rows of B is turned into a table, then every row of self picks its entry
+    def multiply_rows(self, other_rows, bits=None):
+        bits = bits or table_bits(len(other_rows))
+        result = [0] * self.height()
+        mask = (1 << bits) - 1
+        for start in xrange(0, len(other_rows), bits):
+            table = combination_table(other_rows[start:start + bits])
+            for r, row in enumerate(self.rows):
+                index = (row >> start) & mask
+                if index:
+                    result[r] ^= table[index]
+        return result
+
+    # Multiplies by a column vector packed into an integer
+    def apply(self, vector):
+        result = 0
+        for r, row in enumerate(self.rows):
+            if popcount(row & vector) & 1:
+                result |= 1 << r
+        return result
+
+    # Brings the matrix to row echelon form in place, looking for pivots in the
+    # first `columns` columns (all of them by default). Up to `bits` pivots are
+    # found at a time and reduced against each other, and then one table of
+    # their combinations clears those columns from every other row. With
+    # reduced, rows above the pivots are cleared too. Returns the pivot columns
+    def eliminate(self, reduced=False, columns=None, bits=None):
+        columns = self.columns if columns == None else columns
+        bits = bits or table_bits(self.height())
+        rows = self.rows
+        height = self.height()
+        pivots = []
+
+        row = 0
+        column = 0
+        while column < columns and row < height:
+
+            # Find up to `bits` pivots, reducing each candidate row by the
+            # pivots already found in this group before looking at it
+            group = []
+            while column < columns and len(group) < bits and row + len(group) < height:
+                bit = 1 << column
+                for candidate in xrange(row + len(group), height):
+                    value = rows[candidate]
+                    for pivot_row, pivot_column in group:
+                        if (value >> pivot_column) & 1:
+                            value ^= rows[pivot_row]
+                    rows[candidate] = value
+                    if value & bit:
+                        target = row + len(group)
+                        rows[candidate], rows[target] = rows[target], rows[candidate]
+                        group.append((target, column))
+                        break
+                column += 1
+            if not group:
+                break
+
+            # Make the pivot rows the identity on the pivot columns
+            for index in xrange(len(group) - 1, -1, -1):
+                pivot_row, pivot_column = group[index]
+                for other_row, other_column in group[:index]:
+                    if (rows[other_row] >> pivot_column) & 1:
+                        rows[other_row] ^= rows[pivot_row]
+
+            # Clear the pivot columns from every other row with one table
+            table = combination_table([rows[pivot_row] for pivot_row, pivot_column in group])
+            first = row + len(group)
+            for other in (xrange(height) if reduced else xrange(first, height)):
+                if row <= other < first:
+                    continue
+                value = rows[other]
+                index = 0
+                for position, (pivot_row, pivot_column) in enumerate(group):
+                    index |= ((value >> pivot_column) & 1) << position
+                if index:
+                    rows[other] = value ^ table[index]
+
+            pivots.extend(pivot_column for pivot_row, pivot_column in group)
+            row = first
+
+        return pivots
+
+    def rref(self):
+        result = self.copy()
+        result.eliminate(reduced=True)
+        return result
+
+    def rank(self):
+        return len(self.copy().eliminate())
+
+    def det(self):
+        if self.width() != self.height():
+            raise IndexError("Attempting to use a non-square matrix as a square matrix.")
+        return 1 if self.rank() == self.width() else 0
+
+    # Gets the inverse, by reducing the matrix next to the identity
+    def inverse(self):
+        n = self.width()
+        if n != self.height():
+            raise IndexError("Attempting to use a non-square matrix as a square matrix.")
+        augmented = BinaryMatrix([row | (1 << (n + r)) for r, row in enumerate(self.rows)], 2 * n)
+        if len(augmented.eliminate(reduced=True, columns=n)) != n:
+            raise ValueError("Matrix is not invertible")
+        return BinaryMatrix([row >> n for row in augmented.rows], n)
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.rows == other.rows and self.columns == other.columns
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __unicode__(self):
+        result = "\n"
+        for row in self.to_list():
+            result += "[" + ", ".join(str(entry) for entry in row) + "]\n"
+        return result
+
+    def __repr__(self):
+        return "BinaryMatrix.from_list(" + self.__unicode__() + ")"
+
+
+# A vector over GF(2^k) stored as k bit-slices: slice i holds bit i of the
+# packed value of every entry, so bit j of slice i is coefficient i of entry j.
+# Addition is one XOR per slice, and entrywise products are carried out on
+# whole slices with AND and XOR, followed by reduction by the field's polynomial
+class BitSlicedVector(object):
+
+    def __init__(self, field, slices, length):
+        super(BitSlicedVector, self).__init__()
+        if field.characteristic != 2:
+            raise TypeError("Bit-sliced vectors need a field of characteristic 2")
+        self.field = field
+        self.slices = slices
+        self.length = length
+
+    @staticmethod
+    def from_list(field, members):
+        slices = [0] * field.r
+        for j, member in enumerate(members):
+            value = hash(member)
+            for i in xrange(field.r):
+                if (value >> i) & 1:
+                    slices[i] |= 1 << j
+        return BitSlicedVector(field, slices, len(members))
+
+    @staticmethod
+    def from_vector(vector):
+        return BitSlicedVector.from_list(type(vector[0]), vector.list_form)
+
+    def to_list(self):
+        return [self.field.from_int(self.value(j)) for j in xrange(self.length)]
+
+    def to_vector(self):
+        return Vector(self.to_list())
+
+    # The packed value of entry j
+    def value(self, j):
+        return sum(((bits >> j) & 1) << i for i, bits in enumerate(self.slices))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, j):
+        return self.field.from_int(self.value(j))
+
+    def __add__(self, other):
+        return BitSlicedVector(self.field, [a ^ b for a, b in zip(self.slices, other.slices)], self.length)
+
+    def __sub__(self, other):
+        return self + other
+
+    # Reduces the slices of a product of degree up to 2k - 2 by the field's
+    # polynomial, using x^k = (the lower terms of the polynomial)
+    def reduce(self, slices):
+        k = self.field.r
+        lower = [m for m in xrange(k) if self.field.irreducible_poly[m] % 2]
+        for degree in xrange(len(slices) - 1, k - 1, -1):
+            if slices[degree]:
+                for m in lower:
+                    slices[degree - k + m] ^= slices[degree]
+        return slices[:k]
+
+    # Multiplies entrywise by another bit-sliced vector, or every entry by a
+    # field member
+    def __mul__(self, other):
+        k = self.field.r
+        if isinstance(other, BitSlicedVector):
+            other_slices = other.slices
+        else:
+            value = hash(other)
+            full = (1 << self.length) - 1
+            other_slices = [full if (value >> i) & 1 else 0 for i in xrange(k)]
+
+        product = [0] * (2 * k - 1)
+        for i, a in enumerate(self.slices):
+            if a:
+                for j, b in enumerate(other_slices):
+                    product[i + j] ^= a & b
+        return BitSlicedVector(self.field, self.reduce(product), self.length)
+
+    # The sum of the entrywise products. Each coefficient of the sum is the
+    # parity of a slice of the product
+    @staticmethod
+    def dot_product(a, b):
+        if len(a) != len(b): raise ValueError("Dot product vectors must be same length")
+        product = a * b
+        return a.field.from_int(sum((popcount(bits) & 1) << i for i, bits in enumerate(product.slices)))
+
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.field == other.field and self.slices == other.slices and self.length == other.length
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __unicode__(self):
+        return unicode(self.to_vector())
+
+    def __repr__(self):
+        return "BitSlicedVector(" + self.__unicode__() + ")"
+
+
+def binary_matrix_tests():
+
+    generator = random.Random(7)
+
+    # Four Russians products match Matrix products over F2
+    a = BinaryMatrix.random(13, 21, generator)
+    b = BinaryMatrix.random(21, 9, generator)
+    assert (a * b).to_matrix() == a.to_matrix() * b.to_matrix()
+    assert BinaryMatrix.from_matrix(a.to_matrix()) == a
+    assert a.transpose().transpose() == a
+    assert a.multiply_rows(b.rows, bits=3) == (a * b).rows
+
+    # Elimination, with groups of pivots of several sizes
+    m = BinaryMatrix.random(40, 30, generator)
+    reference = m.copy()
+    reference.eliminate(reduced=True, bits=1)
+    for bits in [2, 5, 8]:
+        reduced = m.copy()
+        reduced.eliminate(reduced=True, bits=bits)
+        assert reduced == reference
+    assert reference.to_matrix() == m.to_matrix().rref()
+    assert m.rank() == m.to_matrix().rank()
+    m = BinaryMatrix.random(40, 40, generator)
+    while m.det() == 0:
+        m = BinaryMatrix.random(40, 40, generator)
+    assert m * m.inverse() == BinaryMatrix.identity(40)
+    singular = BinaryMatrix.from_list([[1, 1, 0], [0, 1, 1], [1, 0, 1]])
+    assert singular.rank() == 2 and singular.det() == 0
+    assert singular.rref() == BinaryMatrix.from_list([[1, 0, 1], [0, 1, 1], [0, 0, 0]])
+
+    # Bit-sliced vectors over the binary extension fields
+    for field in [F4, F8, F16, F32]:
+        members = list(field.all_values())
+        x = [generator.choice(members) for i in xrange(20)]
+        y = [generator.choice(members) for i in xrange(20)]
+        u = BitSlicedVector.from_list(field, x)
+        v = BitSlicedVector.from_list(field, y)
+        assert u.to_list() == x
+        assert (u + v).to_list() == [a + b for a, b in zip(x, y)]
+        assert (u * v).to_list() == [a * b for a, b in zip(x, y)]
+        assert (u * members[3]).to_list() == [a * members[3] for a in x]
+        assert BitSlicedVector.dot_product(u, v) == Vector.dot_product(Vector(x), Vector(y))
+
+    # A binary matrix acts on each slice
+    m = BinaryMatrix.random(5, 20, generator)
+    x = [generator.choice(list(F8.all_values())) for i in xrange(20)]
+    assert (m * BitSlicedVector.from_list(F8, x)).to_vector() == m.to_matrix(F8) * Vector(x)
@@ -0,0 +1,470 @@
+import tempfile
+from array import array
+from permutation import *
+from matrix import *
+from fields import *
+from arraymatrix import field_matmul
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Gets the array type code able to hold values below n
+def value_typecode(n):
+    if n <= 0x100:
+        return 'B'
+    return 'H' if n <= 0x10000 else 'L'
+
+
+# Splits joined fixed-width records back into a list
+def split_records(data, width):
+    return [data[start:start + width] for start in xrange(0, len(data), width)]
+
+
+# Encodes permutations over fixed symbols as the bytes of their image arrays.
+# Products are computed on the encodings directly
+class PermutationCodec(object):
+
+    def __init__(self, symbols, use_numpy=True):
+        super(PermutationCodec, self).__init__()
+        self.symbols = sorted(symbols)
+        self.typecode = image_typecode(len(self.symbols))
+        self.width = len(self.symbols) * array(self.typecode).itemsize
+        self.use_numpy = use_numpy and np != None
+
+    def encode(self, permutation):
+        return permutation.extended(self.symbols).images.tostring()
+
+    def decode(self, data):
+        result = Permutation('', [])
+        result.symbols = self.symbols
+        result.images = array(self.typecode)
+        result.images.fromstring(data)
+        return result
+
+    # Gets a generator in the form apply_many wants it
+    def prepare(self, generator):
+        images = list(generator.extended(self.symbols).images)
+        return np.array(images, dtype=self.typecode) if self.use_numpy else images
+
+    # Applies the generator after each encoded element
+    def apply_many(self, encodings, generator):
+        if self.use_numpy:
+            images = np.frombuffer(b"".join(encodings), dtype=self.typecode)
+            return split_records(generator[images].tostring(), self.width)
+
+        result = []
+        typecode = self.typecode
+        for data in encodings:
+            images = array(typecode)
+            images.fromstring(data)
+            result.append(array(typecode, [generator[image] for image in images]).tostring())
+        return result
+
+
+# Encodes square matrices over a finite field as the bytes of their packed
+# entries in row-major order. Products are computed on the encodings directly
+class MatrixCodec(object):
+
+    def __init__(self, field, n, use_numpy=True):
+        super(MatrixCodec, self).__init__()
+        self.field = field
+        self.n = n
+        self.typecode = value_typecode(field.size())
+        self.width = n * n * array(self.typecode).itemsize
+        self.use_numpy = use_numpy and np != None
+
+    def encode(self, matrix):
+        return array(self.typecode, [hash(entry) for row in matrix.rows() for entry in row]).tostring()
+
+    def decode(self, data):
+        values = array(self.typecode)
+        values.fromstring(data)
+        n = self.n
+        return Matrix.from_list([[self.field.from_int(values[r * n + c]) for c in xrange(n)] for r in xrange(n)])
+
+    # Gets a generator in the form apply_many wants it
+    def prepare(self, generator):
+        values = array(self.typecode)
+        values.fromstring(self.encode(generator))
+        if self.use_numpy:
+            return np.array(values, dtype=np.int64).reshape(self.n, self.n)
+        return list(values)
+
+    # Multiplies each encoded element by the generator on the right
+    def apply_many(self, encodings, generator):
+        if self.use_numpy:
+            values = np.frombuffer(b"".join(encodings), dtype=self.typecode).astype(np.int64).reshape(-1, self.n, self.n)
+            products = field_matmul(self.field, values, generator).astype(self.typecode)
+            return split_records(products.tostring(), self.width)
+
+        tables = self.field.get_int_tables()
+        if tables == None:
+            return self.apply_packed(encodings, generator)
+        add_table = tables.add_table
+        mult_table = tables.mult_table
+        size = tables.size
+        n = self.n
+        result = []
+        for data in encodings:
+            values = array(self.typecode)
+            values.fromstring(data)
+            product = array(self.typecode, [0]) * (n * n)
+            for r in xrange(n):
+                for c in xrange(n):
+                    total = 0
+                    for k in xrange(n):
+                        total = add_table[total * size + mult_table[values[r * n + k] * size + generator[k * n + c]]]
+                    product[r * n + c] = total
+            result.append(product.tostring())
+        return result
+
+    # The same for fields too large for their tables, with the packed arithmetic
+    def apply_packed(self, encodings, generator):
+        add = self.field.packed_add
+        mult = self.field.packed_mult
+        n = self.n
+        result = []
+        for data in encodings:
+            values = array(self.typecode)
+            values.fromstring(data)
+            product = array(self.typecode, [0]) * (n * n)
+            for r in xrange(n):
+                for c in xrange(n):
+                    total = 0
+                    for k in xrange(n):
+                        total = add(total, mult(values[r * n + k], generator[k * n + c]))
+                    product[r * n + c] = total
+            result.append(product.tostring())
+        return result
+
+
+# A breadth-first frontier of fixed-width encodings. Past a limit, records are
+# spilled to a temporary file so the frontier does not have to fit in memory
+class Frontier(object):
+
+    def __init__(self, width, limit):
+        super(Frontier, self).__init__()
+        self.width = width
+        self.limit = limit
+        self.records = []
+        self.spill = None
+        self.spilled = 0
+
+    def append(self, encoding):
+        self.records.append(encoding)
+        if len(self.records) >= self.limit:
+            if self.spill == None:
+                self.spill = tempfile.TemporaryFile()
+            self.spill.write(b"".join(self.records))
+            self.spilled += len(self.records)
+            self.records = []
+
+    def __len__(self):
+        return self.spilled + len(self.records)
+
+    # Yields the records a block at a time, then releases them
+    def blocks(self, block_size):
+        if self.spill != None:
+            self.spill.seek(0)
+            while True:
+                data = self.spill.read(block_size * self.width)
+                if not data:
+                    break
+                yield split_records(data, self.width)
+            self.spill.close()
+            self.spill = None
+        for start in xrange(0, len(self.records), block_size):
+            yield self.records[start:start + block_size]
+        self.records = []
+
+
+# Mixes the words of a record into its hash
+HASH_MULTIPLIER = 0x9e3779b97f4a7c15
+
+# A hashed set of fixed-width byte records in one flat table, with open
+# addressing: slot i holds bytes i * width to (i + 1) * width of the table,
+# a byte per slot marks it used, and a record that finds its slot taken
+# tries the next one. The table doubles before it is 3/4 full, so each record
+# costs between 4/3 and 8/3 times its width plus one byte, with no Python
+# object per record. With NumPy, whole blocks of records are hashed, probed
+# and inserted at once, and records of 1, 2, 4 or 8 bytes are kept as single
+# unsigned integers
+class RecordSet(object):
+
+    def __init__(self, width, use_numpy=True, capacity=16):
+        super(RecordSet, self).__init__()
+        self.width = width
+        self.use_numpy = use_numpy and np != None
+        if self.use_numpy:
+            self.key_type = {1: np.uint8, 2: np.uint16, 4: np.uint32, 8: np.uint64}.get(width)
+        self.count = 0
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.bits = capacity.bit_length() - 1
+        if self.use_numpy:
+            shape = capacity if self.key_type else (capacity, self.width)
+            self.table = np.zeros(shape, dtype=self.key_type or np.uint8)
+            self.used = np.zeros(capacity, dtype=bool)
+        else:
+            self.table = bytearray(capacity * self.width)
+            self.used = bytearray(capacity)
+
+    def __len__(self):
+        return self.count
+
+    # The bytes the table takes
+    def nbytes(self):
+        return self.capacity * (self.width + 1)
+
+    # Grows the table until it can hold count records
+    def reserve(self, count):
+        capacity = self.capacity
+        while count * 4 > capacity * 3:
+            capacity *= 2
+        if capacity == self.capacity:
+            return
+
+        records = list(self.blocks())
+        self.allocate(capacity)
+        self.count = 0
+        for block in records:
+            if self.use_numpy:
+                self.insert_rows(block)
+            else:
+                for record in split_records(block, self.width):
+                    self.insert(record)
+
+    # Reads joined records as an array with one record per row (or entry)
+    def to_rows(self, data):
+        if self.key_type:
+            return np.frombuffer(data, dtype=self.key_type)
+        return np.frombuffer(data, dtype=np.uint8).reshape(-1, self.width)
+
+    # Gets the slots records start probing at, from the top bits of a
+    # multiplicative hash of their 8-byte words
+    def slots(self, rows):
+        multiplier = np.uint64(HASH_MULTIPLIER)
+        if self.key_type:
+            hashes = rows.astype(np.uint64) * multiplier
+        else:
+            words = (self.width + 7) // 8
+            padded = np.zeros((len(rows), words * 8), dtype=np.uint8)
+            padded[:, :self.width] = rows
+            hashes = np.zeros(len(rows), dtype=np.uint64)
+            for word in padded.view(np.uint64).T:
+                hashes = (hashes ^ word) * multiplier
+        hashes ^= hashes >> np.uint64(32)
+        hashes *= multiplier
+        return (hashes >> np.uint64(64 - self.bits)).astype(np.int64)
+
+    # Inserts an array of records, as made by to_rows, and returns which were new.
+    # Every round, rows at a free slot fill it (the first row wins when
+    # several want the same one), and rows at a used slot stop if it holds
+    # them and otherwise move to the next slot
+    def insert_rows(self, rows):
+        mask = self.capacity - 1
+        slots = self.slots(rows)
+        added = np.zeros(len(rows), dtype=bool)
+        pending = np.arange(len(rows))
+        while len(pending):
+            free = np.flatnonzero(~self.used[slots[pending]])
+            if len(free):
+                taken, first = np.unique(slots[pending[free]], return_index=True)
+                winners = pending[free[first]]
+                self.table[taken] = rows[winners]
+                self.used[taken] = True
+                added[winners] = True
+                self.count += len(winners)
+                keep = np.ones(len(pending), dtype=bool)
+                keep[free[first]] = False
+                pending = pending[keep]
+
+            held = self.table[slots[pending]] == rows[pending]
+            if not self.key_type:
+                held = held.all(axis=1)
+            pending = pending[~held]
+            slots[pending] = (slots[pending] + 1) & mask
+        return added
+
+    # Inserts one record, returning whether it was new
+    def insert(self, record):
+        width = self.width
+        mask = self.capacity - 1
+        table = self.table
+        used = self.used
+        slot = hash(record) & mask
+        while used[slot]:
+            if table[slot * width:(slot + 1) * width] == record:
+                return False
+            slot = (slot + 1) & mask
+        table[slot * width:(slot + 1) * width] = record
+        used[slot] = 1
+        self.count += 1
+        return True
+
+    # Adds records, giving back the ones that were new in the order given
+    def add_many(self, records):
+        if not records:
+            return []
+        self.reserve(self.count + len(records))
+        if not self.use_numpy:
+            return [record for record in records if self.insert(record)]
+        rows = self.to_rows(b"".join(records))
+        return split_records(rows[self.insert_rows(rows)].tostring(), self.width)
+
+    def __contains__(self, record):
+        width = self.width
+        mask = self.capacity - 1
+        if self.use_numpy:
+            slot = self.slots(self.to_rows(record))[0]
+            while self.used[slot]:
+                if self.table[slot].tostring() == record:
+                    return True
+                slot = (slot + 1) & mask
+            return False
+
+        slot = hash(record) & mask
+        while self.used[slot]:
+            if self.table[slot * width:(slot + 1) * width] == record:
+                return True
+            slot = (slot + 1) & mask
+        return False
+
+    # Yields the records a block of slots at a time: as 2D arrays with NumPy,
+    # and as joined bytes without
+    def blocks(self, block_size=1 << 16):
+        width = self.width
+        for start in xrange(0, self.capacity, block_size):
+            if self.use_numpy:
+                yield self.table[start:start + block_size][self.used[start:start + block_size]]
+            else:
+                used = self.used
+                table = self.table
+                yield b"".join(bytes(table[slot * width:(slot + 1) * width])
+                               for slot in xrange(start, min(start + block_size, self.capacity)) if used[slot])
+
+    def __iter__(self):
+        for block in self.blocks():
+            data = block.tostring() if self.use_numpy else block
+            for record in split_records(data, self.width):
+                yield record
+
+
+# The result of an enumeration: a hashed set of encodings, decoded on demand
+class ElementSet(object):
+
+    def __init__(self, codec, encodings):
+        super(ElementSet, self).__init__()
+        self.codec = codec
+        self.encodings = encodings
+
+    def __len__(self):
+        return len(self.encodings)
+
+    def __contains__(self, element):
+        return self.codec.encode(element) in self.encodings
+
+    def __iter__(self):
+        for data in self.encodings:
+            yield self.codec.decode(data)
+
+
+# Picks a codec for some group elements
+def codec_for(elements):
+    first = elements[0]
+    if isinstance(first, Permutation):
+        symbols = set()
+        for element in elements:
+            symbols.update(element.symbols)
+        return PermutationCodec(symbols)
+    if isinstance(first, Matrix):
+        return MatrixCodec(first.get_field(), first.width())
+    raise TypeError("No codec for " + type(first).__name__)
+
+# Enumerates the orbit of some seeds under right action by generators, breadth
+# first. Elements are only held as encodings in one RecordSet. The frontier is
+# processed a block at a time and spilled to disk past frontier_limit records.
+# progress, if given, is called as progress(depth, found, frontier_size) after
+# each block
+def orbit(seeds, generators, codec=None, block_size=4096, frontier_limit=1 << 20, progress=None):
+    codec = codec or codec_for(list(seeds) + list(generators))
+    prepared = [codec.prepare(generator) for generator in generators]
+
+    found = RecordSet(codec.width, codec.use_numpy)
+    frontier = Frontier(codec.width, frontier_limit)
+    for encoding in found.add_many([codec.encode(seed) for seed in seeds]):
+        frontier.append(encoding)
+
+    depth = 0
+    while len(frontier):
+        next_frontier = Frontier(codec.width, frontier_limit)
+        for block in frontier.blocks(block_size):
+            for generator in prepared:
+                for encoding in found.add_many(codec.apply_many(block, generator)):
+                    next_frontier.append(encoding)
+            if progress != None:
+                progress(depth, len(found), len(next_frontier))
+        frontier = next_frontier
+        depth += 1
+
+    return ElementSet(codec, found)
+
+# Enumerates the group generated by some matrices or permutations
+def closure(generators, codec=None, **options):
+    return orbit(generators, generators, codec, **options)
+
+
+def closure_tests():
+
+    # SL(2, 5) from its generators, with and without NumPy
+    one = F5.mult_id()
+    zero = F5.add_id()
+    generators = [Matrix.from_list([[one, one], [zero, one]]), Matrix.from_list([[zero, -one], [one, zero]])]
+    for use_numpy in [True, False]:
+        group = closure(generators, MatrixCodec(F5, 2, use_numpy))
+        assert len(group) == 120
+        assert Matrix.from_list([[F5("2"), zero], [zero, F5("3")]]) in group
+        assert Matrix.from_list([[F5("2"), zero], [zero, one]]) not in group
+
+    # S5 from a 5-cycle and a transposition, spilling the frontier to disk
+    symbols = range(5)
+    generators = [Permutation("(01234)", symbols), Permutation("(01)", symbols)]
+    reports = []
+    for use_numpy in [True, False]:
+        group = closure(generators, PermutationCodec(symbols, use_numpy), block_size=7, frontier_limit=10,
+                        progress=lambda depth, found, frontier: reports.append(found))
+        assert len(group) == 120
+        assert Permutation("(13)(24)", symbols) in group
+    assert reports[-1] == 120
+
+    # SL(2, 9), which needs a transvection for each basis element of F9
+    one = F9.mult_id()
+    zero = F9.add_id()
+    generators = [Matrix.from_list([[zero, -one], [one, zero]]), Matrix.from_list([[one, one], [zero, one]]),
+                  Matrix.from_list([[one, F9("x")], [zero, one]])]
+    assert len(closure(generators)) == 9 * 80
+
+    # Fields too large for their flat tables multiply with the packed arithmetic
+    for field in [GF(1451), GF(2, 11)]:
+        a = Matrix.from_list([[field.from_int(3), field.from_int(5)], [field.from_int(7), field.from_int(11)]])
+        b = Matrix.from_list([[field.from_int(2), field.from_int(9)], [field.from_int(4), field.from_int(1)]])
+        for use_numpy in [True, False]:
+            codec = MatrixCodec(field, 2, use_numpy)
+            assert codec.decode(codec.apply_many([codec.encode(a)], codec.prepare(b))[0]) == a * b
+
+    # The element set holds records in a flat table of a few bytes per record,
+    # with or without NumPy, and keeps only the first of repeated records
+    for use_numpy in [True, False]:
+        records = RecordSet(4, use_numpy)
+        values = [i * 7919 % (1 << 24) for i in xrange(20000)]
+        added = records.add_many([array('I', [value]).tostring() for value in values + values[:100]])
+        assert len(added) == len(records) == 20000 and added[5] == array('I', [values[5]]).tostring()
+        assert records.nbytes() <= 20000 * 5 * 8 // 3
+        assert array('I', [values[12345]]).tostring() in records and array('I', [1]).tostring() not in records
+        assert sorted(array('I', record)[0] for record in records) == sorted(values)
+        odd = RecordSet(13, use_numpy)
+        assert len(odd.add_many(["a" * 13, "b" * 13, "a" * 13])) == 2 and "b" * 13 in odd and "c" * 13 not in odd
@@ -0,0 +1,341 @@
+from itertools import izip
+from operator import attrgetter
+from fields import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# NumPy copies of the two-argument field tables, keyed by the field's FieldTables
+_array_tables = {}
+
+# Gets the addition and multiplication tables of a field as square NumPy arrays
+def array_tables(field):
+    tables = field.require_tables()
+    arrays = _array_tables.get(tables)
+    if arrays == None:
+        shape = (tables.size, tables.size)
+        arrays = (np.array(tables.add_table, dtype=np.int64).reshape(shape),
+                  np.array(tables.mult_table, dtype=np.int64).reshape(shape))
+        _array_tables[tables] = arrays
+    return arrays
+
+# A matrix held as one row-major list while it is eliminated. Members of finite
+# fields are stored packed and combined with the flat integer tables, so no
+# field members are made along the way. Matrices over R are stored as floats
+# and pivoted on the entry of largest size, with entries below tolerance
+# counted as zero. When NumPy is there, each pivot clears its whole column in
+# one vectorised step. Fields too large for tables use their packed arithmetic
+class EliminationBuffer(object):
+
+    tolerance = 1e-12
+
+    def __init__(self, field, values, height, width, use_numpy=True):
+        super(EliminationBuffer, self).__init__()
+        self.field = field
+        self.values = values
+        self.height = height
+        self.width = width
+        self.finite = issubclass(field, FiniteField)
+        self.tables = None
+
+        if self.finite:
+            self.size = field.size()
+            self.tables = field.get_int_tables()
+            if self.tables != None:
+                self.add_table = self.tables.add_table
+                self.mult_table = self.tables.mult_table
+                self.neg_table = self.tables.neg_table
+                self.inv_table = self.tables.inv_table
+            self.zero, self.one = 0, 1
+        else:
+            self.zero, self.one = 0.0, 1.0
+        self.use_numpy = use_numpy and np != None and (not self.finite or self.tables != None)
+
+    # Makes a buffer from a list of rows of field members
+    @staticmethod
+    def from_rows(field, rows, use_numpy=True):
+        height = len(rows)
+        width = len(rows[0]) if height != 0 else 0
+        pack = attrgetter("value") if issubclass(field, FiniteField) else float
+        return EliminationBuffer(field, [pack(entry) for row in rows for entry in row], height, width, use_numpy)
+
+    # Makes an n by n identity buffer
+    @staticmethod
+    def identity(field, n, use_numpy=True):
+        result = EliminationBuffer(field, [], n, n, use_numpy)
+        result.values = [result.one if r == c else result.zero for r in xrange(n) for c in xrange(n)]
+        return result
+
+    # Makes the rows of field members back out of the buffer
+    def to_rows(self):
+        return [[self.member(value) for value in self.values[r * self.width:(r + 1) * self.width]]
+                for r in xrange(self.height)]
+
+    def member(self, value):
+        return self.field.from_int(value) if self.finite else self.field(value)
+
+    # Joins another buffer of the same height on the right
+    def augmented(self, other):
+        values = []
+        for r in xrange(self.height):
+            values.extend(self.values[r * self.width:(r + 1) * self.width])
+            values.extend(other.values[r * other.width:(r + 1) * other.width])
+        return EliminationBuffer(self.field, values, self.height, self.width + other.width, self.use_numpy)
+
+    # The columns from start to stop as a new buffer
+    def columns(self, start, stop):
+        values = []
+        for r in xrange(self.height):
+            values.extend(self.values[r * self.width + start:r * self.width + stop])
+        return EliminationBuffer(self.field, values, self.height, stop - start, self.use_numpy)
+
+    def is_zero(self, value):
+        return value == 0 if self.finite else abs(value) <= self.tolerance
+
+    # Field arithmetic on stored values
+    def mul(self, a, b):
+        if not self.finite:
+            return a * b
+        if self.tables == None:
+            return self.field.packed_mult(a, b)
+        return self.mult_table[a * self.size + b]
+
+    def inv(self, a):
+        if not self.finite:
+            return 1.0 / a
+        if self.tables == None:
+            return self.field.packed_inverse(a)
+        return self.inv_table[a]
+
+    def neg(self, a):
+        if not self.finite:
+            return -a
+        if self.tables == None:
+            return self.field.packed_neg(a)
+        return self.neg_table[a]
+
+    # Finds the row at or below start to pivot on in a column, or None
+    def find_pivot(self, column, start):
+        values = self.values
+        width = self.width
+        if self.finite:
+            for r in xrange(start, self.height):
+                if values[r * width + column] != 0:
+                    return r
+            return None
+
+        best = max(xrange(start, self.height), key=lambda r: abs(values[r * width + column]))
+        return best if not self.is_zero(values[best * width + column]) else None
+
+    def swap_rows(self, i, j):
+        width = self.width
+        values = self.values
+        values[i * width:(i + 1) * width], values[j * width:(j + 1) * width] = \
+            values[j * width:(j + 1) * width], values[i * width:(i + 1) * width]
+
+    # Multiplies row i by a factor, from column start onwards
+    def scale_row(self, i, factor, start=0):
+        low = i * self.width + start
+        high = (i + 1) * self.width
+        values = self.values
+        if self.finite and self.tables == None:
+            values[low:high] = [self.field.packed_mult(factor, value) for value in values[low:high]]
+        elif self.finite:
+            scaled = self.mult_table[factor * self.size:(factor + 1) * self.size]
+            values[low:high] = [scaled[value] for value in values[low:high]]
+        else:
+            values[low:high] = [value * factor for value in values[low:high]]
+
+    # Subtracts factor times row i from row j, from column start onwards. Each
+    # field has its own inner loop: XOR in characteristic 2, integer arithmetic
+    # in prime fields, and table lookups (or packed arithmetic) otherwise
+    def subtract_row(self, j, i, factor, start=0):
+        width = self.width
+        values = self.values
+        source = values[i * width + start:(i + 1) * width]
+        low = j * width + start
+        high = (j + 1) * width
+        target = values[low:high]
+
+        if not self.finite:
+            values[low:high] = [x - factor * y for x, y in izip(target, source)]
+            return
+
+        field = self.field
+        size = self.size
+        if field.r == 1:
+            values[low:high] = [(x - factor * y) % size for x, y in izip(target, source)]
+        elif self.tables == None:
+            mult = field.packed_mult
+            add = field.packed_add
+            factor = field.packed_neg(factor)
+            values[low:high] = [add(x, mult(factor, y)) for x, y in izip(target, source)]
+        elif field.characteristic == 2:
+            scaled = self.mult_table[factor * size:(factor + 1) * size]
+            values[low:high] = [x ^ scaled[y] for x, y in izip(target, source)]
+        else:
+            scaled = self.mult_table[self.neg_table[factor] * size:(self.neg_table[factor] + 1) * size]
+            add_table = self.add_table
+            values[low:high] = [add_table[x * size + scaled[y]] for x, y in izip(target, source)]
+
+    # Brings the buffer to row echelon form in place, looking for pivots in the
+    # first `columns` columns (all of them by default). With reduced, pivots are
+    # scaled to one and cleared above as well, giving reduced row echelon form.
+    # Returns the pivot columns and the determinant of the square part searched
+    # (the product of the pivots, negated once per row swap)
+    def eliminate(self, reduced=False, columns=None):
+        columns = self.width if columns == None else columns
+        if self.use_numpy:
+            return self.eliminate_array(reduced, columns)
+
+        width = self.width
+        values = self.values
+        determinant = self.one
+        pivots = []
+
+        row = 0
+        for column in xrange(columns):
+            if row == self.height:
+                break
+            pivot_row = self.find_pivot(column, row)
+            if pivot_row == None:
+                continue
+            if pivot_row != row:
+                self.swap_rows(pivot_row, row)
+                determinant = self.neg(determinant)
+
+            pivot = values[row * width + column]
+            determinant = self.mul(determinant, pivot)
+            inverse = self.inv(pivot)
+            if reduced:
+                self.scale_row(row, inverse, column)
+                inverse = self.one
+
+            # Clear the column below the pivot, and above it when reducing
+            for other in xrange(0 if reduced else row + 1, self.height):
+                if other == row:
+                    continue
+                entry = values[other * width + column]
+                if not self.is_zero(entry):
+                    self.subtract_row(other, row, self.mul(entry, inverse), column)
+                    values[other * width + column] = self.zero
+
+            pivots.append(column)
+            row += 1
+
+        if len(pivots) < min(columns, self.height):
+            determinant = self.zero
+        return pivots, determinant
+
+    # The same, on a NumPy copy of the buffer that is written back at the end
+    def eliminate_array(self, reduced, columns):
+        field = self.field
+        if self.finite:
+            values = np.array(self.values, dtype=np.int64).reshape(self.height, self.width)
+            add_table, mult_table = array_tables(field)
+            neg_table = np.array(self.neg_table, dtype=np.int64)
+        else:
+            values = np.array(self.values, dtype=np.float64).reshape(self.height, self.width)
+        determinant = self.one
+        pivots = []
+
+        row = 0
+        for column in xrange(columns):
+            if row == self.height:
+                break
+
+            # Find the pivot
+            below = values[row:, column]
+            if self.finite:
+                candidates = np.flatnonzero(below)
+                if not len(candidates):
+                    continue
+                pivot_row = row + int(candidates[0])
+            else:
+                pivot_row = row + int(np.argmax(np.abs(below)))
+                if self.is_zero(values[pivot_row, column]):
+                    continue
+            if pivot_row != row:
+                values[[row, pivot_row]] = values[[pivot_row, row]]
+                determinant = self.neg(determinant)
+
+            pivot = values[row, column]
+            pivot = int(pivot) if self.finite else float(pivot)
+            determinant = self.mul(determinant, pivot)
+            inverse = self.inv(pivot)
+            if reduced:
+                if self.finite:
+                    values[row, column:] = mult_table[inverse, values[row, column:]]
+                else:
+                    values[row, column:] *= inverse
+                inverse = self.one
+
+            # Clear the column below the pivot, and above it when reducing
+            entries = values[:, column]
+            if self.finite:
+                targets = np.flatnonzero(entries)
+            else:
+                targets = np.flatnonzero(np.abs(entries) > self.tolerance)
+            targets = targets[targets != row] if reduced else targets[targets > row]
+            if len(targets):
+                source = values[row, column:]
+                target = values[targets, column:]
+                if not self.finite:
+                    values[targets, column:] = target - np.outer(entries[targets] * inverse, source)
+                elif field.characteristic == 2:
+                    factors = mult_table[entries[targets], inverse]
+                    values[targets, column:] = target ^ mult_table[factors[:, None], source[None, :]]
+                elif field.r == 1:
+                    factors = (entries[targets] * inverse) % self.size
+                    values[targets, column:] = (target - np.outer(factors, source)) % self.size
+                else:
+                    factors = neg_table[mult_table[entries[targets], inverse]]
+                    values[targets, column:] = add_table[target, mult_table[factors[:, None], source[None, :]]]
+                values[targets, column] = self.zero
+
+            pivots.append(column)
+            row += 1
+
+        self.values = values.ravel().tolist()
+        if len(pivots) < min(columns, self.height):
+            determinant = self.zero
+        return pivots, determinant
+
+
+def elimination_tests():
+
+    for use_numpy in [True, False]:
+
+        # Each inner loop gives the determinant of a triangular matrix with a swap
+        for field in [F7, F9, F16]:
+            a, b, c = [hash(member) for member in list(field.all_values())[1:4]]
+            buffer = EliminationBuffer(field, [0, a, b, c], 2, 2, use_numpy)
+            pivots, determinant = buffer.eliminate()
+            assert pivots == [0, 1]
+            assert determinant == buffer.neg(buffer.mul(a, b))
+
+        # Reduction next to the identity gives the inverse
+        buffer = EliminationBuffer.from_rows(F5, [[F5("2"), F5("1")], [F5("1"), F5("1")]], use_numpy)
+        buffer = buffer.augmented(EliminationBuffer.identity(F5, 2))
+        assert buffer.eliminate(reduced=True, columns=2)[0] == [0, 1]
+        assert buffer.columns(2, 4).values == [1, 4, 4, 2]
+
+        # Rank over R counts tiny entries as zero
+        buffer = EliminationBuffer.from_rows(R, [[R(1.0), R(2.0)], [R(2.0), R(4.0 + 1e-15)]], use_numpy)
+        assert len(buffer.eliminate()[0]) == 1
+
+    # Both ways agree on a larger matrix
+    random_values = [(value * 37 + 11) % 16 for value in xrange(64)]
+    results = []
+    for use_numpy in [True, False]:
+        buffer = EliminationBuffer(F16, list(random_values), 8, 8, use_numpy)
+        results.append((buffer.eliminate(reduced=True), buffer.values))
+    assert results[0] == results[1]
+
+    # Fields without tables eliminate with their packed arithmetic
+    for field in [GF(2, 16), GF(3, 10)]:
+        a, b, c, d = [field.primitive_member() ** power for power in [5, 17, 300, 4001]]
+        buffer = EliminationBuffer.from_rows(field, [[a, b], [c, d]])
+        assert not buffer.use_numpy and buffer.member(buffer.eliminate()[1]) == a * d - b * c
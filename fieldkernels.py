@@ -0,0 +1,454 @@
+from fields import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# NumPy copies of field tables, keyed by the field's FieldTables
+_numpy_tables = {}
+
+# Gets the antilog and log tables of a field as NumPy arrays
+def numpy_tables(field):
+    tables = field.require_log_tables()
+    arrays = _numpy_tables.get(tables)
+    if arrays == None:
+        arrays = (np.array(tables.int_log_table, dtype=np.int64), np.array(tables.int_log_table_reverse, dtype=np.int64))
+        _numpy_tables[tables] = arrays
+    return arrays
+
+# Whether members of a field are stored as packed integers in arrays
+def is_finite(field):
+    return issubclass(field, FiniteField)
+
+# Whether the kernels can work with a field: prime fields whose products fit
+# in 64 bits, and fields with log tables
+def has_kernels(field):
+    if field.r == 1:
+        return (field.characteristic - 1) ** 2 < 2 ** 63
+    return field.get_log_tables() != None
+
+# Converts field members to an array of packed integers (or floats over R)
+def to_array(field, members):
+    if is_finite(field):
+        return np.array([hash(member) for member in members], dtype=np.int64)
+    return np.array(members, dtype=np.float64)
+
+# Converts an array back to field members
+def from_array(field, array):
+    if is_finite(field):
+        return [field.from_int(int(value)) for value in array]
+    return [field(value) for value in array]
+
+# Adds arrays of packed members elementwise
+def field_add(field, a, b):
+    if not is_finite(field):
+        return a + b
+
+    p = field.characteristic
+    if p == 2:
+        return np.bitwise_xor(a, b)
+    if field.r == 1:
+        return (a + b) % p
+
+    # Add coefficient by coefficient
+    result = np.zeros(np.broadcast(a, b).shape, dtype=np.int64)
+    place = 1
+    for power in xrange(field.r):
+        result += (((a // place) + (b // place)) % p) * place
+        place *= p
+    return result
+
+# Negates an array of packed members elementwise
+def field_neg(field, a):
+    if not is_finite(field):
+        return -a
+
+    p = field.characteristic
+    if p == 2:
+        return a
+    if field.r == 1:
+        return (-a) % p
+
+    result = np.zeros(np.shape(a), dtype=np.int64)
+    place = 1
+    for power in xrange(field.r):
+        result += ((-(a // place)) % p) * place
+        place *= p
+    return result
+
+# Subtracts arrays of packed members elementwise
+def field_sub(field, a, b):
+    if not is_finite(field):
+        return a - b
+    if field.r == 1:
+        return (a - b) % field.characteristic
+    return field_add(field, a, field_neg(field, b))
+
+# Multiplies arrays of packed members elementwise
+def field_mul(field, a, b):
+    if not is_finite(field):
+        return a * b
+    if field.r == 1:
+        return (a * b) % field.characteristic
+
+    # Add the logarithms, then mask out products with zero
+    exp, log = numpy_tables(field)
+    order = field.size() - 1
+    return np.where((np.asarray(a) == 0) | (np.asarray(b) == 0), 0, exp[(log[a] + log[b]) % order])
+
+# Inverts an array of packed members elementwise. Zero is sent to zero
+def field_inv(field, a):
+    if not is_finite(field):
+        return 1.0 / a
+    if field.r == 1 and field.get_log_tables() == None:
+        return field_pow(field, a, field.characteristic - 2)
+
+    exp, log = numpy_tables(field)
+    return np.where(np.asarray(a) == 0, 0, exp[(-log[a]) % (field.size() - 1)])
+
+# Raises an array of packed members to an integer power elementwise. Negative
+# powers are powers of the inverse, so zero goes to zero like in field_inv
+def field_pow(field, a, exponent):
+    a = np.asarray(a)
+    if not is_finite(field):
+        return a ** exponent
+    if exponent < 0:
+        a = field_inv(field, a)
+        exponent = -exponent
+    if exponent == 0:
+        return np.ones_like(a)
+
+    # Nonzero members have order dividing size - 1, and zero stays zero
+    order = field.size() - 1
+    exponent = exponent % order or order
+    if field.get_log_tables() != None:
+        exp, log = numpy_tables(field)
+        return np.where(a == 0, 0, exp[log[a] * exponent % order])
+
+    # Prime fields without tables square and multiply the whole array
+    result = np.ones_like(a)
+    while exponent:
+        if exponent & 1:
+            result = field_mul(field, result, a)
+        exponent >>= 1
+        if exponent:
+            a = field_mul(field, a, a)
+    return result
+
+# Sums an array of packed members, over one axis or all of them
+def field_sum(field, a, axis=None):
+    a = np.asarray(a)
+    if not is_finite(field):
+        return np.sum(a, axis)
+    if axis is None:
+        a = a.ravel()
+        axis = 0
+
+    p = field.characteristic
+    if p == 2:
+        return np.bitwise_xor.reduce(a, axis)
+    if field.r == 1:
+        return np.sum(a, axis) % p
+
+    # Sum coefficient by coefficient
+    result = 0
+    place = 1
+    for power in xrange(field.r):
+        result = result + np.sum((a // place) % p, axis) % p * place
+        place *= p
+    return result
+
+# Multiplies together an array of packed members, over one axis or all of
+# them, by multiplying pairs of halves until one is left
+def field_prod(field, a, axis=None):
+    a = np.asarray(a)
+    if not is_finite(field):
+        return np.prod(a, axis)
+    a = a.ravel() if axis is None else np.moveaxis(a, axis, 0)
+    if len(a) == 0:
+        return np.ones(a.shape[1:], dtype=np.int64)[()]
+    while len(a) > 1:
+        half = len(a) // 2
+        a = np.concatenate((field_mul(field, a[:half], a[half:2 * half]), a[2 * half:]))
+    return a[0]
+
+# Multiplies arrays of packed members elementwise and sums over the last axis
+def field_dot(field, a, b):
+    return field_sum(field, field_mul(field, a, b), -1)
+
+# Multiplies arrays of packed members as matrices. Leading dimensions are
+# treated as stacks of matrices and broadcast, like np.matmul
+def field_matmul(field, a, b):
+    if not is_finite(field):
+        return np.matmul(a, b)
+
+    inner = a.shape[-1]
+
+    # Over prime fields, take the integer product then reduce. Sums are split
+    # into chunks that cannot overflow 64 bits
+    if field.r == 1:
+        p = field.characteristic
+        chunk = max(1, (2 ** 63 - 1) // ((p - 1) ** 2))
+        result = 0
+        for start in xrange(0, inner, chunk):
+            result = (result + np.matmul(a[..., :, start:start + chunk], b[..., start:start + chunk, :])) % p
+        return result
+
+    # Over extension fields, gather each rank one term from the log tables
+    exp, log = numpy_tables(field)
+    order = field.size() - 1
+    log_a = log[a]
+    log_b = log[b]
+    result = None
+    for k in xrange(inner):
+        term = exp[(log_a[..., :, k, None] + log_b[..., None, k, :]) % order]
+        term[(log_a[..., :, k, None] == -1) | (log_b[..., None, k, :] == -1)] = 0
+        result = term if result is None else field_add(field, result, term)
+    return result
+
+# Products of matrices at least this size are split into blocks by
+# strassen_matmul. A 256 x 256 block of packed members is 512 KB, about the
+# size of a level 2 cache; below that, field_matmul beats the extra additions
+STRASSEN_CROSSOVER = 256
+
+# Multiplies two 2D arrays of packed members with the Strassen-Winograd
+# recursion: 7 block products and 15 block sums per level instead of 8 products.
+# Blocks are NumPy views, so nothing is copied to split a matrix. Odd
+# dimensions are peeled: the even part is split, and the last row, column or
+# rank one term is added with field_matmul. Blocks smaller than the crossover
+# go to field_matmul, which gives exactly the same entries
+def strassen_matmul(field, a, b, crossover=None):
+    crossover = crossover or STRASSEN_CROSSOVER
+    m, k = a.shape
+    n = b.shape[1]
+    if not is_finite(field) or min(m, k, n) < max(crossover, 2):
+        return field_matmul(field, a, b)
+
+    m2, k2, n2 = m - m % 2, k - k % 2, n - n % 2
+    result = np.empty((m, n), dtype=np.int64)
+    result[:m2, :n2] = winograd_step(field, a[:m2, :k2], b[:k2, :n2], crossover)
+
+    if k2 != k:
+        result[:m2, :n2] = field_add(field, result[:m2, :n2], field_matmul(field, a[:m2, k2:], b[k2:, :n2]))
+    if n2 != n:
+        result[:m2, n2:] = field_matmul(field, a[:m2, :], b[:, n2:])
+    if m2 != m:
+        result[m2:, :] = field_matmul(field, a[m2:, :], b)
+    return result
+
+# One level of Strassen-Winograd on arrays with even dimensions
+def winograd_step(field, a, b, crossover):
+    m, k = a.shape
+    n = b.shape[1]
+    a11, a12, a21, a22 = a[:m // 2, :k // 2], a[:m // 2, k // 2:], a[m // 2:, :k // 2], a[m // 2:, k // 2:]
+    b11, b12, b21, b22 = b[:k // 2, :n // 2], b[:k // 2, n // 2:], b[k // 2:, :n // 2], b[k // 2:, n // 2:]
+    add = lambda x, y: field_add(field, x, y)
+    sub = lambda x, y: field_sub(field, x, y)
+    mul = lambda x, y: strassen_matmul(field, x, y, crossover)
+
+    s1 = add(a21, a22)
+    s2 = sub(s1, a11)
+    s3 = sub(a11, a21)
+    s4 = sub(a12, s2)
+    t1 = sub(b12, b11)
+    t2 = sub(b22, t1)
+    t3 = sub(b22, b12)
+    t4 = sub(t2, b21)
+
+    p1 = mul(a11, b11)
+    p2 = mul(a12, b21)
+    p3 = mul(s4, b22)
+    p4 = mul(a22, t4)
+    p5 = mul(s1, t1)
+    p6 = mul(s2, t2)
+    p7 = mul(s3, t3)
+
+    u2 = add(p1, p6)
+    u3 = add(u2, p7)
+    u4 = add(u2, p5)
+
+    result = np.empty((m, n), dtype=np.int64)
+    result[:m // 2, :n // 2] = add(p1, p2)
+    result[:m // 2, n // 2:] = add(u4, p3)
+    result[m // 2:, :n // 2] = sub(u3, p4)
+    result[m // 2:, n // 2:] = add(u3, p5)
+    return result
+
+
+# An array of members of one finite field, stored as their packed integers in
+# a NumPy array. Arithmetic is elementwise and done by the kernels above, so
+# whole arrays are combined without a call per member. A field member on the
+# right of an operation is applied to every element
+class FieldArray(object):
+    __slots__ = ("field", "array")
+
+    def __init__(self, field, array):
+        super(FieldArray, self).__init__()
+        if np == None:
+            raise ImportError("FieldArray needs numpy")
+        if not is_finite(field) or not has_kernels(field):
+            raise ValueError("FieldArray needs a finite field the array kernels can work with")
+        self.field = field
+        self.array = np.asarray(array, dtype=np.int64)
+
+    # The field is pickled as the arguments that make it
+    def __getstate__(self):
+        return (field_recipe(self.field), self.array)
+
+    def __setstate__(self, state):
+        recipe, self.array = state
+        self.field = field_from_recipe(recipe)
+
+    @staticmethod
+    def from_members(field, members):
+        return FieldArray(field, [member.value for member in members])
+
+    @staticmethod
+    def zeros(field, shape):
+        return FieldArray(field, np.zeros(shape, dtype=np.int64))
+
+    @staticmethod
+    def ones(field, shape):
+        return FieldArray(field, np.ones(shape, dtype=np.int64))
+
+    # The members, in order, as a flat list
+    def to_members(self):
+        return from_array(self.field, self.array.ravel())
+
+    # The packed integers of the other side of an operation
+    def operand(self, other):
+        if isinstance(other, FieldArray):
+            if other.field is not self.field:
+                raise TypeError("Field arrays are over different fields")
+            return other.array
+        if isinstance(other, self.field):
+            return np.int64(other.value)
+        raise TypeError("Can only combine a field array with another field array or a field member")
+
+    def __add__(self, other):
+        return FieldArray(self.field, field_add(self.field, self.array, self.operand(other)))
+
+    def __sub__(self, other):
+        return FieldArray(self.field, field_sub(self.field, self.array, self.operand(other)))
+
+    def __neg__(self):
+        return FieldArray(self.field, field_neg(self.field, self.array))
+
+    def __mul__(self, other):
+        return FieldArray(self.field, field_mul(self.field, self.array, self.operand(other)))
+
+    # Dividing by zero gives zero, like the packed and log members
+    def __div__(self, other):
+        return FieldArray(self.field, field_mul(self.field, self.array, field_inv(self.field, self.operand(other))))
+
+    __truediv__ = __div__
+
+    def __pow__(self, exponent):
+        return FieldArray(self.field, field_pow(self.field, self.array, exponent))
+
+    # Reductions give a member, or a field array when taken over one axis
+    def reduced(self, result):
+        if np.ndim(result) == 0:
+            return self.field.from_int(int(result))
+        return FieldArray(self.field, result)
+
+    def sum(self, axis=None):
+        return self.reduced(field_sum(self.field, self.array, axis))
+
+    def product(self, axis=None):
+        return self.reduced(field_prod(self.field, self.array, axis))
+
+    # Sums the products of two arrays over their last axis
+    def dot(self, other):
+        return self.reduced(field_dot(self.field, self.array, self.operand(other)))
+
+    def __eq__(self, other):
+        if isinstance(other, FieldArray):
+            return self.field is other.field and np.array_equal(self.array, other.array)
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __len__(self):
+        return len(self.array)
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    # A single element is a member, and anything else a field array
+    def __getitem__(self, index):
+        value = self.array[index]
+        if np.ndim(value) == 0:
+            return self.field.from_int(int(value))
+        return FieldArray(self.field, value)
+
+    def __setitem__(self, index, value):
+        self.array[index] = value.array if isinstance(value, FieldArray) else self.operand(value)
+
+    def __repr__(self):
+        return "FieldArray(" + self.field.__name__ + ", " + repr(self.array.tolist()) + ")"
+
+
+def field_array_tests():
+
+    if np == None:
+        return
+
+    # Elementwise arithmetic agrees with the members
+    for field in [F5, F4, F9, F16, F49, GF(101)]:
+        members = list(field.all_values())
+        a = FieldArray.from_members(field, members)
+        b = FieldArray.from_members(field, members[3:] + members[:3])
+        pairs = zip(members, members[3:] + members[:3])
+        assert (a + b).to_members() == [x + y for x, y in pairs]
+        assert (a - b).to_members() == [x - y for x, y in pairs]
+        assert (a * b).to_members() == [x * y for x, y in pairs]
+        assert (a / b).to_members() == [x / y if hash(y) else field.add_id() for x, y in pairs]
+        assert (-a).to_members() == [-x for x in members]
+        assert (a ** 5).to_members() == [x ** 5 for x in members]
+        assert (a[1:] ** -2).to_members() == [x ** -2 for x in members[1:]]
+        assert (a * members[2]).to_members() == [x * members[2] for x in members]
+
+        # Reductions
+        total = field.add_id()
+        product = field.mult_id()
+        dot = field.add_id()
+        for x, y in pairs:
+            total += x
+            product *= y if hash(y) else field.mult_id()
+            dot += x * y
+        assert a.sum() == total and a.dot(b) == dot
+        assert FieldArray(field, b.array[b.array != 0]).product() == product and a.product() == field.add_id()
+
+    # Reductions over one axis, and indexing
+    grid = FieldArray.from_members(F9, list(F9.all_values()))
+    grid = FieldArray(F9, grid.array.reshape(3, 3))
+    assert grid.sum(axis=1)[0] == grid[0].sum() and grid.product(axis=0)[2] == grid[0][2] * grid[1][2] * grid[2][2]
+    assert grid.dot(grid)[1] == grid[1].dot(grid[1]) and grid.shape == (3, 3) and len(grid) == 3
+    grid[0, 0] = F9("x")
+    assert grid[0, 0] is F9("x") and FieldArray.ones(F9, 3).product() == F9("1")
+    assert pickle.loads(pickle.dumps(grid)) == grid and pickle.loads(pickle.dumps(grid, 2)) == grid
+
+    # Dividing or multiplying by a single member, over prime and extension fields
+    for field, values in [(F5, [0, 1, 2, 3]), (F9, [0, 1, 4, 8])]:
+        members = [field.from_int(value) for value in values]
+        divisor = field.from_int(2)
+        assert (FieldArray.from_members(field, members) / divisor).to_members() == [m / divisor for m in members]
+        assert (FieldArray.from_members(field, members) * divisor).to_members() == [m * divisor for m in members]
+        assert (FieldArray.from_members(field, members) / field.add_id()).to_members() == [field.add_id()] * 4
+    assert field_pow(F9, np.int64(3), 2) == hash(F9.from_int(3) ** 2)
+
+    # Prime fields without tables still have powers and inverses
+    large = GF(1000003)
+    values = FieldArray(large, [1, 2, 999999, 123456])
+    assert (values * values ** -1) == FieldArray.ones(large, 4)
+    assert (values ** 3).to_members() == [large.from_int(value) ** 3 for value in [1, 2, 999999, 123456]]
+    for bad in [lambda: FieldArray(GF(2, 24), [1]), lambda: grid + FieldArray.zeros(F4, (3, 3))]:
+        try:
+            bad()
+            assert False
+        except (ValueError, TypeError):
+            pass
@@ -1,7 +1,86 @@
 import copy
+import pickle
+import fractions
+import re
+import tablecache
+from array import array
+import polyarithmetic
+
+# Integer tables keyed by field definition, and packed versions of field classes
+_int_tables_cache = {}
+_packed_classes = {}
+_log_classes = {}
+
+# One term of a polynomial string: a sign, a coefficient, and an x with an
+# optional power, in that order and each optional
+_term_pattern = re.compile(r"\s*([+-]?)\s*(\d*)\s*(?:(x)\s*(?:\^\s*(\d+))?)?\s*")
+
+# A dictionary of bounded size that forgets the entry used least recently
+# once it is full. Entries are kept in a circular linked list of
+# [previous, next, key, value] links, most recently used last
+class LRUCache(object):
+
+    def __init__(self, capacity):
+        super(LRUCache, self).__init__()
+        self.capacity = capacity
+        self.links = {}
+        self.root = []
+        self.root[:] = [self.root, self.root, None, None]
+
+    def __len__(self):
+        return len(self.links)
+
+    # Indexing gives None for keys not in the cache, like the member list of a
+    # small field, so either can hold a field's members
+    def __getitem__(self, key):
+        return self.get(key)
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    # Gets the value for a key, or None, and marks it as the most recently used
+    def get(self, key):
+        link = self.links.get(key)
+        if link is None:
+            return None
+        previous, following = link[0], link[1]
+        previous[1] = following
+        following[0] = previous
+        root = self.root
+        last = root[0]
+        last[1] = root[0] = link
+        link[0] = last
+        link[1] = root
+        return link[3]
+
+    # Stores a value for a key not in the cache, dropping the least recently used entry if full
+    def put(self, key, value):
+        root = self.root
+        if len(self.links) >= self.capacity:
+            oldest = root[1]
+            root[1] = oldest[1]
+            oldest[1][0] = root
+            del self.links[oldest[2]]
+        last = root[0]
+        link = [last, root, key, value]
+        last[1] = root[0] = link
+        self.links[key] = link
+
+    def clear(self):
+        self.links.clear()
+        self.root[:] = [self.root, self.root, None, None]
+
+# Members recently made from polynomial strings, keyed by field and string
+PARSE_CACHE_SIZE = 1 << 16
+_parse_cache = LRUCache(PARSE_CACHE_SIZE)
+
+# How many members of a field without tables are kept for reuse
+MEMBER_CACHE_SIZE = 1 << 16
 
 # The parent class of all fields
 class Field(object):
+    __slots__ = ()
+
     def __init__(self):
         super(Field, self).__init__()
 
@@ -31,6 +110,9 @@ class R(float):
 # The parent class of all finite fields. Uses logarithm tables only for speed
 class FiniteField(Field):
 
+    # Members only hold their packed integer and coefficients
+    __slots__ = ("value", "coefficients")
+
     # The characteristic
     characteristic = None
 
@@ -47,85 +129,93 @@ class FiniteField(Field):
     # The irreducible polynomial of the field. Must have leading coefficient of 1
     irreducible_poly = None
 
+    # Flat integer tables over packed members. Access with method instead
+    int_tables = None
+
+    # The same tables when only their log, antilog and Zech tables are used.
+    # Access with method instead
+    log_tables = None
+
+    # The list-based field that a packed or logarithmic variant was made from
+    base_field = None
+
+    # The interned members, indexed by packed value. Access with method instead
+    members = None
+
+    # The bytes the field may spend on its tables. Fields whose tables would
+    # take more do their arithmetic directly on packed members instead
+    memory_budget = 1 << 26
+
+    # The irreducible polynomial as a packed integer, once it is needed
+    packed_modulus = None
+
+    # The most baby steps the discrete logarithm keeps in memory at once
+    log_memory = 1 << 16
+
     # Gets the identities
     @classmethod
     def mult_id(cls):
-        return cls("1")
+        return cls.from_int(1)
 
     @classmethod
     def add_id(cls):
-        return cls("0")
+        return cls.from_int(0)
 
-    # Define a polynomial multiplier that does it the hard way
+    # Multiplies polynomials whose product has degree at most r, reducing it
+    # by the irreducible polynomial. Done with the packed arithmetic
     @classmethod
     def poly_mult(cls, p1, p2):
-
-        # Init the new polynomial
-        order1 = len(p1) - 1
-        order2 = len(p2) - 1
-        new_order = order1 + order2
-
-        # Carry out normal polynomial multiplication
-        result = [0 for i in xrange(new_order + 1)]
-        for power1, coef1 in enumerate(p1):
-            for power2, coef2 in enumerate(p2):
-                new_power = power1 + power2
-                new_coef = (coef1 * coef2) % cls.characteristic
-                result[new_power] += new_coef
-
-        # Reduce by the polynomial
-        irreducible_poly_order = len(cls.irreducible_poly) - 1
-        if new_order > irreducible_poly_order:
+        if len(p1) + len(p2) - 2 > len(cls.irreducible_poly) - 1:
             raise ValueError("Poly mult is not meant for this!")
-
-        if new_order == irreducible_poly_order:
-            x_to_order_equiv_neg = cls.irreducible_poly[:-1]
-            factor = -result[irreducible_poly_order]
-            del result[irreducible_poly_order]
-            for power in xrange(len(result)):
-                result[power] = (result[power] + (x_to_order_equiv_neg[power] * factor)) % cls.characteristic
-
-            # Trim zeros off the end
-            for i in xrange(len(result) - 1, 0, -1):
-                if result[i] == 0:
-                    del result[i]
-                else:
-                    break
-
-        return result
+        return cls.unpack(cls.packed_mult(cls.pack(p1), cls.pack(p2)))
 
     # Gets the size of the field
     @classmethod  
     def size(cls):
         return cls.characteristic ** cls.r
 
-    # Gets all elements of the field (as an iterable). Returns in order of primitive powers
+    # Roughly how many bytes the tables take: two flat tables of size^2
+    # entries, at about 16 bytes an entry
     @classmethod
-    def all_values(cls):
+    def table_bytes(cls):
+        return 32 * cls.size() ** 2
 
-        # Yield the additive identity first
-        yield cls("0")
+    # Whether the tables fit in the memory budget. Arithmetic, powers,
+    # inverses and logarithms use them when they do
+    @classmethod
+    def uses_tables(cls):
+        return cls.table_bytes() <= cls.memory_budget
 
-        # Then yield the multiplicative identity
-        yield cls("1")
+    # Roughly how many bytes the tables of one entry a member take: three
+    # arrays of 4 byte entries, and the negation and inversion lists
+    @classmethod
+    def log_table_bytes(cls):
+        return 80 * cls.size()
 
-        # Iterate through the rest of the multiplicative group
-        size_f_mult = cls.size() - 1
-        value = cls("1")
+    # Gets the primitive element as a member
+    @classmethod
+    def primitive_member(cls):
+        return cls.from_int(cls.pack(cls.primitive))
 
-        # Yield the subsequent powers
-        iteration = 1
-        while iteration < size_f_mult:
+    # Gets all elements of the field (as an iterable). Returns in order of primitive powers
+    @classmethod
+    def all_values(cls):
+
+        # Yield the additive identity first
+        yield cls.from_int(0)
 
-            # Compute the next element
-            new_value = cls("0")
-            new_value.coefficients = cls.poly_mult(value.coefficients, cls.primitive)
-            value = new_value
+        # Then yield the multiplicative group, starting with the identity
+        tables = cls.get_int_tables()
+        if tables != None:
+            for value in tables.int_log_table:
+                yield cls.from_int(value)
+            return
 
-            if value == cls.mult_id():
-                raise ValueError("Invalid primitive element")
-            yield value
-            iteration += 1
+        primitive = cls.primitive_member()
+        member = cls.mult_id()
+        for power in xrange(cls.size() - 1):
+            yield member
+            member = member * primitive
 
     # Gets the logarithm table for the finite field
     @classmethod
@@ -137,17 +227,11 @@ class FiniteField(Field):
             log_table = []
             log_table_reverse = {}
 
-            power = 0
-
             # Store finite field members in the table - not polynomial lists
-            for value in cls.all_values():
-
-                # The additive identity is not included in the log table
-                if value == cls.add_id():
-                    continue
-                log_table.append(value)
-                log_table_reverse[value] = power
-                power += 1
+            for power, value in enumerate(cls.require_tables().int_log_table):
+                member = cls.from_int(value)
+                log_table.append(member)
+                log_table_reverse[member] = power
 
             cls.log_table = log_table
             cls.log_table_reverse = log_table_reverse
@@ -160,99 +244,333 @@ class FiniteField(Field):
         cls.get_log_table()
         return cls.log_table_reverse
 
-    # Create a polynomial from a string
-    def __init__(self, string):
-        super(FiniteField, self).__init__()
-
-        # Store polynomial coefficients (of instances)
-        self.coefficients = []
-
-        compact = string.replace(" ", "")
+    # Gets the flat integer tables shared by every field with the same
+    # definition, or None when they do not fit in the memory budget
+    @classmethod
+    def get_int_tables(cls):
+        if cls.int_tables == None:
+            if not cls.uses_tables():
+                return None
+            cls.int_tables = cls.shared_tables()
+        return cls.int_tables
+
+    # Gets the tables for code that only looks up logarithms, antilogarithms,
+    # Zech logarithms, negatives and inverses. These take memory in proportion
+    # to the size of the field rather than its square, so they are there for
+    # fields far too large for the flat tables. None when they do not fit
+    @classmethod
+    def get_log_tables(cls):
+        if cls.log_tables == None:
+            if cls.int_tables == None and cls.log_table_bytes() > cls.memory_budget:
+                return None
+            cls.log_tables = cls.int_tables or cls.shared_tables()
+        return cls.log_tables
+
+    # Gets (once) the tables of every field with the same definition
+    @classmethod
+    def shared_tables(cls):
+        key = (cls.characteristic, cls.r, tuple(cls.irreducible_poly), tuple(cls.primitive))
+        tables = _int_tables_cache.get(key)
+        if tables == None:
+            tables = FieldTables(cls)
+            _int_tables_cache[key] = tables
+        return tables
+
+    # Gets the tables for code that cannot work without them
+    @classmethod
+    def require_tables(cls):
+        tables = cls.get_int_tables()
+        if tables == None:
+            raise ValueError(cls.__name__ + " is too large for its tables. Raise its memory_budget to use them")
+        return tables
 
-        # Handle zero
-        if compact == "0":
-            self.coefficients.append(0)
+    # Gets the log tables for code that cannot work without them
+    @classmethod
+    def require_log_tables(cls):
+        tables = cls.get_log_tables()
+        if tables == None:
+            raise ValueError(cls.__name__ + " is too large for its log tables. Raise its memory_budget to use them")
+        return tables
 
-        # Parse terms
-        else:
-            terms = compact.split("+")
-            degree = -1
-            for term in list(reversed(terms)):
-                coef = None
-                power = None
-
-                # Attempt to split cleanly into coef and power
-                coef_power = filter(None, term.split("x^"))
-                if (len(coef_power) > 1):
-                    coef = int(coef_power[0])
-                    power = int(coef_power[1])
-
-                else:
-                    x_index = term.find("x")
-
-                    if (x_index == -1):
-                        # We simply have a constant
-                        coef = int(term)
-                        power = 0
-
-                    else:
-                        # There is an x
-                        if term.find("^") == -1:
-
-                            # Power is 1
-                            power = 1
-                            coef_string = term[:-1]
-                            if coef_string == "-": coef_string = "-1"
-                            coef = int(coef_string) if term[:-1] else 1
-                        else:
-                            # Coefficient is 1
-                            coef = 1
-                            power = int(term[2:])
-
-
-                if coef == None or power == None:
-                    raise ValueError("Could not parse input polynomial")
-
-                # Add the term, first doing some padding with 0 coefficients if necessary
-                while degree < power - 1:
-                    self.coefficients.append(0)
-                    degree += 1
-                self.coefficients.append(coef % type(self).characteristic)
-                degree = power
-
-    # Adds two field members together
-    def __add__(self, other):
-        result = type(self)("0")
-        result.coefficients = []
-
-        self_coef_num = len(self.coefficients)
-        other_coef_num = len(other.coefficients)
-        result_coef_num = max(self_coef_num, other_coef_num)
-
-        for power in xrange(result_coef_num):
-            self_coef = self.coefficients[power] if power < self_coef_num else 0
-            other_coef = other.coefficients[power] if power < other_coef_num else 0
-            result.coefficients.append((self_coef + other_coef) % type(self).characteristic)
-
-        # Trim zeros off the end
-        for i in xrange(len(result.coefficients) - 1, 0, -1):
-            if result.coefficients[i] == 0:
-                del result.coefficients[i]
-            else:
-                break
+    # Adds packed members without the tables, digit by digit
+    @classmethod
+    def packed_add(cls, a, b):
+        p = cls.characteristic
+        if p == 2:
+            return a ^ b
+        if cls.r == 1:
+            return (a + b) % p
+        result, place = 0, 1
+        while a or b:
+            result += ((a + b) % p) * place
+            a //= p
+            b //= p
+            place *= p
+        return result
 
+    @classmethod
+    def packed_neg(cls, a):
+        p = cls.characteristic
+        if p == 2:
+            return a
+        if cls.r == 1:
+            return -a % p
+        result, place = 0, 1
+        while a:
+            result += (-a % p) * place
+            a //= p
+            place *= p
         return result
 
-    # Hashes a field member
-    def __hash__(self):
+    # Multiplies packed members without the tables. In characteristic 2 this is
+    # carry-less multiplication, reducing by the irreducible polynomial each
+    # time the shifted factor reaches degree r
+    @classmethod
+    def packed_mult(cls, a, b):
+        p = cls.characteristic
+        if cls.r == 1:
+            return a * b % p
+        if p == 2:
+            modulus = cls.packed_modulus
+            if modulus is None:
+                modulus = cls.packed_modulus = cls.pack(cls.irreducible_poly)
+            top = 1 << cls.r
+            result = 0
+            while b:
+                if b & 1:
+                    result ^= a
+                b >>= 1
+                a <<= 1
+                if a & top:
+                    a ^= modulus
+            return result
+        prime_field = GF(p)
+        product = polyarithmetic.multiply(prime_field, cls.unpack(a), cls.unpack(b))
+        return cls.pack(polyarithmetic.divide(prime_field, product, cls.irreducible_poly)[1])
+
+    # Inverts a nonzero packed member without the tables, by the extended
+    # Euclidean algorithm: on integers for prime fields, and otherwise on
+    # polynomials over the prime field against the irreducible polynomial
+    @classmethod
+    def packed_inverse(cls, a):
+        if a == 0:
+            raise ZeroDivisionError("Zero has no inverse")
+        p = cls.characteristic
+        if cls.r == 1:
+            return extended_euclid(a, p)[1] % p
+        return cls.pack(polyarithmetic.inverse_mod(GF(p), cls.unpack(a), cls.irreducible_poly))
+
+    # Packs a list of coefficients into a single integer (the same value as the hash)
+    @classmethod
+    def pack(cls, coefficients):
         val = 0
-        for power, coef in enumerate(self.coefficients):
-            val += (type(self).characteristic ** power) * coef
+        for coef in reversed(coefficients):
+            val = val * cls.characteristic + coef
         return val
 
+    # Unpacks an integer into a list of coefficients with no trailing zeros
+    @classmethod
+    def unpack(cls, value):
+        if value == 0:
+            return [0]
+        coefficients = []
+        while value:
+            coefficients.append(value % cls.characteristic)
+            value //= cls.characteristic
+        return coefficients
+
+    # Gets the list of interned members. Each member is only made the first
+    # time it is asked for, and is then shared by every result equal to it.
+    # Fields without tables keep only the members used most recently
+    @classmethod
+    def get_members(cls):
+        if cls.members is None:
+            cls.members = [None] * cls.size() if cls.uses_tables() else LRUCache(MEMBER_CACHE_SIZE)
+        return cls.members
+
+    # Gets the (interned) field member with a packed integer
+    @classmethod
+    def from_int(cls, value):
+        members = cls.members
+        if members is None:
+            members = cls.get_members()
+        member = members[value]
+        if member is None:
+            member = cls.make_member(value)
+            members[value] = member
+        return member
+
+    # Makes a new member object. Only used for interning
+    @classmethod
+    def make_member(cls, value):
+        member = cls.__new__(cls)
+        member.value = value
+        member.coefficients = cls.unpack(value)
+        return member
+
+    # Reduces a list of coefficients by the irreducible polynomial
+    @classmethod
+    def reduce_coefficients(cls, coefficients):
+        p = cls.characteristic
+        modulus = cls.irreducible_poly
+        degree = len(modulus) - 1
+        coefficients = list(coefficients)
+        for power in xrange(len(coefficients) - 1, degree - 1, -1):
+            coef = coefficients[power]
+            if coef:
+                for i, modulus_coef in enumerate(modulus):
+                    coefficients[power - degree + i] = (coefficients[power - degree + i] - coef * modulus_coef) % p
+        return coefficients[:degree]
+
+    # Gets the version of this field whose members are packed integers
+    @classmethod
+    def packed(cls):
+        return cls.variant(PackedFiniteField, _packed_classes)
+
+    # Gets the version of this field whose members are stored as primitive
+    # powers. Only fields with log tables have one
+    @classmethod
+    def logarithmic(cls):
+        cls.require_log_tables()
+        variant_cls = cls.variant(LogFiniteField, _log_classes)
+        variant_cls.get_log_tables()
+        return variant_cls
+
+    # Makes (once) a copy of the field that uses another member representation
+    @classmethod
+    def variant(cls, representation, variant_classes):
+        base_field = cls.base_field or cls
+        variant_cls = variant_classes.get(base_field)
+        if variant_cls == None:
+            variant_cls = type(representation.name_prefix + base_field.__name__, (representation,), {
+                "characteristic": base_field.characteristic,
+                "r": base_field.r,
+                "primitive": base_field.primitive,
+                "irreducible_poly": base_field.irreducible_poly,
+                "log_table": None,
+                "log_table_reverse": None,
+                "int_tables": None,
+                "log_tables": None,
+                "members": None,
+                "memory_budget": base_field.memory_budget,
+                "base_field": base_field,
+                "__slots__": ()
+            })
+            variant_cls.get_int_tables()
+            variant_classes[base_field] = variant_cls
+        return variant_cls
+
+    # Parses a polynomial string into a list of coefficients, in one pass over
+    # the terms. Terms can come in any order and be joined by + or -, and a
+    # power that appears twice has its coefficients summed
+    @classmethod
+    def parse_coefficients(cls, string):
+
+        p = cls.characteristic
+        coefficients = []
+        position = 0
+        end = len(string)
+        while position < end:
+            match = _term_pattern.match(string, position)
+            sign, coef, x, power = match.groups()
+
+            # Every term needs a coefficient or an x, and every term but the first a sign
+            if not (coef or x) or not (sign or position == 0):
+                raise ValueError("Could not parse input polynomial")
+            position = match.end()
+
+            coef = int(coef) if coef else 1
+            if sign == "-":
+                coef = -coef
+            power = (int(power) if power else 1) if x else 0
+
+            # Add the term, first doing some padding with 0 coefficients if necessary
+            if power >= len(coefficients):
+                coefficients.extend([0] * (power + 1 - len(coefficients)))
+            coefficients[power] = (coefficients[power] + coef) % p
+
+        if not coefficients:
+            raise ValueError("Could not parse input polynomial")
+        return coefficients
+
+    # Gets the members written as many polynomial strings, such as the entries
+    # of a matrix read from a file. Each distinct string is only parsed once
+    @classmethod
+    def parse_many(cls, strings):
+        parsed = {}
+        members = []
+        for string in strings:
+            member = parsed.get(string)
+            if member is None:
+                member = cls(string)
+                parsed[string] = member
+            members.append(member)
+        return members
+
+    # Gets the member written as a polynomial string. Members are interned, so
+    # this returns the one shared object for that member. Polynomials of too
+    # high a degree are reduced by the irreducible polynomial first. Recently
+    # parsed strings are looked up in the parse cache instead
+    def __new__(cls, string=None):
+        if string is None:
+            return super(FiniteField, cls).__new__(cls)
+
+        key = (cls, string)
+        member = _parse_cache.get(key)
+        if member is not None:
+            return member
+
+        coefficients = cls.parse_coefficients(string)
+        if len(coefficients) > cls.r:
+            coefficients = cls.reduce_coefficients(coefficients)
+        member = cls.from_int(cls.pack(coefficients))
+        _parse_cache.put(key, member)
+        return member
+
+    # Members are complete once made, and must not be changed as they are shared
+    def __init__(self, string=None):
+        super(FiniteField, self).__init__()
+
+    # Interned members are their own copies, and unpickle to the interned member
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (interned_member, (field_recipe(type(self)), self.value))
+
+    # Adds two field members together, coefficient by coefficient
+    def __add__(self, other):
+        cls = type(self)
+        tables = cls.int_tables or cls.get_int_tables()
+        if tables == None:
+            return cls.from_int(cls.packed_add(self.value, other.value))
+        return cls.from_int(tables.add_table[self.value * tables.size + other.value])
+
+    # Negates a field member
+    def __neg__(self):
+        cls = type(self)
+        tables = cls.int_tables or cls.get_int_tables()
+        if tables == None:
+            return cls.from_int(cls.packed_neg(self.value))
+        return cls.from_int(tables.neg_table[self.value])
+
+    # Subtracts two field members
+    def __sub__(self, other):
+        return self + (-other)
+
+    # Hashes a field member: its packed integer, worked out once
+    def __hash__(self):
+        return self.value
+
     # Multiplies two field members together
     def __mul__(self, other):
-        
+        cls = type(self)
+        if cls.int_tables == None and cls.get_int_tables() == None:
+            return cls.from_int(cls.packed_mult(self.value, other.value))
+
         zero = type(self).add_id()
         if other == zero or self == zero: return zero
 
@@ -264,9 +582,13 @@ class FiniteField(Field):
 
     # Divides two field members together
     def __div__(self, other):
-        
+        cls = type(self)
+        if cls.int_tables == None and cls.get_int_tables() == None:
+            if self.value == 0 or other.value == 0: return cls.from_int(0)
+            return cls.from_int(cls.packed_mult(self.value, cls.packed_inverse(other.value)))
+
         zero = type(self).add_id()
-        if other == zero: return zero
+        if other == zero or self == zero: return zero
 
         prim_power_self = type(self).get_log_table_reverse()[self]
         prim_power_other = -type(self).get_log_table_reverse()[other]
@@ -274,26 +596,79 @@ class FiniteField(Field):
 
         return type(self).log_table[prim_power_result]
 
-    # Defines equality between two fields
+    # Raises a field member to an integer power. Negative powers are powers of
+    # the inverse
+    def __pow__(self, exponent):
+        cls = type(self)
+        if self.value == 0:
+            if exponent < 0:
+                raise ZeroDivisionError("Zero has no inverse")
+            return cls.from_int(0 if exponent else 1)
+
+        order = cls.size() - 1
+        if cls.uses_tables():
+            tables = cls.get_int_tables()
+            return cls.from_int(tables.int_log_table[tables.int_log_table_reverse[self.value] * exponent % order])
+        base = self if exponent >= 0 else self.inverse()
+        return power_by_squaring(base, abs(exponent) % order)
+
+    # Gets the multiplicative inverse of a nonzero field member
+    def inverse(self):
+        cls = type(self)
+        if self.value == 0:
+            raise ZeroDivisionError("Zero has no inverse")
+        if cls.uses_tables():
+            return cls.from_int(cls.get_int_tables().inv_table[self.value])
+        return cls.from_int(cls.packed_inverse(self.value))
+
+    # Gets the power of the primitive element, or of another base, that gives
+    # this member. Raises ValueError when there is none
+    def discrete_log(self, base=None):
+        cls = type(self)
+        power = cls.primitive_log(self)
+        if base is None:
+            return power
+        return solve_congruence(cls.primitive_log(base), power, cls.size() - 1)
+
+    # Gets the power of the primitive element that gives a nonzero member
+    @classmethod
+    def primitive_log(cls, member):
+        if member.value == 0:
+            raise ValueError("Zero has no logarithm")
+        if cls.uses_tables():
+            return cls.get_int_tables().int_log_table_reverse[member.value]
+        return pohlig_hellman(cls.primitive_member(), member, cls.size() - 1, cls.log_memory)
+
+    # Defines equality between two fields. Equal members are usually the same
+    # interned object
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, self.__class__):
-            return self.coefficients == other.coefficients
+            return self.value == other.value
         else:
             return TypeError("Cannot compare these types")
 
     def __ne__(self, other):
+        if self is other:
+            return False
         if isinstance(other, self.__class__):
-            return self.coefficients != other.coefficients
+            return self.value != other.value
         else:
             return TypeError("Cannot compare these types")
 
     # Write the polynomial as a string
     def __unicode__(self):
+        return FiniteField.coefficients_string(self.coefficients)
+
+    # Writes a list of coefficients as a polynomial string
+    @staticmethod
+    def coefficients_string(coefficients):
 
         written_terms = []
 
         # Traverse coefficients in reverse order as we write them
-        for power, coef in reversed(list(enumerate(self.coefficients))):
+        for power, coef in reversed(list(enumerate(coefficients))):
 
             # Add term to written terms
             if coef != 0:
@@ -322,86 +697,555 @@ class FiniteField(Field):
         return self.__class__.__name__ + "(" + self.__unicode__() + ")"
 
 
-class F4(FiniteField):
-    characteristic = 2
-    r = 2
-    primitive = [0, 1]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [1, 1, 1]
+# Describes a field by the arguments GF makes its base field from (leaving out
+# the polynomial when it is the default one), and the representation of its members, so that unpickling can make it again in a
+# process where it does not exist yet. Worked out once per field
+_field_recipes = {}
+
+def field_recipe(field):
+    recipe = _field_recipes.get(field)
+    if recipe == None:
+        base_field = field.base_field or field
+        default = _gf_classes.get((base_field.characteristic, base_field.r, None)) is base_field
+        irreducible_poly = tuple(base_field.irreducible_poly) if base_field.r > 1 and not default else None
+        representation = field.__bases__[0] if field.base_field else FiniteField
+        recipe = (base_field.characteristic, base_field.r, irreducible_poly, representation)
+        _field_recipes[field] = recipe
+    return recipe
+
+# Makes (or finds) the field a recipe describes
+def field_from_recipe(recipe):
+    p, r, irreducible_poly, representation = recipe
+    field = GF(p, r, irreducible_poly)
+    if representation is PackedFiniteField:
+        return field.packed()
+    if representation is LogFiniteField:
+        return field.logarithmic()
+    return field
+
+# Gets the interned member of a field with a packed integer, for unpickling
+def interned_member(recipe, value):
+    return field_from_recipe(recipe).from_int(value)
+
+
+# Flat integer tables for a finite field, indexed by packed members (the value
+# of the member's hash). Tables of two arguments are indexed by a * size + b.
+# The log, antilog and Zech tables are arrays of size entries, and are mapped
+# from the on-disk cache when it has them. The flat addition and
+# multiplication tables have size^2 entries and are only made when used
+class FieldTables(object):
+
+    def __init__(self, field):
+        super(FieldTables, self).__init__()
+
+        p = field.characteristic
+        self.characteristic = p
+        self.r = field.r
+        self.size = field.size()
+        self.order = self.size - 1
+
+        # The log tables come from the on-disk cache when it has them
+        key = tablecache.table_key(p, field.r, field.irreducible_poly, field.primitive)
+        cached = tablecache.load_tables(key, self.size)
+        if cached != None:
+            self.int_log_table, self.int_log_table_reverse, self.zech_table = cached
+
+        # Otherwise walk the multiplicative group by repeatedly multiplying by the primitive
+        else:
+            self.int_log_table = array("i")
+            self.int_log_table_reverse = array("i", [-1]) * self.size
+            primitive = field.pack(field.primitive)
+            value = 1
+            for power in xrange(self.order):
+                if self.int_log_table_reverse[value] != -1:
+                    raise ValueError("Invalid primitive element")
+                self.int_log_table.append(value)
+                self.int_log_table_reverse[value] = power
+                value = field.packed_mult(value, primitive)
+
+        # Negation and inversion go through the logarithms: -1 = g^((q - 1) / 2)
+        # in odd characteristic, and 1 / g^n = g^-n
+        exp = self.int_log_table
+        log = self.int_log_table_reverse
+        order = self.order
+        self.neg_one_log = 0 if p == 2 else order // 2
+        self.neg_table = [exp[(log[a] + self.neg_one_log) % order] if a else 0 for a in xrange(self.size)]
+        self.inv_table = [exp[-log[a] % order] if a else 0 for a in xrange(self.size)]
+
+        # Zech logarithms: 1 + g^n = g^zech_table[n], or -1 when 1 + g^n = 0
+        if cached == None:
+            self.zech_table = array("i", [log[field.packed_add(1, value)] for value in exp])
+            tablecache.store_tables(key, self.int_log_table, self.int_log_table_reverse, self.zech_table)
+
+    # Makes the flat tables the first time they are looked up. From then on
+    # they are ordinary attributes, so this is not called for them again
+    def __getattr__(self, name):
+        if name == "add_table":
+            self.add_table = self.make_add_table()
+            return self.add_table
+        if name == "mult_table":
+            self.mult_table = self.make_mult_table()
+            return self.mult_table
+        raise AttributeError(name)
+
+    # Addition works coefficient by coefficient. With a = a0 + p a' and
+    # b = b0 + p b', a + b = (a0 + b0 mod p) + p (a' + b'), so each row is
+    # made from a row of the table for one coefficient fewer
+    def make_add_table(self):
+        p = self.characteristic
+        values = xrange(self.size)
+        if p == 2:
+            return [a ^ b for a in values for b in values]
+
+        digit_rows = [[(a + b) % p for b in xrange(p)] for a in xrange(p)]
+        rows = digit_rows
+        for digits in xrange(2, self.r + 1):
+            rows = [[p * high + low for high in rows[a // p] for low in digit_rows[a % p]] for a in xrange(p ** digits)]
+        return [value for row in rows for value in row]
+
+    # Multiplication goes through the logarithms: the row of g^n is the
+    # antilog table rotated by n, read off in the order of the logarithms
+    def make_mult_table(self):
+        exp = self.int_log_table.tolist()
+        log = self.int_log_table_reverse.tolist()
+        table = [0] * self.size
+        for a in xrange(1, self.size):
+            row = exp[log[a]:] + exp[:log[a]]
+            table.append(0)
+            table.extend(map(row.__getitem__, log[1:]))
+        return table
+
+
+# A finite field member stored as a single packed integer instead of a list of
+# coefficients. Arithmetic is done with lookups in the flat integer tables
+class PackedFiniteField(FiniteField):
+
+    __slots__ = ()
+
+    # Prepended to the base field's name
+    name_prefix = "Packed"
+
+    # Makes a new member object. Only used for interning
+    @classmethod
+    def make_member(cls, value):
+        member = cls.__new__(cls)
+        member.value = value
+        return member
 
-class F5(FiniteField):
-    characteristic = 5
-    r = 1
-    primitive = [2]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [0, 1] # This isn't used, but must have order 1
+    # The coefficients are only unpacked when asked for
+    @property
+    def coefficients(self):
+        return type(self).unpack(self.value)
 
-class F7(FiniteField):
-    characteristic = 7
-    r = 1
-    primitive = [3]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [0, 1] # This isn't used, but must have order 1
+    # Fields without tables fall back to the packed arithmetic of FiniteField
+    def __add__(self, other):
+        tables = type(self).int_tables
+        if tables == None: return FiniteField.__add__(self, other)
+        return type(self).from_int(tables.add_table[self.value * tables.size + other.value])
 
-class F8(FiniteField):
-    characteristic = 2
-    r = 3
-    primitive = [0, 1]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [1, 1, 0, 1]
+    def __neg__(self):
+        tables = type(self).int_tables
+        if tables == None: return FiniteField.__neg__(self)
+        return type(self).from_int(tables.neg_table[self.value])
 
-class F9(FiniteField):
-    characteristic = 3
-    r = 2
-    primitive = [0, 1]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [2, 2, 1]
+    def __sub__(self, other):
+        tables = type(self).int_tables
+        if tables == None: return FiniteField.__sub__(self, other)
+        return type(self).from_int(tables.add_table[self.value * tables.size + tables.neg_table[other.value]])
 
-class F16(FiniteField):
-    characteristic = 2
-    r = 4
-    primitive = [0, 1]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [1, 1, 0, 0, 1]
+    def __mul__(self, other):
+        tables = type(self).int_tables
+        if tables == None: return FiniteField.__mul__(self, other)
+        return type(self).from_int(tables.mult_table[self.value * tables.size + other.value])
 
-class F25(FiniteField):
-    characteristic = 5
-    r = 2
-    primitive = [0, 1]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [3, 3, 1]
+    # Dividing by zero gives zero, like the list-based fields
+    def __div__(self, other):
+        tables = type(self).int_tables
+        if tables == None: return FiniteField.__div__(self, other)
+        return type(self).from_int(tables.mult_table[self.value * tables.size + tables.inv_table[other.value]])
 
-class F27(FiniteField):
-    characteristic = 3
-    r = 3
-    primitive = [0, 1]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [1, 2, 0, 1]
 
-class F32(FiniteField):
-    characteristic = 2
-    r = 5
-    primitive = [0, 1]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [1, 0, 1, 0, 0, 1]
 
-class F49(FiniteField):
-    characteristic = 7
-    r = 2
-    primitive = [0, 1]
-    log_table = None
-    log_table_reverse = None
-    irreducible_poly = [3, 1, 1]
-        
+# A finite field member stored as its power of the primitive element, with -1
+# standing for zero. Multiplication adds powers, and addition uses the Zech
+# logarithm table, so chains of both operations never leave log space
+class LogFiniteField(FiniteField):
+
+    __slots__ = ("log",)
+
+    # Prepended to the base field's name
+    name_prefix = "Log"
+
+    # Gets the field member with a primitive power
+    @classmethod
+    def from_log(cls, log):
+        return cls.from_int(cls.log_tables.int_log_table[log] if log != -1 else 0)
+
+    # Makes a new member object. Only used for interning
+    @classmethod
+    def make_member(cls, value):
+        member = cls.__new__(cls)
+        member.value = value
+        member.log = cls.get_log_tables().int_log_table_reverse[value]
+        return member
+
+    # The coefficients are only unpacked when asked for
+    @property
+    def coefficients(self):
+        return type(self).unpack(self.value)
+
+    def __add__(self, other):
+        if self.log == -1: return other
+        if other.log == -1: return self
+
+        # g^a + g^b = g^a * (1 + g^(b - a))
+        tables = type(self).log_tables
+        zech = tables.zech_table[(other.log - self.log) % tables.order]
+        if zech == -1: return type(self).from_log(-1)
+        return type(self).from_log((self.log + zech) % tables.order)
+
+    def __neg__(self):
+        if self.log == -1: return self
+        tables = type(self).log_tables
+        return type(self).from_log((self.log + tables.neg_one_log) % tables.order)
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __mul__(self, other):
+        if self.log == -1 or other.log == -1: return type(self).from_log(-1)
+        return type(self).from_log((self.log + other.log) % type(self).log_tables.order)
+
+    # Dividing by zero gives zero, like the list-based fields
+    def __div__(self, other):
+        if self.log == -1 or other.log == -1: return type(self).from_log(-1)
+        return type(self).from_log((self.log - other.log) % type(self).log_tables.order)
+
+
+
+# Conway polynomials of the smaller extension fields, lowest coefficient first
+CONWAY_POLYNOMIALS = {
+    (2, 2): [1, 1, 1],
+    (2, 3): [1, 1, 0, 1],
+    (2, 4): [1, 1, 0, 0, 1],
+    (2, 5): [1, 0, 1, 0, 0, 1],
+    (2, 6): [1, 1, 0, 1, 1, 0, 1],
+    (2, 7): [1, 1, 0, 0, 0, 0, 0, 1],
+    (2, 8): [1, 0, 1, 1, 1, 0, 0, 0, 1],
+    (3, 2): [2, 2, 1],
+    (3, 3): [1, 2, 0, 1],
+    (3, 4): [2, 0, 0, 2, 1],
+    (3, 5): [1, 2, 0, 0, 0, 1],
+    (5, 2): [2, 4, 1],
+    (5, 3): [3, 3, 0, 1],
+    (7, 2): [3, 6, 1],
+    (7, 3): [4, 0, 6, 1],
+    (11, 2): [2, 7, 1],
+    (13, 2): [2, 12, 1]
+}
+
+# Field classes made by GF, keyed by characteristic, power and polynomial
+_gf_classes = {}
+
+# Factors below this are found by trial division, and larger ones by
+# Pollard's rho method
+TRIAL_DIVISION_LIMIT = 1000
+
+# The Miller-Rabin bases. With all of them the test is exact below 3.3 * 10^24,
+# and above that a composite passing it is vanishingly unlikely
+MILLER_RABIN_BASES = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53]
+
+# Determines whether n is prime by the Miller-Rabin test: with n - 1 = d 2^s,
+# each base a must have a^d = 1 or a^(d 2^i) = -1 mod n for some i < s
+def is_prime(n):
+    if n < 2:
+        return False
+    for prime in MILLER_RABIN_BASES:
+        if n % prime == 0:
+            return n == prime
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for base in MILLER_RABIN_BASES:
+        x = pow(base, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for i in xrange(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+# Finds a nontrivial factor of an odd composite n by Pollard's rho method, with
+# Brent's cycle finding: the walk x -> x^2 + c mod n repeats mod a factor long
+# before it repeats mod n, which shows up as a shared factor of a difference
+# and n. Differences are multiplied together so gcds are only taken every
+# so often, and a walk that finds n itself is retried with another c
+def pollard_rho(n):
+    if n % 2 == 0:
+        return 2
+    c = 1
+    while True:
+        y, r, product, factor = 2, 1, 1, 1
+        while factor == 1:
+            x = y
+            for i in xrange(r):
+                y = (y * y + c) % n
+            k = 0
+            while k < r and factor == 1:
+                saved = y
+                for i in xrange(min(128, r - k)):
+                    y = (y * y + c) % n
+                    product = product * abs(x - y) % n
+                factor = fractions.gcd(product, n)
+                k += 128
+            r *= 2
+
+        # The batch overshot: step through it one difference at a time
+        if factor == n:
+            factor = 1
+            while factor == 1:
+                saved = (saved * saved + c) % n
+                factor = fractions.gcd(abs(x - saved), n)
+        if factor != n:
+            return factor
+        c += 1
+
+# Gets the distinct prime factors of n, in increasing order: small ones by
+# trial division, and the rest by splitting with Pollard's rho method until
+# every part passes the Miller-Rabin test
+def prime_factors(n):
+    factors = set()
+    divisor = 2
+    while divisor < TRIAL_DIVISION_LIMIT and divisor * divisor <= n:
+        if n % divisor == 0:
+            factors.add(divisor)
+            while n % divisor == 0:
+                n //= divisor
+        divisor += 1
+
+    parts = [n] if n > 1 else []
+    while parts:
+        part = parts.pop()
+        if is_prime(part):
+            factors.add(part)
+        else:
+            factor = pollard_rho(part)
+            parts.extend([factor, part // factor])
+    return sorted(factors)
+
+# Splits n into (prime, exponent) pairs
+def factorize(n):
+    factors = []
+    for prime in prime_factors(n):
+        exponent = 0
+        while n % prime == 0:
+            n //= prime
+            exponent += 1
+        factors.append((prime, exponent))
+    return factors
+
+# Gets (g, s, t) with g = gcd(a, b) = s a + t b
+def extended_euclid(a, b):
+    s0, s1, t0, t1 = 1, 0, 0, 1
+    while b:
+        quotient = a // b
+        a, b = b, a - quotient * b
+        s0, s1 = s1, s0 - quotient * s1
+        t0, t1 = t1, t0 - quotient * t1
+    return a, s0, t0
+
+# Gets the smallest x >= 0 with a x = b mod n. Raises ValueError when there is none
+def solve_congruence(a, b, n):
+    g, s, t = extended_euclid(a % n, n)
+    if b % g:
+        raise ValueError("Not a power of the base")
+    n //= g
+    return (b // g) * s % n
+
+# Combines x = residue mod modulus for pairwise coprime moduli into one x
+def chinese_remainder(residues):
+    x, modulus = 0, 1
+    for residue, other_modulus in residues:
+        g, s, t = extended_euclid(modulus, other_modulus)
+        x = (x + (residue - x) * s * modulus) % (modulus * other_modulus)
+        modulus *= other_modulus
+    return x
+
+# Raises a field member to a non-negative power by square and multiply
+def power_by_squaring(member, exponent):
+    result = type(member).mult_id()
+    while exponent:
+        if exponent & 1:
+            result = result * member
+        exponent >>= 1
+        if exponent:
+            member = member * member
+    return result
+
+# Finds x in [0, order) with base^x = target, where base has the given order,
+# by baby steps base^j for j < m kept in a dictionary and giant steps
+# target * base^(-m i). At most memory baby steps are kept
+def baby_step_giant_step(base, target, order, memory):
+    steps = min(int(order ** 0.5) + 1, memory, order)
+    baby = {}
+    power = type(base).mult_id()
+    for j in xrange(steps):
+        baby.setdefault(power.value, j)
+        power = power * base
+    giant = (base ** steps).inverse()
+    current = target
+    for i in xrange((order + steps - 1) // steps):
+        j = baby.get(current.value)
+        if j is not None:
+            return i * steps + j
+        current = current * giant
+    raise ValueError("Not a power of the base")
+
+# Finds x with base^x = target by the Pohlig-Hellman method: the logarithm is
+# found mod each prime power l^e dividing the order, one base l digit at a
+# time in the subgroup of order l, and the results are combined
+def pohlig_hellman(base, target, order, memory):
+    residues = []
+    base_inverse = base.inverse()
+    for prime, exponent in factorize(order):
+        generator = base ** (order // prime)
+        x = 0
+        for k in xrange(exponent):
+            digit_target = (base_inverse ** x * target) ** (order // prime ** (k + 1))
+            x += baby_step_giant_step(generator, digit_target, prime, memory) * prime ** k
+        residues.append((x, prime ** exponent))
+    return chinese_remainder(residues)
+
+# Determines whether x generates the multiplicative group mod a monic polynomial.
+# That can only happen when the polynomial is irreducible, so it checks both
+def is_primitive_poly(poly, p):
+    r = len(poly) - 1
+    if r < 1 or poly[-1] != 1 or poly[0] % p == 0:
+        return False
+    if r == 1:
+        return is_primitive_root((-poly[0]) % p, p)
+
+    prime_field = GF(p)
+    order = p ** r - 1
+    x = [0, 1]
+    if polyarithmetic.power_mod(prime_field, x, order, poly) != [1]:
+        return False
+    for factor in prime_factors(order):
+        if polyarithmetic.power_mod(prime_field, x, order // factor, poly) == [1]:
+            return False
+    return True
+
+# Determines whether g generates the multiplicative group mod a prime
+def is_primitive_root(g, p):
+    if g % p == 0:
+        return False
+    for factor in prime_factors(p - 1):
+        if pow(g, (p - 1) // factor, p) == 1:
+            return False
+    return True
+
+# Finds a primitive polynomial of degree r over Z_p. Uses the Conway polynomial
+# when it is known, and otherwise the first primitive one in packed order
+def find_primitive_poly(p, r):
+    if (p, r) in CONWAY_POLYNOMIALS:
+        return CONWAY_POLYNOMIALS[(p, r)]
+
+    # Counted by hand, since p^r can be too large for xrange
+    lower = 1
+    while lower < p ** r:
+        poly = []
+        value = lower
+        while len(poly) < r:
+            poly.append(value % p)
+            value //= p
+        poly.append(1)
+        if is_primitive_poly(poly, p):
+            return poly
+        lower += 1
+
+    raise ValueError("No primitive polynomial found")
+
+# Makes (once) the finite field of size p^r. An irreducible polynomial can be
+# given, in which case it must have x as a primitive element. A memory budget
+# for the tables can be given too; tables already made are kept. Asking again
+# with the polynomial the field was made with gives the same class
+def GF(p, r=1, irreducible_poly=None, memory_budget=None, name=None):
+
+    # Prime fields have no polynomial, and extension fields are keyed by theirs
+    key = (p, r, tuple(irreducible_poly) if irreducible_poly and r > 1 else None)
+    field = _gf_classes.get(key)
+    if field == None:
+        field = make_field(p, r, irreducible_poly, memory_budget, name)
+        field = _gf_classes.setdefault((p, r, tuple(field.irreducible_poly) if r > 1 else None), field)
+        _gf_classes[key] = field
+    if memory_budget != None:
+        field.memory_budget = memory_budget
+    return field
+
+# Makes a new finite field class for GF. Unless a name is given, fields made
+# with a polynomial other than the Conway polynomial have it in their name, as
+# does any field whose plain name another field already has, so that two
+# fields of the same size never share one
+def make_field(p, r, irreducible_poly, memory_budget, name=None):
+
+    if not is_prime(p):
+        raise ValueError("Characteristic must be prime")
+    if r < 1:
+        raise ValueError("Field power must be at least 1")
+
+    named = name != None
+    name = name or "F" + str(p ** r)
+
+    # Prime fields are generated by the smallest primitive root
+    if r == 1:
+        primitive = 1 if p == 2 else 2
+        while not is_primitive_root(primitive, p):
+            primitive += 1
+        attributes = {"primitive": [primitive], "irreducible_poly": [0, 1]} # This isn't used, but must have order 1
+
+    # Extension fields are generated by x
+    else:
+        poly = list(irreducible_poly) if irreducible_poly else find_primitive_poly(p, r)
+        taken = any(field.__name__ == name for field in _gf_classes.values())
+        if not named and (taken or irreducible_poly and poly != CONWAY_POLYNOMIALS.get((p, r))):
+            name += "_" + "_".join(map(str, poly))
+        if not is_primitive_poly(poly, p):
+            raise ValueError("Polynomial is not primitive: x must generate the field")
+        attributes = {"primitive": [0, 1], "irreducible_poly": poly}
+
+    attributes.update({
+        "characteristic": p,
+        "r": r,
+        "log_table": None,
+        "log_table_reverse": None,
+        "int_tables": None,
+        "log_tables": None,
+        "members": None,
+        "__slots__": ()
+    })
+    if memory_budget != None:
+        attributes["memory_budget"] = memory_budget
+    field = type(name, (FiniteField,), attributes)
+    field.get_int_tables()
+    return field
+
+
+F2 = GF(2)
+F4 = GF(2, 2)
+F5 = GF(5)
+F7 = GF(7)
+F8 = GF(2, 3)
+F9 = GF(3, 2)
+F16 = GF(2, 4)
+F25 = GF(5, 2, [3, 3, 1], name="F25")
+F27 = GF(3, 3)
+F32 = GF(2, 5)
+F49 = GF(7, 2, [3, 1, 1], name="F49")
+
 
 def field_tests():
 
@@ -460,4 +1304,162 @@ def field_tests():
     assert a49 + b49 == F49("5x + 4")
     assert F49("6x") + F49("1") == F49("6x + 1")
 
-
+    # Packed members agree with the list-based ones
+    P8 = F8.packed()
+    assert P8("x^2 + 1") * P8("x") == P8("1")
+    assert P8("x^2 + 1") + P8("x") == P8("x^2 + x + 1")
+    assert repr(P8("x^2 + 1")) == "PackedF8(x^2 + 1)"
+    assert -F25("2x + 3") == F25("3x + 2")
+    assert -F25.packed()("2x + 3") == F25.packed()("3x + 2")
+    P9 = F9.packed()
+    for a in F9.all_values():
+        for b in F9.all_values():
+            pa = P9.from_int(hash(a))
+            pb = P9.from_int(hash(b))
+            assert pa + pb == P9.from_int(hash(a + b))
+            assert pa - pb == P9.from_int(hash(a - b))
+            assert pa * pb == P9.from_int(hash(a * b))
+            assert pa / pb == P9.from_int(hash(a / b))
+
+    # Log members agree with the list-based ones
+    L9 = F9.logarithmic()
+    assert L9("x + 1") * L9("x + 1") == L9("2")
+    assert repr(L9("2x")) == "LogF9(2x)"
+    for a in F9.all_values():
+        for b in F9.all_values():
+            la = L9.from_int(hash(a))
+            lb = L9.from_int(hash(b))
+            assert la + lb == L9.from_int(hash(a + b))
+            assert la - lb == L9.from_int(hash(a - b))
+            assert la * lb == L9.from_int(hash(a * b))
+    L16 = F16.logarithmic()
+    assert L16("x^3 + 1") * L16("x + 1") + L16("x") == L16("x^3 + x")
+
+    # Generated fields
+    assert GF(2, 3) is F8
+    assert F5.primitive == [2] and F7.primitive == [3]
+    assert GF(3, 2).irreducible_poly == [2, 2, 1]
+    F256 = GF(2, 8)
+    assert F256("x^7") * F256("x") == F256("x^4 + x^3 + x^2 + 1")
+    assert F256("x^5 + x + 1") / F256("x^3") * F256("x^3") == F256("x^5 + x + 1")
+    F101 = GF(101)
+    assert F101("100") * F101("100") == F101("1")
+    assert F101.primitive == [2]
+    assert GF(3, 5).size() == 243
+    for (p, r), poly in CONWAY_POLYNOMIALS.items():
+        assert is_primitive_poly(poly, p)
+    for p, r in [(2, 9), (3, 6), (17, 2)]:
+        assert is_primitive_poly(find_primitive_poly(p, r), p)
+    assert not is_primitive_poly([1, 0, 1], 2)
+
+    # Members are interned, so equal members are the same object
+    assert F9("x + 1") is F9("x + 1") is F9.from_int(4)
+    assert F16("x^2") * F16("x") is F16("x^3") and F9.add_id() is F9("0")
+    assert F9("x^2") is F9("x + 1")
+    assert copy.deepcopy([F4("x")])[0] is F4("x")
+    assert pickle.loads(pickle.dumps(F8("x^2 + 1"))) is F8("x^2 + 1")
+
+    # Members of any field pickle through the arguments that make the field
+    F256 = GF(2, 8)
+    for member in [F256("x^7 + x"), F256.packed()("x + 1"), F16.logarithmic()("x^3"), F49("6x + 5"), GF(101)("57")]:
+        for protocol in [0, 2]:
+            assert pickle.loads(pickle.dumps(member, protocol)) is member
+    assert GF(2, 8, F256.irreducible_poly) is F256 and GF(5, 2, [3, 3, 1]) is F25
+    assert GF(2, 9) is GF(2, 9, find_primitive_poly(2, 9))
+    assert GF(5, 2) is not F25 and GF(5, 2).__name__ == "F25_2_4_1" and F25.__name__ == "F25"
+    assert F49.__name__ == "F49" and GF(7, 2).__name__ == "F49_3_6_1" and GF(3, 4).__name__ == "F81"
+    P16 = F16.packed()
+    assert P16("x + 1") is P16.from_int(3) and L16("x + 1") is L16.from_int(3)
+    assert len(set(id(member) for member in F16.all_values())) == 16
+    assert not hasattr(F16("x"), "__dict__") and not hasattr(L16("x"), "__dict__") and not hasattr(P16("x"), "__dict__")
+
+    # The parser takes terms in any order, joined by + or -, with any spacing
+    assert F9.parse_coefficients("2x^3 + x + 1") == [1, 1, 0, 2]
+    assert F9("1 + x") is F9("x + 1") and F9("x - 1") is F9("x + 2") and F9("-x") is F9("2x")
+    assert F9(" x ^ 2 +  2 x") is F9("1") and F16("x + x") is F16("0")
+    for bad in ["", " ", "x2", "1 +", "+", "y", "2 3"]:
+        try:
+            F9(bad)
+            assert False
+        except ValueError:
+            pass
+    assert F16.parse_many(["x", "1", "x"]) == [F16("x"), F16("1"), F16("x")]
+
+    # The parse cache forgets the least recently used entries once full
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.get("c") == 3 and len(cache) == 2
+
+    # Powers, inverses and logarithms agree with and without the tables
+    F256 = GF(2, 8)
+    samples = [(F256, F256("x^7 + x + 1")), (F49, F49("3x + 2")), (F101, F101("57"))]
+    expected = [(a ** 37, a ** -5, a.inverse(), a.discrete_log()) for field, a in samples]
+    for (field, a), results in zip(samples, expected):
+        field.memory_budget, field.log_memory = 0, 3
+        try:
+            assert (a ** 37, a ** -5, a.inverse(), a.discrete_log()) == results
+            assert a * a.inverse() == field.mult_id() and field.primitive_member() ** a.discrete_log() == a
+        finally:
+            del field.memory_budget, field.log_memory
+    g = F256.primitive_member()
+    assert (g ** 30).discrete_log(g ** 3) == 10 and F9("0") ** 0 == F9("1") and F9("x") ** 8 == F9("1")
+    for bad in [lambda: (g ** 31).discrete_log(g ** 3), lambda: F9("0").discrete_log()]:
+        try:
+            bad()
+            assert False
+        except ValueError:
+            pass
+    assert factorize(360) == [(2, 3), (3, 2), (5, 1)] and chinese_remainder([(2, 3), (3, 5)]) == 8
+
+    # Factoring uses Miller-Rabin and Pollard's rho, so orders with large prime
+    # factors factor quickly, including prime orders such as 2^61 - 1
+    assert [n for n in xrange(60) if is_prime(n)] == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59]
+    assert not is_prime(561) and not is_prime(3215031751) and is_prime(2 ** 61 - 1) and is_prime(2 ** 89 - 1)
+    assert factorize(2 ** 67 - 1) == [(193707721, 1), (761838257287, 1)]
+    assert factorize(4 * 1000000007 ** 2 * 998244353) == [(2, 2), (998244353, 1), (1000000007, 2)]
+    F2_61 = GF(2, 61)
+    F2_61.log_memory = 1 << 8
+    assert prime_factors(F2_61.size() - 1) == [2 ** 61 - 1]
+    assert (F2_61.primitive_member() ** 12345).discrete_log() == 12345
+
+    # Packed arithmetic without tables agrees with the tables
+    for field in [F9, F16, F27]:
+        tables = field.get_int_tables()
+        values = xrange(field.size())
+        assert [field.packed_add(a, b) for a in values for b in values] == tables.add_table
+        assert [field.packed_mult(a, b) for a in values for b in values] == tables.mult_table
+        assert [field.packed_neg(a) for a in values] == tables.neg_table
+        assert [field.packed_inverse(a) for a in values if a] == tables.inv_table[1:]
+
+    # Fields over their memory budget work without tables
+    for field in [GF(2, 16), GF(3, 10), GF(1000000007), GF(2, 64)]:
+        assert not field.uses_tables() and field.get_int_tables() == None
+        a = field.primitive_member() ** 1000
+        b, c = field.from_int(7), field.from_int(5)
+        assert (a + b) * c == a * c + b * c and a * a.inverse() == field.mult_id() and (a / b) * b == a
+        assert a ** (field.size() - 1) == field.mult_id() and -a + a == field.add_id()
+        assert field("x + 1") is field("x + 1")
+        packed = field.packed()
+        assert packed.from_int(a.value) * packed.from_int(b.value) == packed.from_int((a * b).value)
+    F65536 = GF(2, 16)
+    x1000 = polyarithmetic.power_mod(F2, [0, 1], 1000, F65536.irreducible_poly)
+    assert F65536.primitive_member() ** 1000 == F65536.from_int(F65536.pack(x1000))
+    assert (F65536.primitive_member() ** 12345).discrete_log() == 12345
+    small = GF(2, 3, [1, 0, 1, 1], memory_budget=0)
+    assert small.get_int_tables() == None and len(set(small.all_values())) == 8
+
+    # Fields too large for the flat tables still have log tables, and so a
+    # logarithmic variant. Only far larger fields have neither
+    log_field = GF(2, 16).logarithmic()
+    assert GF(2, 16).get_int_tables() == None and log_field.get_log_tables() != None
+    a, b = log_field.from_int(1234), log_field.from_int(4321)
+    assert (a + b) * a == a * a + b * a and (a / b) * b == a and -a + a == log_field.add_id()
+    assert hash(a * b) == F65536.packed_mult(1234, 4321)
+    try:
+        GF(2, 24).logarithmic()
+        assert False
+    except ValueError:
+        pass
@@ -1,84 +1,174 @@
 from permutation import *
+from permgroup import *
 from matrix import *
 from fields import *
+from arraymatrix import *
+
+# Normalises a vector so its first nonzero coordinate is 1, and returns the
+# packed coordinates. Vectors on the same line through the origin share a key
+def canonical_key(vector):
+    for leading in vector:
+        if hash(leading) != 0:
+            return tuple(hash(coordinate / leading) for coordinate in vector)
+    return None
+
+# The keys of many vectors at once, normalised together as one FieldArray
+def canonical_keys(field, vectors):
+    points = FieldArray.from_members(field, [coordinate for vector in vectors for coordinate in vector])
+    points = FieldArray(field, points.array.reshape(len(vectors), -1))
+    nonzero = points.array != 0
+    leading = points.array[np.arange(len(vectors)), nonzero.argmax(axis=1)]
+    normalised = points / FieldArray(field, leading[:, None])
+    return [tuple(key) if any(row) else None for key, row in zip(normalised.array.tolist(), nonzero.tolist())]
+
+# The points of a projective line: one vector for each line through the origin.
+# Finding the line of a vector takes one normalisation and one hash lookup
+class ProjectiveLine(list):
+
+    def __init__(self, lines):
+        super(ProjectiveLine, self).__init__(lines)
+        self.index = {}
+        field = lines[0].get_field() if lines else None
+        if field != None and use_field_array(field, len(lines) * len(lines[0])):
+            keys = canonical_keys(field, self)
+        else:
+            keys = [canonical_key(line) for line in self]
+        for index, key in enumerate(keys):
+            self.index[key] = index
+
+    # Makes the projective line of a field: [1, 0], [0, 1], and then [1, a] for
+    # each nonzero a in packed order
+    @staticmethod
+    def of_field(field):
+        zero = field.add_id()
+        one = field.mult_id()
+        lines = [Vector([one, zero]), Vector([zero, one])]
+        for value in xrange(1, field.size()):
+            lines.append(Vector([one, field.from_int(value)]))
+        return ProjectiveLine(lines)
+
+    # Returns the index of the line that the vector belongs to
+    def which(self, vector):
+        return self.index.get(canonical_key(vector))
 
 # Returns the index of the line that the vector belongs to. Also takes a list of vectors
 def which_line(vector, lines):
 
     assert lines
 
-    field = type(lines[0][0])
+    if not isinstance(lines, ProjectiveLine):
+        lines = ProjectiveLine(lines)
 
-    all_non_zero = []
-    for member in field.all_values():
-        all_non_zero.append(member)
-    all_non_zero.remove(field.add_id())
+    return lines.which(vector)
 
-    for index, initial in enumerate(lines):
-        for scalar in all_non_zero:
-            if vector == (initial * scalar): return index
-
-    return None
-
-# Converts a matrix to a line
+# Converts a matrix to a permutation of the lines
 def matrix_to_permutation(matrix, lines):
 
-    # Get symbols from lines
-    symbols = range(len(lines))
-    symbols.reverse()
-    char_symbols = map(str, symbols)
-
-    # The permutation to return
-    permutation = Permutation("I", char_symbols)
-
-    # Map each of the lines
-    symbols_left_to_map = copy.copy(symbols)
-    from_index = symbols_left_to_map.pop()
-    while symbols_left_to_map:
-
-        if from_index in symbols_left_to_map:
-            symbols_left_to_map.remove(from_index)
-            continue
+    if not isinstance(lines, ProjectiveLine):
+        lines = ProjectiveLine(lines)
 
-        # See we are taken
-        line_vector = lines[from_index]
+    # See where each of the lines is taken
+    images = []
+    for line_vector in lines:
         to_vector = matrix * line_vector
-        to_index = which_line(to_vector, lines)
+        to_index = lines.which(to_vector)
 
         # It should always go to a line
         if to_index == None:
             raise ValueError("Found a vector not in any of the lines: " + str(to_vector))
-
-        # If it goes somewhere else update the permutation
-        if to_index in symbols_left_to_map:
-            smaller = str(min(from_index, to_index))
-            larger = str(max(from_index, to_index))
-            swap = Permutation("(" + smaller + larger + ")", char_symbols)
-            permutation = Permutation.compose(permutation, swap)
-            from_index = to_index
-
-        # Otherwise, find a new starting point
-        else:
-            from_index = symbols_left_to_map.pop()
-
-    return permutation
-
-lines_f4 = [
+        images.append(to_index)
+
+    return Permutation.from_images(images, range(len(lines)))
+
+# The permutations of the lines given by a batch of matrices, stored as one row
+# of line indices per matrix. Permutation objects are only made when indexed
+class PermutationImages(object):
+
+    def __init__(self, images):
+        super(PermutationImages, self).__init__()
+        self.images = images
+        self.symbols = range(images.shape[1])
+
+    def __len__(self):
+        return self.images.shape[0]
+
+    def __getitem__(self, index):
+        return Permutation.from_images(list(self.images[index]), self.symbols)
+
+    def __iter__(self):
+        for index in xrange(len(self)):
+            yield self[index]
+
+# Converts every matrix of a batch to its permutation of the lines at once. All
+# matrices of a block are applied to all points in one product, then the images
+# are normalised and looked up together
+def matrices_to_permutations(batch, lines, block_size=4096):
+
+    if not isinstance(batch, MatrixBatch):
+        batch = MatrixBatch.from_matrices(batch)
+    if not isinstance(lines, ProjectiveLine):
+        lines = ProjectiveLine(lines)
+
+    field = batch.field
+    dimension = batch.array.shape[1]
+    places = field.size() ** np.arange(dimension, dtype=np.int64)
+
+    # Sorted keys of the points, normalised like matrix_to_permutation does
+    points = np.array([[hash(coordinate) for coordinate in line] for line in lines], dtype=np.int64)
+    normalised = np.zeros_like(points)
+    for key, index in lines.index.items():
+        if key != None:
+            normalised[index] = key
+    point_keys = np.dot(normalised, places)
+    order = np.argsort(point_keys)
+    sorted_keys = point_keys[order]
+
+    result = np.empty((len(batch), len(points)), dtype=np.int64)
+    for start in xrange(0, len(batch), block_size):
+
+        # Apply every matrix to every point: images[matrix, coordinate, point]
+        images = field_matmul(field, batch.array[start:start + block_size], points.T)
+
+        # Scale each image so its first nonzero coordinate is 1
+        count = images.shape[0]
+        first = (images != 0).argmax(axis=1)
+        leading = images[np.arange(count)[:, None], first, np.arange(len(points))[None, :]]
+        images = (FieldArray(field, images) / FieldArray(field, leading[:, None, :])).array
+
+        # Look up the normalised images among the points
+        image_keys = np.einsum("mcp,c->mp", images, places)
+        positions = np.searchsorted(sorted_keys, image_keys).clip(0, len(sorted_keys) - 1)
+        if not (sorted_keys[positions] == image_keys).all():
+            raise ValueError("Found a vector not in any of the lines")
+        result[start:start + count] = order[positions]
+
+    return PermutationImages(result)
+
+# The group of permutations of the lines generated by some matrices
+def line_permutation_group(matrices, lines, **options):
+    return PermutationGroup([matrix_to_permutation(matrix, lines) for matrix in matrices], range(len(lines)), **options)
+
+# Keeps the numbering used in the problem set
+lines_f4 = ProjectiveLine([
     Vector([F4("1"), F4("0")]),     # 0
     Vector([F4("0"), F4("1")]),     # 1
     Vector([F4("1"), F4("x")]),     # 2
     Vector([F4("1"), F4("1")]),     # 3
     Vector([F4("1"), F4("x + 1")])  # 4
-]
+])
+
+lines_f5 = ProjectiveLine.of_field(F5)
 
-lines_f5 = [
-    Vector([F5("1"), F5("0")]), # 0
-    Vector([F5("0"), F5("1")]), # 1
-    Vector([F5("1"), F5("1")]), # 2
-    Vector([F5("1"), F5("2")]), # 3
-    Vector([F5("1"), F5("3")]), # 4
-    Vector([F5("1"), F5("4")])  # 5
-]
+# Projective lines made so far, keyed by field
+_projective_lines = {F4: lines_f4, F5: lines_f5}
+
+# Gets (once) the projective line of a field
+def projective_line(field):
+    lines = _projective_lines.get(field)
+    if lines == None:
+        lines = ProjectiveLine.of_field(field)
+        _projective_lines[field] = lines
+    return lines
 
 def isomorphism_tests():
 
@@ -89,3 +179,59 @@ def isomorphism_tests():
     m_f5 = Matrix.from_list([[F5("1"), F5("3")], [F5("2"), F5("3")]])
     matrix_permutation = matrix_to_permutation(m_f5, lines_f5)
     assert str(matrix_permutation) == "(035412)"
+
+    assert lines_f5 == [
+        Vector([F5("1"), F5("0")]),
+        Vector([F5("0"), F5("1")]),
+        Vector([F5("1"), F5("1")]),
+        Vector([F5("1"), F5("2")]),
+        Vector([F5("1"), F5("3")]),
+        Vector([F5("1"), F5("4")])
+    ]
+    assert which_line(Vector([F4("x"), F4("x + 1")]), lines_f4) == 2
+    assert which_line(Vector([F4("0"), F4("x")]), list(lines_f4)) == 1
+
+    lines_f9 = projective_line(F9)
+    assert len(lines_f9) == 10
+    for index, line in enumerate(lines_f9):
+        for scalar in list(F9.all_values())[1:]:
+            assert lines_f9.which(line * scalar) == index
+
+    # Long lines are normalised together, giving the same keys
+    if np != None:
+        lines_f128 = projective_line(GF(2, 7))
+        assert lines_f128.index == dict((canonical_key(line), index) for index, line in enumerate(lines_f128))
+        assert canonical_keys(F9, [Vector([F9("0"), F9("0")]), Vector([F9("x"), F9("x")])]) == [None, (1, 1)]
+
+    # Batches of matrices agree with converting one at a time
+    if np != None:
+        members = list(F9.all_values())
+        one = F9.mult_id()
+        group = [Matrix.from_list([[a, b], [c, d]]) for a in members[:4] for b in members for c in members for d in members
+                 if a * d - b * c == one]
+        permutations = matrices_to_permutations(group, lines_f9, block_size=50)
+        assert permutations.images.shape == (len(group), 10)
+        for index in xrange(0, len(group), 7):
+            assert str(permutations[index]) == str(matrix_to_permutation(group[index], lines_f9))
+        assert str(matrices_to_permutations([m_f4], lines_f4)[0]) == "(041)"
+
+        # Points that are not normalised work in batches too
+        scaled = [line * F9("x") for line in lines_f9]
+        permutations = matrices_to_permutations(group[:20], scaled)
+        for index in xrange(20):
+            assert str(permutations[index]) == str(matrix_to_permutation(group[index], scaled))
+
+    # SL(2, q) acts on the lines as PSL(2, q): PSL(2, 4) and PSL(2, 5) are A5,
+    # and PSL(2, 9) is A6
+    for field, order in [(F4, 60), (F5, 60), (F9, 360)]:
+        one = field.mult_id()
+        zero = field.add_id()
+        generators = [Matrix.from_list([[zero, -one], [one, zero]])]
+        for power in xrange(field.r):
+            basis = field.from_int(field.characteristic ** power)
+            generators.append(Matrix.from_list([[one, basis], [zero, one]]))
+        lines = projective_line(field)
+        group = line_permutation_group(generators, lines, seed=0)
+        assert group.order() == order
+        assert group.is_subgroup(alternating_group(len(lines), seed=0))
+    assert line_permutation_group(generators, lines, seed=0).is_subgroup(alternating_group(10, seed=0))
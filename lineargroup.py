@@ -0,0 +1,303 @@
+import random
+from fields import *
+from matrix import *
+from arraymatrix import *
+
+# A group of 2x2 matrices over a finite field, numbered by a bijection with
+# 0, 1, ..., order - 1. Matrices [[a, b], [c, d]] are worked with as packed
+# entries. The first column (a, c) is any allowed nonzero vector, and the second
+# column is s * (a, c) + t * w, where w is (0, 1) when a != 0 and (1, 0) when
+# a = 0. The subclasses pick which first columns and which t are allowed.
+# Entries are combined with the field's flat tables when it has them, and with
+# its packed arithmetic when it is too large for them
+class LinearGroup2(object):
+
+    def __init__(self, field):
+        super(LinearGroup2, self).__init__()
+        self.field = field
+        self.tables = field.get_int_tables()
+        self.q = field.size()
+
+    def order(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        return self.order()
+
+    # Makes the element with a given number
+    def unrank(self, index):
+        return self.to_matrix(self.unrank_entries(index))
+
+    # Gets the number of an element
+    def rank(self, matrix):
+        entries = [hash(entry) for row in matrix.rows() for entry in row]
+        return self.rank_entries(entries)
+
+    # Gets a uniformly random element
+    def random_element(self, generator=random):
+        return self.unrank(generator.randrange(self.order()))
+
+    # Gets many uniformly random elements at once
+    def random_batch(self, count, seed=None):
+        indices = np.random.RandomState(seed).randint(0, self.order(), size=count)
+        return self.unrank_batch(indices)
+
+    # Enumerates every element in order of their numbers
+    def __iter__(self):
+        for index in xrange(self.order()):
+            yield self.unrank(index)
+
+    def __contains__(self, matrix):
+        try:
+            self.rank(matrix)
+            return True
+        except ValueError:
+            return False
+
+    def to_matrix(self, entries):
+        a, b, c, d = [self.field.from_int(value) for value in entries]
+        return Matrix.from_list([[a, b], [c, d]])
+
+    # Field arithmetic on packed members
+    def mul(self, x, y):
+        if self.tables == None:
+            return self.field.packed_mult(x, y)
+        return self.tables.mult_table[x * self.q + y]
+
+    def add(self, x, y):
+        if self.tables == None:
+            return self.field.packed_add(x, y)
+        return self.tables.add_table[x * self.q + y]
+
+    def inverse(self, x):
+        if self.tables == None:
+            return self.field.packed_inverse(x)
+        return self.tables.inv_table[x]
+
+    def div(self, x, y):
+        return self.mul(x, self.inverse(y))
+
+    def neg(self, x):
+        if self.tables == None:
+            return self.field.packed_neg(x)
+        return self.tables.neg_table[x]
+
+    def determinant(self, a, b, c, d):
+        return self.add(self.mul(a, d), self.neg(self.mul(b, c)))
+
+    # Builds the second column from the first column and the parameters s and t
+    def second_column(self, a, c, s, t):
+        if a != 0:
+            return self.mul(s, a), self.add(self.mul(s, c), t)
+        return t, self.mul(s, c)
+
+    # Recovers s and t from a matrix
+    def parameters(self, a, b, c, d):
+        if a != 0:
+            s = self.div(b, a)
+            return s, self.add(d, self.neg(self.mul(s, c)))
+        s = self.div(d, c)
+        return s, b
+
+    # The same, over arrays of packed members
+    def second_column_batch(self, a, c, s, t):
+        b = np.where(a != 0, field_mul(self.field, s, a), t)
+        d = np.where(a != 0, field_add(self.field, field_mul(self.field, s, c), t), field_mul(self.field, s, c))
+        return b, d
+
+    def stack(self, a, b, c, d):
+        return MatrixBatch(self.field, np.stack([np.stack([a, b], axis=-1), np.stack([c, d], axis=-1)], axis=-2))
+
+
+# SL(2, q): t is fixed by the determinant being 1. Order q(q^2 - 1)
+class SpecialLinearGroup(LinearGroup2):
+
+    def order(self):
+        return self.q * (self.q * self.q - 1)
+
+    # First columns are numbered by their packed value, (a, c) -> a + c * q - 1
+    def first_column(self, number):
+        return (number + 1) % self.q, (number + 1) // self.q
+
+    def first_column_number(self, a, c):
+        return a + c * self.q - 1
+
+    # The t that makes the determinant 1
+    def unit_t(self, a, c):
+        return self.inverse(a) if a != 0 else self.neg(self.inverse(c))
+
+    def unrank_entries(self, index):
+        number, s = divmod(index, self.q)
+        a, c = self.first_column(number)
+        b, d = self.second_column(a, c, s, self.unit_t(a, c))
+        return a, b, c, d
+
+    def rank_entries(self, entries):
+        a, b, c, d = entries
+        if (a == 0 and c == 0) or self.determinant(a, b, c, d) != 1:
+            raise ValueError("Matrix is not in SL(2, " + str(self.q) + ")")
+        s, t = self.parameters(a, b, c, d)
+        return self.first_column_number(a, c) * self.q + s
+
+    def unrank_batch(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        number, s = indices // self.q, indices % self.q
+        a, c = self.first_column_batch(number)
+        inverses = field_inv(self.field, np.where(a != 0, a, c))
+        t = np.where(a != 0, inverses, field_mul(self.field, inverses, self.neg(1)))
+        b, d = self.second_column_batch(a, c, s, t)
+        return self.stack(a, b, c, d)
+
+    def first_column_batch(self, number):
+        return (number + 1) % self.q, (number + 1) // self.q
+
+
+# PSL(2, q) = SL(2, q) / {1, -1}. Each element is represented by the matrix of
+# the pair whose first column has its first nonzero entry a primitive power
+# below (q - 1) / 2. In characteristic 2, -1 = 1 and this is SL(2, q). The
+# powers come from the field's log tables, or are worked out for fields too
+# large to have them
+class ProjectiveSpecialLinearGroup(SpecialLinearGroup):
+
+    def __init__(self, field):
+        super(ProjectiveSpecialLinearGroup, self).__init__(field)
+        self.half = (self.q - 1) // 2 if field.characteristic != 2 else None
+        self.log_tables = field.get_log_tables()
+
+    # The packed primitive power g^n, and the power of a nonzero packed member
+    def exp(self, power):
+        if self.log_tables == None:
+            return hash(self.field.primitive_member() ** power)
+        return self.log_tables.int_log_table[power]
+
+    def log(self, value):
+        if self.log_tables == None:
+            return self.field.primitive_log(self.field.from_int(value))
+        return self.log_tables.int_log_table_reverse[value]
+
+    def order(self):
+        order = super(ProjectiveSpecialLinearGroup, self).order()
+        return order // 2 if self.half != None else order
+
+    # First columns with a != 0 come first, as (log a) * q + c
+    def first_column(self, number):
+        if self.half == None:
+            return super(ProjectiveSpecialLinearGroup, self).first_column(number)
+        if number < self.q * self.half:
+            return self.exp(number // self.q), number % self.q
+        return 0, self.exp(number - self.q * self.half)
+
+    def first_column_number(self, a, c):
+        if self.half == None:
+            return super(ProjectiveSpecialLinearGroup, self).first_column_number(a, c)
+        return self.log(a) * self.q + c if a != 0 else self.q * self.half + self.log(c)
+
+    def first_column_batch(self, number):
+        if self.half == None:
+            return super(ProjectiveSpecialLinearGroup, self).first_column_batch(number)
+        leading = number < self.q * self.half
+        powers = np.where(leading, number // self.q, number - self.q * self.half)
+        if self.log_tables != None:
+            values = numpy_tables(self.field)[0][powers]
+        else:
+            values = np.array([self.exp(int(power)) for power in powers], dtype=np.int64)
+        return np.where(leading, values, 0), np.where(leading, number % self.q, values)
+
+    # Picks the representative of the pair before numbering
+    def rank_entries(self, entries):
+        if self.half != None:
+            a, b, c, d = entries
+            leading = a if a != 0 else c
+            if self.log(leading) >= self.half:
+                entries = [self.neg(value) for value in entries]
+        return super(ProjectiveSpecialLinearGroup, self).rank_entries(entries)
+
+
+# GL(2, q): t is any nonzero member. Order (q^2 - 1)(q^2 - q)
+class GeneralLinearGroup(LinearGroup2):
+
+    def order(self):
+        return (self.q * self.q - 1) * (self.q * self.q - self.q)
+
+    def unrank_entries(self, index):
+        number, rest = divmod(index, self.q * (self.q - 1))
+        s, t = divmod(rest, self.q - 1)
+        a, c = (number + 1) % self.q, (number + 1) // self.q
+        b, d = self.second_column(a, c, s, t + 1)
+        return a, b, c, d
+
+    def rank_entries(self, entries):
+        a, b, c, d = entries
+        if (a == 0 and c == 0) or self.determinant(a, b, c, d) == 0:
+            raise ValueError("Matrix is not in GL(2, " + str(self.q) + ")")
+        s, t = self.parameters(a, b, c, d)
+        return ((a + c * self.q - 1) * self.q + s) * (self.q - 1) + t - 1
+
+    def unrank_batch(self, indices):
+        indices = np.asarray(indices, dtype=np.int64)
+        number, rest = indices // (self.q * (self.q - 1)), indices % (self.q * (self.q - 1))
+        s, t = rest // (self.q - 1), rest % (self.q - 1) + 1
+        a, c = (number + 1) % self.q, (number + 1) // self.q
+        b, d = self.second_column_batch(a, c, s, t)
+        return self.stack(a, b, c, d)
+
+
+def linear_group_tests():
+
+    for field in [F4, F5, F9]:
+        one = field.mult_id()
+        q = field.size()
+        sl = SpecialLinearGroup(field)
+        gl = GeneralLinearGroup(field)
+        psl = ProjectiveSpecialLinearGroup(field)
+        assert sl.order() == q * (q * q - 1)
+        assert gl.order() == (q * q - 1) * (q * q - q)
+
+        # Enumeration gives every element once, and numbering round trips
+        sl_keys = set()
+        for index, element in enumerate(sl):
+            a, b = element.get_row(0)
+            c, d = element.get_row(1)
+            assert a * d - b * c == one
+            assert sl.rank(element) == index
+            sl_keys.add(tuple(hash(entry) for entry in element.get_row(0).list_form + element.get_row(1).list_form))
+        assert len(sl_keys) == sl.order()
+
+        for index in xrange(0, gl.order(), 7):
+            assert gl.rank(gl.unrank(index)) == index
+
+        # PSL numbers a matrix and its negative the same
+        for index in xrange(psl.order()):
+            element = psl.unrank(index)
+            assert psl.rank(element) == index
+            assert psl.rank(element * (-one)) == index
+
+        # Batches agree with one at a time
+        if np != None:
+            for group in [sl, gl, psl]:
+                indices = range(0, group.order(), 5)
+                batch = group.unrank_batch(indices)
+                for position, index in enumerate(indices):
+                    assert batch[position] == group.unrank(index)
+
+    # Fields too large for their flat tables use the packed arithmetic
+    for field in [GF(1451), GF(2, 11)]:
+        assert field.get_int_tables() == None
+        q = field.size()
+        for group in [SpecialLinearGroup(field), ProjectiveSpecialLinearGroup(field), GeneralLinearGroup(field)]:
+            indices = [0, 1, q * q - 2, group.order() // 3, group.order() - 1]
+            for index in indices:
+                element = group.unrank(index)
+                assert group.rank(element) == index
+            if np != None:
+                assert [group.rank(element) for element in group.unrank_batch(indices)] == indices
+        element = SpecialLinearGroup(field).unrank(123456)
+        a, b = element.get_row(0)
+        c, d = element.get_row(1)
+        assert a * d - b * c == field.mult_id()
+
+    assert ProjectiveSpecialLinearGroup(F5).order() == 60
+    assert ProjectiveSpecialLinearGroup(F4).order() == 60
+    sample = SpecialLinearGroup(F7).random_element(random.Random(1))
+    assert sample in SpecialLinearGroup(F7) and sample in GeneralLinearGroup(F7)
+    assert Matrix.from_list([[F7("2"), F7("0")], [F7("0"), F7("1")]]) not in SpecialLinearGroup(F7)
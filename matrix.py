@@ -1,13 +1,33 @@
-import copy
 from fields import *
+from elimination import *
+from fieldkernels import *
+
+# Vectors and matrices with at least this many entries over a finite field do
+# their entrywise arithmetic and dot products through FieldArray
+FIELD_ARRAY_THRESHOLD = 128
+
+# Whether arithmetic on count entries of a field goes through FieldArray
+def use_field_array(field, count):
+    return np != None and count >= FIELD_ARRAY_THRESHOLD and is_finite(field) and has_kernels(field)
 
 # Define a vector
 class Vector(object):
+    __slots__ = ("list_form",)
 
     def __init__(self, list_form):
         self.list_form = list_form
 
+    # Slotted objects need their state spelled out to be pickled
+    def __getstate__(self):
+        return (self.list_form,)
+
+    def __setstate__(self, state):
+        self.list_form, = state
+
     def __add__(self, other):
+        if isinstance(other, Vector) and len(other) == len(self) and use_field_array(self.get_field(), len(self)):
+            return Vector((self.to_field_array() + other.to_field_array()).to_members())
+
         result = Vector(self.list_form[:])
 
         for i in xrange(len(result.list_form)):
@@ -17,6 +37,10 @@ class Vector(object):
 
     def __mul__(self, other):
 
+        field = self.get_field()
+        if use_field_array(field, len(self)) and isinstance(other, field):
+            return Vector((self.to_field_array() * other).to_members())
+
         result = Vector(self.list_form[:])
 
         if not isinstance(other, Vector):
@@ -33,14 +57,25 @@ class Vector(object):
         length = len(a)
         if length != len(b): raise ValueError("Dot product vectors must be same length")
 
+        if isinstance(a, Vector) and isinstance(b, Vector) and use_field_array(a.get_field(), length):
+            return a.to_field_array().dot(b.to_field_array())
+
         for i in xrange(length):
             sum_prod += a[i] * b[i]
 
         return sum_prod
 
+    # Gets the type of the entries
+    def get_field(self):
+        return type(self[0]) if len(self) else None
+
+    # The entries as a FieldArray
+    def to_field_array(self):
+        return FieldArray.from_members(self.get_field(), self.list_form)
+
     # Equality
     def __eq__(self, other):
-        if isinstance(other, self.__class__):
+        if isinstance(other, Vector):
             return self.list_form == other.list_form
         else:
             return False
@@ -68,58 +103,192 @@ class Vector(object):
         return "Vector(" + self.__unicode__() + ")"
 
 
-# Define a matrix
+# A vector that is a view into a matrix's buffer: entry i is
+# buffer[offset + i * step]. Reads and writes go straight to the buffer
+class VectorView(Vector):
+    __slots__ = ("buffer", "offset", "step", "length")
+
+    def __init__(self, buffer, offset, step, length):
+        self.buffer = buffer
+        self.offset = offset
+        self.step = step
+        self.length = length
+
+    # A pickled view keeps sharing its buffer with whatever is pickled with it
+    def __getstate__(self):
+        return (self.buffer, self.offset, self.step, self.length)
+
+    def __setstate__(self, state):
+        self.buffer, self.offset, self.step, self.length = state
+
+    # The entries are copied out of the buffer when asked for as a list
+    @property
+    def list_form(self):
+        if not self.length:
+            return []
+        return self.buffer[self.offset:self.offset + (self.length - 1) * self.step + 1:self.step]
+
+    @list_form.setter
+    def list_form(self, values):
+        if len(values) != self.length:
+            raise IndexError("Attempting to change the length of a matrix row or column.")
+        if self.length:
+            self.buffer[self.offset:self.offset + (self.length - 1) * self.step + 1:self.step] = list(values)
+
+    def position(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("Vector index out of range")
+        return self.offset + index * self.step
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return self.buffer[self.position(index)]
+
+    def __setitem__(self, index, val):
+        self.buffer[self.position(index)] = val
+
+
+# Define a matrix. The entries are kept in one flat row-major list, with entry
+# (r, c) at buffer[offset + r * stride + c]. Rows, columns and submatrices are
+# views that share the buffer, so getting them copies nothing
 class Matrix(object):
+    __slots__ = ("buffer", "offset", "stride", "row_count", "column_count")
 
     def __init__(self, vector_list):
         super(Matrix, self).__init__()
         self.vector_list = vector_list
 
+    def __getstate__(self):
+        return (self.buffer, self.offset, self.stride, self.row_count, self.column_count)
+
+    def __setstate__(self, state):
+        self.buffer, self.offset, self.stride, self.row_count, self.column_count = state
+
+    # Makes a matrix that uses an existing buffer
+    @staticmethod
+    def from_buffer(buffer, height, width, offset=0, stride=None):
+        result = Matrix([])
+        result.buffer = buffer
+        result.offset = offset
+        result.stride = width if stride == None else stride
+        result.row_count = height
+        result.column_count = width
+        return result
+
+    # Gets the common length of a list of rows or columns. Raises ValueError
+    # when they differ
+    @staticmethod
+    def common_length(lists, name):
+        length = len(lists[0]) if len(lists) != 0 else 0
+        if any(len(entries) != length for entries in lists):
+            raise ValueError("Matrix " + name + " must all have the same length")
+        return length
+
     # Makes a matrix from a list of row entries
     @staticmethod
     def from_list(list2D):
-        height = len(list2D)
-        width = len(list2D[0]) if height != 0 else 0
+        width = Matrix.common_length(list2D, "rows")
+        return Matrix.from_buffer([entry for row in list2D for entry in row], len(list2D), width)
 
-        vector_list = [Vector([]) for i in xrange(width)]
-        result = Matrix([])
- 
-        for r in xrange(height):
-            for c in xrange(width):
-                vector_list[c].list_form.append(list2D[r][c])
+    # Makes a matrix over a field from a list of rows of polynomial strings
+    @staticmethod
+    def from_strings(field, rows):
+        width = Matrix.common_length(rows, "rows")
+        return Matrix.from_buffer(field.parse_many(entry for row in rows for entry in row), len(rows), width)
 
-        result.vector_list = vector_list
-        return result
+    # Reads a matrix over a field from text with one row per line and entries
+    # separated by commas. Blank lines are skipped
+    @staticmethod
+    def from_text(field, text, separator=","):
+        return Matrix.from_strings(field, [line.split(separator) for line in text.splitlines() if line.strip()])
+
+    # The columns, as a tuple of views. Writing to a column writes to the
+    # matrix, but columns cannot be added or replaced through the tuple; set
+    # vector_list instead, which copies the columns into a new buffer
+    @property
+    def vector_list(self):
+        return tuple(self.get_column(c) for c in xrange(self.width()))
+
+    @vector_list.setter
+    def vector_list(self, vector_list):
+        width = len(vector_list)
+        height = Matrix.common_length(vector_list, "columns")
+        self.buffer = [vector_list[c][r] for r in xrange(height) for c in xrange(width)]
+        self.offset = 0
+        self.stride = width
+        self.row_count = height
+        self.column_count = width
 
     # Determines dimensions
     def width(self):
-        return len(self.vector_list)
+        return self.column_count
     def height(self):
-        return len(self.vector_list[0]) if self.vector_list else 0
+        return self.row_count if self.column_count else 0
 
-    # Gets a row vector
+    # Gets a row, a column or a block of the matrix, sharing the buffer
     def get_row(self, i):
+        if not 0 <= i < self.height():
+            raise IndexError("Matrix row out of range")
+        return VectorView(self.buffer, self.offset + i * self.stride, 1, self.width())
+
+    def get_column(self, j):
+        if not 0 <= j < self.width():
+            raise IndexError("Matrix column out of range")
+        return VectorView(self.buffer, self.offset + j, self.stride, self.height())
+
+    def submatrix(self, top, left, height, width):
+        if top < 0 or left < 0 or top + height > self.height() or left + width > self.width():
+            raise IndexError("Submatrix out of range")
+        return Matrix.from_buffer(self.buffer, height, width, self.offset + top * self.stride + left, self.stride)
+
+    # Gets the rows as lists (copies)
+    def rows(self):
+        buffer = self.buffer
         width = self.width()
-        result = Vector([])
-        for c in xrange(width):
-            result.list_form.append(self.vector_list[c][i])
-        return result
+        starts = xrange(self.offset, self.offset + self.height() * self.stride, self.stride)
+        return [buffer[start:start + width] for start in starts]
+
+    # The entries as a 2D FieldArray
+    def to_field_array(self):
+        return FieldArray(self.get_field(), self.packed_array())
+
+    # Makes a matrix from a 2D FieldArray
+    @staticmethod
+    def from_field_array(field_array):
+        height, width = field_array.shape
+        return Matrix.from_buffer(field_array.to_members(), height, width)
+
+    # Gets the packed members as a 2D NumPy array
+    def packed_array(self):
+        return np.array([[hash(entry) for entry in row] for row in self.rows()], dtype=np.int64).reshape(self.height(), self.width())
+
+    # Sums the products of two equally long lists of entries
+    @staticmethod
+    def sum_products(a, b):
+        total = a[0].add_id() if a else 0
+        for x, y in zip(a, b):
+            total += x * y
+        return total
 
     # Multiply
     def __mul__(self, other):
 
-        result = None
-
         # Vector multiplication
         if isinstance(other, Vector):
 
             if len(other) != self.width():
                 raise IndexError("Attempting to multiply matrix with a vector of incompatible dimensions.")
 
-            result = Vector([])
-            for i in xrange(self.height()):
-                matrix_row = self.get_row(i)
-                result.list_form.append(Vector.dot_product(matrix_row, other))
+            # Each row's dot product with the vector, all at once
+            if self.width() and use_field_array(self.get_field(), self.height() * self.width()):
+                return Vector(self.to_field_array().dot(other.to_field_array()).to_members())
+
+            entries = other.list_form
+            return Vector([Matrix.sum_products(row, entries) for row in self.rows()])
 
         # Matrix multiplication
         elif isinstance(other, Matrix):
@@ -127,26 +296,101 @@ class Matrix(object):
             if other.height() != self.width():
                 raise IndexError("Attempting to multiply matrix with another matrix of incompatible dimensions.")
 
-            result = Matrix([])
-            for other_vector in other.vector_list:
-                result.vector_list.append(self * other_vector)
+            # Large products over finite fields are done on packed members
+            field = self.get_field() if self.width() else None
+            if np != None and field != None and is_finite(field) and has_kernels(field) and \
+                    min(self.height(), self.width(), other.width()) >= STRASSEN_CROSSOVER:
+                product = strassen_matmul(field, self.packed_array(), other.packed_array())
+                return Matrix.from_buffer([field.from_int(value) for value in product.ravel().tolist()], self.height(), other.width())
+
+            columns = [column.list_form for column in other.vector_list]
+            buffer = [Matrix.sum_products(row, column) for row in self.rows() for column in columns]
+            return Matrix.from_buffer(buffer, self.height(), other.width())
 
         # Scalar multiplication
         else:
-            result = Matrix(copy.deepcopy(self.vector_list))
-            length = len(result.vector_list)
-            for i in xrange(length):
-                result.vector_list[i] *= other
+            field = self.get_field() if self.width() else None
+            if field != None and isinstance(other, field) and use_field_array(field, self.height() * self.width()):
+                return Matrix.from_field_array(self.to_field_array() * other)
+
+            buffer = [entry * other for row in self.rows() for entry in row]
+            return Matrix.from_buffer(buffer, self.height(), self.width())
+
+    # Gets the type of the entries
+    def get_field(self):
+        return type(self.buffer[self.offset])
+
+    def elimination_buffer(self):
+        return EliminationBuffer.from_rows(self.get_field(), self.rows())
+
+    def check_square(self):
+        if self.width() != self.height():
+            raise IndexError("Attempting to use a non-square matrix as a square matrix.")
+
+    # Gets the reduced row echelon form
+    def rref(self):
+        buffer = self.elimination_buffer()
+        buffer.eliminate(reduced=True)
+        return Matrix.from_list(buffer.to_rows())
+
+    # Gets the number of linearly independent rows
+    def rank(self):
+        return len(self.elimination_buffer().eliminate()[0])
+
+    # Gets the determinant
+    def det(self):
+        self.check_square()
+        buffer = self.elimination_buffer()
+        return buffer.member(buffer.eliminate()[1])
+
+    # Gets the inverse, by reducing the matrix next to the identity
+    def inverse(self):
+        self.check_square()
+        n = self.width()
+        buffer = self.elimination_buffer()
+        buffer = buffer.augmented(EliminationBuffer.identity(buffer.field, n))
+        pivots = buffer.eliminate(reduced=True, columns=n)[0]
+        if len(pivots) != n:
+            raise ValueError("Matrix is not invertible")
+        return Matrix.from_list(buffer.columns(n, 2 * n).to_rows())
+
+    # Solves self * x = other for a vector or matrix x. When there are many
+    # solutions, the one with its free variables zero is given
+    def solve(self, other):
+        if isinstance(other, Vector):
+            return Vector([row[0] for row in self.solve_rows([[entry] for entry in other.list_form])])
+        return Matrix.from_list(self.solve_rows(other.rows()))
 
-        return result
+    def solve_rows(self, rows):
+        if len(rows) != self.height():
+            raise IndexError("Attempting to solve with a right hand side of incompatible dimensions.")
+        width = self.width()
+        buffer = self.elimination_buffer()
+        buffer = buffer.augmented(EliminationBuffer.from_rows(buffer.field, rows))
+        pivots = buffer.eliminate(reduced=True, columns=width)[0]
+
+        # Rows without pivots must have nothing left on the right
+        result = buffer.columns(width, buffer.width)
+        for r in xrange(len(pivots), buffer.height):
+            if not all(buffer.is_zero(value) for value in result.values[r * result.width:(r + 1) * result.width]):
+                raise ValueError("Matrix equation has no solution")
+
+        # Pivot rows give the pivot variables, the rest are zero
+        solution = EliminationBuffer(buffer.field, [buffer.zero] * (width * result.width), width, result.width)
+        for r, column in enumerate(pivots):
+            solution.values[column * result.width:(column + 1) * result.width] = result.values[r * result.width:(r + 1) * result.width]
+        return solution.to_rows()
 
     # Equality
     def __eq__(self, other):
-        if isinstance(other, self.__class__):
-            return self.vector_list == other.vector_list
+        if isinstance(other, Matrix):
+            return self.width() == other.width() and self.rows() == other.rows()
         else:
             return False
 
+    def __ne__(self, other):
+        return not self == other
+
     # String representation
     def __unicode__(self):
         result = "\n"
@@ -171,3 +415,78 @@ def matrix_vector_tests():
     v = Vector([F4("x + 1"), F4("x")])
     scaled_v = v * F4("x")
     assert scaled_v == Vector([F4("1"), F4("x + 1")])
+
+    # Dot products stay in log space for logarithmic fields
+    L8 = F8.logarithmic()
+    assert Vector.dot_product(Vector([L8("x"), L8("1")]), Vector([L8("x^2"), L8("x")])) == L8("1")
+
+    # Elimination over finite fields and R
+    m = Matrix.from_list([[F7("2"), F7("3"), F7("1")], [F7("4"), F7("0"), F7("5")], [F7("1"), F7("1"), F7("1")]])
+    assert m.det() == F7("4")
+    assert m * m.inverse() == Matrix.from_list([[F7("1"), F7("0"), F7("0")], [F7("0"), F7("1"), F7("0")], [F7("0"), F7("0"), F7("1")]])
+    assert m * m.solve(Vector([F7("1"), F7("2"), F7("3")])) == Vector([F7("1"), F7("2"), F7("3")])
+    x = F9("x")
+    singular = Matrix.from_list([[x, F9("1")], [x * x, x]])
+    assert singular.rank() == 1 and singular.det() == F9("0")
+    assert singular.rref() == Matrix.from_list([[F9("1"), F9("1") / x], [F9("0"), F9("0")]])
+    assert Matrix.from_list([[R(2.0), R(1.0)], [R(4.0), R(5.0)]]).det() == R(6.0)
+    assert Matrix.from_list([[R(2.0), R(1.0)], [R(4.0), R(5.0)]]).inverse().vector_list[0][1] == R(-2.0) / 3
+
+    # Rows, columns and submatrices share the buffer
+    m = Matrix.from_list([[F5("1"), F5("2"), F5("3")], [F5("4"), F5("0"), F5("1")], [F5("2"), F5("2"), F5("2")]])
+    block = m.submatrix(1, 1, 2, 2)
+    assert block.width() == 2 and block.height() == 2
+    assert block.get_row(0) == Vector([F5("0"), F5("1")])
+    assert block.get_column(1) == Vector([F5("1"), F5("2")])
+    block.get_column(0)[1] = F5("3")
+    assert m.vector_list[1][2] == F5("3") and m.get_row(2)[1] == F5("3")
+    scaled = m * F5("2")
+    assert scaled.get_row(0) == Vector([F5("2"), F5("4"), F5("1")]) and m.get_row(0)[0] == F5("1")
+    assert Matrix.from_list([]).width() == 0 and Matrix.from_list([]).height() == 0
+    assert Matrix(m.vector_list) == m and block * Vector([F5("1"), F5("1")]) == Vector([F5("1"), F5("0")])
+
+    # Columns write through to the matrix, but the column tuple cannot change,
+    # and ragged rows or columns are refused
+    m.vector_list[0][2] = F5("4")
+    assert m.get_row(2)[0] == F5("4")
+    for bad in [lambda: m.vector_list.append(Vector([F5("1")] * 3)), lambda: Matrix.from_list([[F5("1")], [F5("1"), F5("2")]]),
+                lambda: Matrix.from_strings(F5, [["1", "2"], ["3"]]), lambda: Matrix([Vector([F5("1")]), Vector([])])]:
+        try:
+            bad()
+            assert False
+        except (AttributeError, ValueError):
+            pass
+    assert not hasattr(m, "__dict__") and not hasattr(block.get_row(0), "__dict__") and not hasattr(v, "__dict__")
+
+    # Slotted vectors and matrices still pickle, and views keep sharing a buffer
+    for protocol in [0, 2]:
+        assert pickle.loads(pickle.dumps(v, protocol)) == v
+        assert pickle.loads(pickle.dumps(m, protocol)) == m and pickle.loads(pickle.dumps(block, protocol)) == block
+        copied_block, copied_row = pickle.loads(pickle.dumps((block, block.get_row(0)), protocol))
+        copied_row[0] = F5("4")
+        assert copied_block.get_row(0)[0] == F5("4") and block.get_row(0)[0] == F5("0")
+    assert pickle.loads(pickle.dumps(m1)) == m1
+
+    # Matrices can be read from polynomial strings
+    text = "x + 1, 2x\n\n1, 0\n"
+    assert Matrix.from_text(F9, text) == Matrix.from_list([[F9("x + 1"), F9("2x")], [F9("1"), F9("0")]])
+    assert Matrix.from_strings(F5, [["1", "2"], ["3", "4"]]).get_row(1) == Vector([F5("3"), F5("4")])
+
+    # Long vectors and large matrices go through FieldArray, with the same results
+    members = list(F16.all_values())
+    long_a = Vector([members[(i * 7) % 16] for i in xrange(200)])
+    long_b = Vector([members[(i * i) % 16] for i in xrange(200)])
+    total = F16("0")
+    for x, y in zip(long_a.list_form, long_b.list_form):
+        total += x * y
+    assert Vector.dot_product(long_a, long_b) == total
+    assert Vector.dot_product(long_a.list_form, tuple(long_b.list_form)) == total
+    assert Vector.dot_product([F5("1")], [F5("2")]) == F5("2")
+    assert (long_a + long_b).list_form == [x + y for x, y in zip(long_a.list_form, long_b.list_form)]
+    assert (long_a * F16("x")).list_form == [x * F16("x") for x in long_a.list_form]
+    square = Matrix.from_list([long_a.list_form[r * 12:(r + 1) * 12] for r in xrange(12)])
+    column = Vector(long_b.list_form[:12])
+    assert square * column == Vector([Matrix.sum_products(row, column.list_form) for row in square.rows()])
+    assert (square * F16("x")).rows() == [[x * F16("x") for x in row] for row in square.rows()]
+    if np != None:
+        assert Matrix.from_field_array(square.to_field_array()) == square
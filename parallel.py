@@ -0,0 +1,139 @@
+import ctypes
+import multiprocessing
+from multiprocessing import sharedctypes
+from fields import *
+from matrix import *
+from fieldkernels import *
+from arraymatrix import *
+from isomorphism import *
+from lineargroup import *
+
+# What a worker process works on: the field, the input arrays and the output
+# array, all set once when the worker starts
+_worker_state = {}
+
+# Makes an int64 NumPy array in shared memory. Worker processes forked after it
+# is made see the same memory, so neither inputs nor results are pickled
+def shared_array(shape, values=None):
+    count = int(np.prod(shape))
+    raw = sharedctypes.RawArray(ctypes.c_int64, max(count, 1))
+    array = np.frombuffer(raw, dtype=np.int64, count=count).reshape(shape)
+    if values is not None:
+        array[...] = values
+    return array
+
+def _start_worker(state):
+    _worker_state.clear()
+    _worker_state.update(state)
+
+# Work done by a worker on rows start to stop. Each writes its rows of the
+# shared output and returns nothing
+def _multiply_rows(chunk):
+    start, stop = chunk
+    state = _worker_state
+    state["out"][start:stop] = strassen_matmul(state["field"], state["a"][start:stop], state["b"], state["crossover"])
+
+def _permutation_rows(chunk):
+    start, stop = chunk
+    state = _worker_state
+    batch = MatrixBatch(state["field"], state["batch"][start:stop])
+    state["out"][start:stop] = matrices_to_permutations(batch, state["lines"], state["block_size"]).images
+
+
+# Runs large products and group mappings on a pool of worker processes. It is
+# opt-in: nothing else in the project starts processes. Work is split into
+# contiguous blocks of rows, handed out in order, and written to disjoint rows
+# of a shared result, so the result is the same as running serially. With one
+# worker everything runs in this process
+class ParallelExecutor(object):
+
+    def __init__(self, workers=None, chunks_per_worker=4):
+        super(ParallelExecutor, self).__init__()
+        if np == None:
+            raise ImportError("ParallelExecutor needs numpy")
+        self.workers = workers or multiprocessing.cpu_count()
+        self.chunks_per_worker = chunks_per_worker
+
+    # Splits count rows into contiguous blocks, in order
+    def partition(self, count):
+        pieces = max(1, min(count, self.workers * self.chunks_per_worker))
+        bounds = [count * piece // pieces for piece in xrange(pieces + 1)]
+        return [(bounds[piece], bounds[piece + 1]) for piece in xrange(pieces) if bounds[piece] != bounds[piece + 1]]
+
+    # Runs a task on every block, with workers that start from the given state
+    def run(self, task, count, state):
+        chunks = self.partition(count)
+        if self.workers == 1:
+            _start_worker(state)
+            for chunk in chunks:
+                task(chunk)
+            return
+
+        pool = multiprocessing.Pool(self.workers, _start_worker, (state,))
+        try:
+            pool.map(task, chunks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    # Multiplies 2D arrays of packed members, each worker taking a block of rows
+    def matmul(self, field, a, b, crossover=None):
+        numpy_tables(field)
+        out = shared_array((a.shape[0], b.shape[1]))
+        state = {"field": field, "a": shared_array(a.shape, a), "b": shared_array(b.shape, b),
+                 "out": out, "crossover": crossover}
+        self.run(_multiply_rows, a.shape[0], state)
+        return np.array(out)
+
+    # Multiplies two matrices over a finite field. The result has the type of
+    # the first matrix
+    def multiply(self, a, b):
+        if a.width() != b.height():
+            raise IndexError("Attempting to multiply matrix with another matrix of incompatible dimensions.")
+        field = a.get_field()
+        product = self.matmul(field, ArrayMatrix.from_matrix(a, field).array, ArrayMatrix.from_matrix(b, field).array)
+        if isinstance(a, ArrayMatrix):
+            return ArrayMatrix(field, product)
+        return Matrix.from_buffer([field.from_int(value) for value in product.ravel().tolist()], a.height(), b.width())
+
+    # Converts every matrix of a batch to its permutation of the lines, each
+    # worker taking a block of matrices
+    def matrices_to_permutations(self, batch, lines, block_size=4096):
+        if not isinstance(batch, MatrixBatch):
+            batch = MatrixBatch.from_matrices(batch)
+        numpy_tables(batch.field)
+        out = shared_array((len(batch), len(lines)))
+        state = {"field": batch.field, "batch": shared_array(batch.array.shape, batch.array), "lines": lines,
+                 "out": out, "block_size": block_size}
+        self.run(_permutation_rows, len(batch), state)
+        return PermutationImages(np.array(out))
+
+
+def parallel_tests():
+
+    if np == None:
+        return
+
+    state = np.random.RandomState(9)
+    for workers in [1, 2]:
+        executor = ParallelExecutor(workers)
+        assert executor.partition(10) == sorted(executor.partition(10))
+        assert sum(stop - start for start, stop in executor.partition(10)) == 10
+
+        # Products match the serial kernel, over a prime and an extension field
+        for field in [F7, F16]:
+            a = state.randint(0, field.size(), size=(23, 17))
+            b = state.randint(0, field.size(), size=(17, 11))
+            assert np.array_equal(executor.matmul(field, a, b), field_matmul(field, a, b))
+
+        members = list(F5.all_values())
+        a = Matrix.from_list([[members[(r * 3 + c) % 5] for c in xrange(6)] for r in xrange(9)])
+        b = Matrix.from_list([[members[(r + c * c) % 5] for c in xrange(4)] for r in xrange(6)])
+        assert executor.multiply(a, b) == a * b
+
+        # Mapping a group keeps the order of the matrices
+        for field in [F5, F9]:
+            batch = SpecialLinearGroup(field).unrank_batch(range(SpecialLinearGroup(field).order()))
+            lines = projective_line(field)
+            images = executor.matrices_to_permutations(batch, lines, block_size=7)
+            assert np.array_equal(images.images, matrices_to_permutations(batch, lines).images)
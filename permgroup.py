@@ -0,0 +1,258 @@
+import random
+from permutation import *
+
+# One level of a stabiliser chain: the strong generators that fix the earlier
+# base points, and the orbit of this level's base point stored as a Schreier
+# vector (the index of the generator that first reached each point, -1 if the
+# point is not in the orbit, and -2 for the base point itself). Inverse
+# transversal elements can be kept once worked out, trading memory for speed
+class StabilizerLevel(object):
+
+    def __init__(self, base_point, degree, cache_transversals=True):
+        super(StabilizerLevel, self).__init__()
+        self.base_point = base_point
+        self.cache_transversals = cache_transversals
+        self.transversal_inverses = {}
+        self.generators = []
+        self.inverses = []
+        self.schreier = [-1] * degree
+        self.schreier[base_point] = -2
+        self.orbit = [base_point]
+
+    # Adds a generator and grows the orbit with it
+    def add_generator(self, generator):
+        self.generators.append(generator)
+        inverse = [0] * len(generator)
+        for point, image in enumerate(generator):
+            inverse[image] = point
+        self.inverses.append(inverse)
+
+        # Breadth first, starting with the new generator on the existing orbit
+        schreier = self.schreier
+        new_index = len(self.generators) - 1
+        start = len(self.orbit)
+        for point in list(self.orbit):
+            image = generator[point]
+            if schreier[image] == -1:
+                schreier[image] = new_index
+                self.orbit.append(image)
+
+        position = start
+        while position < len(self.orbit):
+            point = self.orbit[position]
+            for index, other in enumerate(self.generators):
+                image = other[point]
+                if schreier[image] == -1:
+                    schreier[image] = index
+                    self.orbit.append(image)
+            position += 1
+
+    # Applies the inverse of the transversal element for a point after h, which
+    # brings that point back to the base point
+    def unwind(self, h, point):
+        if self.cache_transversals:
+            inverse = self.transversal_inverses.get(point)
+            if inverse == None:
+                inverse = self.trace(range(len(h)), point)
+                self.transversal_inverses[point] = inverse
+            return [inverse[image] for image in h]
+        return self.trace(h, point)
+
+    # Walks the Schreier tree from a point back to the base point
+    def trace(self, h, point):
+        schreier = self.schreier
+        while point != self.base_point:
+            inverse = self.inverses[schreier[point]]
+            h = [inverse[image] for image in h]
+            point = inverse[point]
+        return h
+
+
+# Keeps a pool of group elements that are mixed together to give (close to)
+# uniformly random elements, using the product replacement algorithm
+class ProductReplacer(object):
+
+    def __init__(self, generators, generator, burn_in=50):
+        super(ProductReplacer, self).__init__()
+        self.random = generator
+        degree = len(generators[0])
+        self.pool = [list(g) for g in generators]
+        while len(self.pool) < 10:
+            self.pool.append(list(generators[len(self.pool) % len(generators)]))
+        self.accumulator = range(degree)
+        for i in xrange(burn_in):
+            self.next()
+
+    def next(self):
+        pool = self.pool
+        i, j = self.random.sample(xrange(len(pool)), 2)
+        other = pool[j]
+        if self.random.random() < 0.5:
+            inverse = [0] * len(other)
+            for point, image in enumerate(other):
+                inverse[image] = point
+            other = inverse
+        pool[i] = [other[image] for image in pool[i]]
+        self.accumulator = [pool[i][image] for image in self.accumulator]
+        return self.accumulator
+
+
+# A permutation group given by generators. A base and strong generating set is
+# computed with the randomised Schreier-Sims algorithm: random elements are
+# sifted through the stabiliser chain, and the ones that do not sift become new
+# strong generators. Construction stops after `sifts` random elements in a row
+# sift through (or as soon as a known order is reached), so an incomplete chain
+# is possible with probability about 2^-sifts when the order is not given
+class PermutationGroup(object):
+
+    def __init__(self, generators, symbols=None, order=None, sifts=40, seed=None, cache_transversals=True):
+        super(PermutationGroup, self).__init__()
+        self.cache_transversals = cache_transversals
+
+        # Bring every generator onto the same symbols
+        if symbols == None:
+            symbols = set()
+            for generator in generators:
+                symbols.update(generator.symbols)
+        self.symbols = sorted(symbols)
+        self.degree = len(self.symbols)
+        self.generators = [generator.extended(self.symbols) for generator in generators]
+
+        self.levels = []
+        self.random = random.Random(seed)
+        self.build([list(generator.images) for generator in self.generators], order, sifts)
+
+    # Runs randomised Schreier-Sims
+    def build(self, generators, known_order, sifts):
+        identity = range(self.degree)
+        generators = [generator for generator in generators if generator != identity]
+        if not generators:
+            return
+
+        # Sift the generators themselves first, then random elements
+        pending = list(generators)
+        replacer = ProductReplacer(generators, self.random)
+        successes = 0
+        while successes < sifts:
+            if known_order != None and self.order() >= known_order:
+                break
+
+            h, depth = self.sift(pending.pop() if pending else replacer.next())
+            if h == identity:
+                successes += 1
+                continue
+
+            # h fixes the first depth base points, so it generates at all those levels
+            if depth == len(self.levels):
+                moved = next(point for point in xrange(self.degree) if h[point] != point)
+                self.levels.append(StabilizerLevel(moved, self.degree, self.cache_transversals))
+            for level in self.levels[:depth + 1]:
+                level.add_generator(h)
+            successes = 0
+
+    # Sifts images through the chain. Returns what is left and the level it
+    # stopped at (the chain length if it went all the way through)
+    def sift(self, h):
+        for depth, level in enumerate(self.levels):
+            point = h[level.base_point]
+            if level.schreier[point] == -1:
+                return h, depth
+            h = level.unwind(h, point)
+        return h, len(self.levels)
+
+    # Gets the order of the group: the product of the orbit lengths
+    def order(self):
+        result = 1
+        for level in self.levels:
+            result *= len(level.orbit)
+        return result
+
+    # Determines whether a permutation is in the group
+    def contains(self, permutation):
+        if not set(permutation.symbols).issubset(self.symbols):
+            return False
+        images = list(permutation.extended(self.symbols).images)
+        h, depth = self.sift(images)
+        return h == range(self.degree)
+
+    def __contains__(self, permutation):
+        return self.contains(permutation)
+
+    # Determines whether every generator of this group is in another group
+    def is_subgroup(self, other):
+        return all(other.contains(generator) for generator in self.generators)
+
+    # Gets a uniformly random element, by multiplying random coset
+    # representatives down the stabiliser chain
+    def random_element(self, generator=None):
+        generator = generator or self.random
+        h = range(self.degree)
+        for level in self.levels:
+            h = level.unwind(h, generator.choice(level.orbit))
+        return Permutation.from_images(h, self.symbols)
+
+    # The base points, as symbols
+    def base(self):
+        return [self.symbols[level.base_point] for level in self.levels]
+
+    # The strong generating set
+    def strong_generators(self):
+        return [Permutation.from_images(h, self.symbols) for h in self.levels[0].generators] if self.levels else []
+
+    # Gets the stabiliser chain: the group, then the stabiliser of the first base
+    # point, then of the first two, and so on down to the trivial group
+    def stabilizer_chain(self):
+        chain = []
+        for depth in xrange(len(self.levels) + 1):
+            stabilizer = PermutationGroup.__new__(PermutationGroup)
+            stabilizer.symbols = self.symbols
+            stabilizer.degree = self.degree
+            stabilizer.levels = self.levels[depth:]
+            stabilizer.random = self.random
+            stabilizer.cache_transversals = self.cache_transversals
+            stabilizer.generators = [Permutation.from_images(h, self.symbols) for h in stabilizer.levels[0].generators] if stabilizer.levels else []
+            chain.append(stabilizer)
+        return chain
+
+
+# The symmetric group on n points, and the alternating group on n points
+def symmetric_group(n, **options):
+    symbols = range(n)
+    generators = [Permutation.from_images(range(1, n) + [0], symbols), Permutation.from_images([1, 0] + range(2, n), symbols)]
+    return PermutationGroup(generators, symbols, **options)
+
+def alternating_group(n, **options):
+    symbols = range(n)
+    generators = [Permutation.from_images([1, 2, 0] + range(3, n), symbols)]
+    if n > 3:
+        cycle = range(1, n) + [0] if n % 2 else [0] + range(2, n) + [1]
+        generators.append(Permutation.from_images(cycle, symbols))
+    return PermutationGroup(generators, symbols, **options)
+
+
+def permutation_group_tests():
+
+    s6 = symmetric_group(6, seed=1)
+    assert s6.order() == 720
+    a6 = alternating_group(6, seed=2)
+    assert a6.order() == 360
+    assert a6.is_subgroup(s6) and not s6.is_subgroup(a6)
+    assert Permutation("(012)", range(6)) in a6
+    assert Permutation("(01)", range(6)) not in a6
+    assert alternating_group(7, seed=3).order() == 2520
+
+    # Random elements are members, and the chain ends with the trivial group
+    for i in xrange(20):
+        assert a6.contains(a6.random_element())
+    chain = a6.stabilizer_chain()
+    assert chain[0].order() == 360 and chain[-1].order() == 1
+    assert all(chain[i].order() % chain[i + 1].order() == 0 for i in xrange(len(chain) - 1))
+
+    # Larger groups
+    assert symmetric_group(40, seed=4).order() == reduce(lambda a, b: a * b, xrange(1, 41))
+    cyclic = PermutationGroup([Permutation.from_images(range(1, 200) + [0], range(200))], seed=5)
+    assert cyclic.order() == 200
+
+    # The trivial group
+    trivial = PermutationGroup([Permutation("I", range(4))])
+    assert trivial.order() == 1 and trivial.contains(Permutation("I", range(4)))
@@ -1,7 +1,9 @@
-import copy
+import pickle
+from array import array
 
 # A doubly-linked symbol, also representing a cycle
 class ChainedSymbol(object):
+    __slots__ = ("symbol", "next", "previous")
 
     def __init__(self, symbol):
         super(ChainedSymbol, self).__init__()
@@ -9,6 +11,13 @@ class ChainedSymbol(object):
         self.next = self
         self.previous = self
 
+    # Slotted objects need their state spelled out to be pickled
+    def __getstate__(self):
+        return (self.symbol, self.next, self.previous)
+
+    def __setstate__(self, state):
+        self.symbol, self.next, self.previous = state
+
     def __repr__(self):
         iterator = self
         start = self.symbol
@@ -27,164 +36,277 @@ class ChainedSymbol(object):
         return repr(self)
 
 
-# A permutation - a list of cycles and dictionary from symbol to cycles
-class Permutation(object):
-
-    def __init__(self, string, symbols):
-        super(Permutation, self).__init__()
-
-        # Represent the identity either way
-        if string == 'I':
-            string = ''
+# A linked symbol of a permutation's cycles. A permutation is kept as an image
+# array, so its linked symbols are read-only, and changing one raises rather
+# than leaving the permutation as it was
+class FixedChainedSymbol(ChainedSymbol):
+    __slots__ = ()
 
-        self.cycle_list = []
-        self.symbol_dict = {}
-        cycle_open_index = 0
-        cycle_element = None
-        last_added_symbol = None
-
-        # The symbols that still have to be mapped
-        symbols_left_to_map = copy.deepcopy(symbols)
-
-        # Iterate over the string
-        for index in xrange(0, len(string)):
-            char = string[index]
-            if char == ')':
-                continue
-
-            next_char = string[index + 1]  # Don't need to worry about out-of-bounds
+    def __init__(self, symbol):
+        self.__setstate__((symbol, self, self))
 
-            if char == '(':
+    def __setstate__(self, state):
+        for name, value in zip(ChainedSymbol.__slots__, state):
+            object.__setattr__(self, name, value)
 
-                # Begin a new cycle
-                last_added_symbol = ChainedSymbol(next_char)
-                symbols_left_to_map.remove(next_char)
-                self.cycle_list.append(last_added_symbol)
-                cycle_open_index = index
+    def __setattr__(self, name, value):
+        raise AttributeError("The cycles of a permutation are read-only")
 
-            else:
+    # Links symbols into one cycle, returning the linked symbols in order
+    @staticmethod
+    def cycle(symbols):
+        chained_symbols = [FixedChainedSymbol(symbol) for symbol in symbols]
+        for index, chained_symbol in enumerate(chained_symbols):
+            chained_symbol.__setstate__((chained_symbol.symbol, chained_symbols[(index + 1) % len(chained_symbols)], chained_symbols[index - 1]))
+        return chained_symbols
 
-                # Add to the existing cycle being constructed
-                next_symbol = None
-                if next_char == ')':
 
-                    # Close off the cycle
-                    next_symbol = self.cycle_list[-1]
+# A dictionary that raises on any change
+class ReadOnlyDict(dict):
 
-                else:
+    def read_only(self, *args, **kwargs):
+        raise TypeError("The symbol dictionary of a permutation is read-only")
 
-                    # Construct the next symbol, and remove from to-map set
-                    next_symbol = ChainedSymbol(next_char)
-                    symbols_left_to_map.remove(next_char)
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = read_only
 
-                # Link
-                last_added_symbol.next = next_symbol
-                next_symbol.previous = last_added_symbol
+    def __reduce__(self):
+        return (ReadOnlyDict, (dict(self),))
 
-                # Add to dictionary
-                self.symbol_dict[next_symbol.symbol] = next_symbol
-                last_added_symbol = next_symbol
 
-        # Add remaining symbols as identity mappings
-        for symbol in symbols_left_to_map:
-            chained_symbol = ChainedSymbol(symbol)
-            self.symbol_dict[symbol] = chained_symbol
-            self.cycle_list.append(chained_symbol)
+# Gets the array type code able to hold indices of n symbols
+def image_typecode(n):
+    return 'H' if n <= 0x10000 else 'L'
 
-    # Returns a new permutation in reversed form
-    def inverse(self):
-        result = copy.deepcopy(self)
 
-        # Reverse next-previous relationship
-        for (_, chained_symbol) in result.symbol_dict.iteritems():
-            previous = chained_symbol.previous
-            chained_symbol.previous = chained_symbol.next
-            chained_symbol.next = previous
+# Characters that separate symbols inside a cycle, or cycles from each other
+SEPARATORS = ", \t\r\n"
 
-        return result
+# Splits cycle notation into '(' and ')' markers and symbol tokens in one pass.
+# Symbols in a cycle are separated by commas or whitespace, as in (1, 10, 11) or
+# (a b c). A cycle with no separators has one character per symbol, as in (041)
+def tokenize(string):
+    index = 0
+    length = len(string)
+    while index < length:
+        char = string[index]
 
-    # Prints in standard notation
-    def __str__(self):
+        if char == '(':
+            close = string.find(')', index)
+            if close == -1:
+                raise ValueError("Cycle is not closed: " + string[index:])
+            body = string[index + 1:close]
 
-        def filterer(chained_symbol):
-            return chained_symbol.next != chained_symbol
+            yield '('
+            if any(separator in body for separator in SEPARATORS):
+                for token in body.replace(',', ' ').split():
+                    yield token
+            else:
+                for token in body:
+                    yield token
+            yield ')'
+            index = close + 1
 
-        def mapper(chained_symbol):
-            return str(chained_symbol)
+        elif char in SEPARATORS:
+            index += 1
 
-        filtered_list = filter(filterer, self.cycle_list)
-        string_list = map(mapper, filtered_list)
-        return (''.join(string_list) if len(string_list) else 'I')
+        else:
+            raise ValueError("Expected a cycle at: " + string[index:])
 
 
-    # Returns the result of ba (permutations not strings)
-    @staticmethod
-    def compose(b, a, sort_output=True):
+# Parses permutations over one list of symbols. The symbols (strings or
+# integers) are sorted and given their dense indices once, and then each string
+# is read in a single pass
+class PermutationParser(object):
 
-        # Symbols could be set to the union of a and b's symbols here
-        a_dict = a.symbol_dict
-        b_dict = b.symbol_dict
+    def __init__(self, symbols):
+        super(PermutationParser, self).__init__()
+        self.symbols = sorted(symbols)
+        self.positions = dict((str(symbol), index) for index, symbol in enumerate(self.symbols))
+        self.typecode = image_typecode(len(self.symbols))
+        self.identity = array(self.typecode, xrange(len(self.symbols)))
 
-        symbols_union = set(a_dict.keys()).union(set(b_dict.keys()))
-        symbols = sorted(list(symbols_union), reverse=True) if sort_output else list(symbols_union)
-        symbols_left_to_map = copy.deepcopy(symbols)
+    # Parses one permutation in cycle notation. I is the identity
+    def parse(self, string):
+        result = Permutation('', [])
+        result.symbols = self.symbols
+        result.images = array(self.typecode, self.identity)
+
+        if string.strip() == 'I':
+            return result
+
+        positions = self.positions
+        images = result.images
+        mapped = bytearray(len(images))
+        first = None
+        previous = None
+        for token in tokenize(string):
+            if token == '(':
+                first = None
+            elif token == ')':
+
+                # Close off the cycle
+                if first != None:
+                    images[previous] = first
+            else:
+                index = positions.get(token)
+                if index == None or mapped[index]:
+                    raise ValueError("Symbol " + token + " is unknown or repeated")
+                mapped[index] = 1
+                if first == None:
+                    first = index
+                else:
+                    images[previous] = index
+                previous = index
 
-        cycle_list = []
-        symbol_dict = {}
+        return result
 
-        while symbols_left_to_map:
+    # Parses a permutation from each non-empty line of a file or list of strings
+    def parse_many(self, lines):
+        for line in lines:
+            if line.strip():
+                yield self.parse(line)
 
-            # Grab the next symbol to map
-            seed_symbol = symbols_left_to_map.pop()
 
-            # Get the bijection in a that will serve as the starting point
-            seed_chained_symbol_a = a_dict[seed_symbol]
+# A permutation - an image array over a sorted list of symbols: symbols[i] is
+# sent to symbols[images[i]]. Cycles are only worked out when asked for
+class Permutation(object):
 
-            # Construct the beginning of a new cycle that will become ba and add it to list/dict
-            current_chained_symbol_ba = ChainedSymbol(seed_symbol)
-            cycle_list.append(current_chained_symbol_ba)
+    def __init__(self, string, symbols):
+        super(Permutation, self).__init__()
+        self.chained = None
+        if string and string != 'I':
+            parsed = PermutationParser(symbols).parse(string)
+            self.symbols = parsed.symbols
+            self.images = parsed.images
+        else:
+            self.symbols = sorted(symbols)
+            self.images = array(image_typecode(len(self.symbols)), xrange(len(self.symbols)))
+
+    # Parses many permutations over the same symbols, e.g. from the lines of a file
+    @staticmethod
+    def parse_many(lines, symbols):
+        return PermutationParser(symbols).parse_many(lines)
 
-            # Define an iterator in A
-            current_chained_symbol_a = seed_chained_symbol_a
+    # Makes the permutation that sends symbols[i] to symbols[images[i]]
+    @staticmethod
+    def from_images(images, symbols):
+        result = Permutation('', [])
+        result.symbols = sorted(symbols)
+        result.images = array(image_typecode(len(symbols)), xrange(len(symbols)))
+        if result.symbols == list(symbols):
+            result.images = array(result.images.typecode, images)
+        else:
+            positions = dict((symbol, index) for index, symbol in enumerate(result.symbols))
+            for index, symbol in enumerate(symbols):
+                result.images[positions[symbol]] = positions[symbols[images[index]]]
+        return result
 
-            # Fill out the cycle that corresponds to the seed
-            while True:
+    # Gets the cycles, each starting at its smallest symbol and including fixed points
+    def cycles(self):
+        images = self.images
+        seen = bytearray(len(images))
+        result = []
+        for seed in xrange(len(images)):
+            if seen[seed]:
+                continue
+            cycle = [seed]
+            seen[seed] = 1
+            index = images[seed]
+            while index != seed:
+                cycle.append(index)
+                seen[index] = 1
+                index = images[index]
+            result.append(cycle)
+        return result
 
-                # Get the next element specified by a
-                next_a = current_chained_symbol_a.next
+    # The cycles as a tuple of doubly linked symbols, and the dictionary from
+    # symbol to linked symbol. Both are read-only, and are made when first read
+    # and again only once the images or symbols have changed
+    @property
+    def cycle_list(self):
+        return self.chained_symbols()[0]
+
+    @property
+    def symbol_dict(self):
+        return self.chained_symbols()[1]
+
+    def chained_symbols(self):
+        images = self.images.tostring()
+        chained = self.chained
+        if chained == None or chained[0] != images or chained[1] is not self.symbols:
+            cycle_list = []
+            symbol_dict = {}
+            for cycle in self.cycles():
+                chained_symbols = FixedChainedSymbol.cycle([self.symbols[index] for index in cycle])
+                for chained_symbol in chained_symbols:
+                    symbol_dict[chained_symbol.symbol] = chained_symbol
+                cycle_list.append(chained_symbols[0])
+            chained = self.chained = (images, self.symbols, tuple(cycle_list), ReadOnlyDict(symbol_dict))
+        return chained[2:]
+
+    # Gets a copy of the permutation over a larger (sorted) list of symbols
+    def extended(self, symbols):
+        if symbols == self.symbols:
+            return self
+        positions = dict((symbol, index) for index, symbol in enumerate(symbols))
+        images = array(image_typecode(len(symbols)), xrange(len(symbols)))
+        for index, symbol in enumerate(self.symbols):
+            images[positions[symbol]] = positions[self.symbols[self.images[index]]]
+        result = Permutation('', [])
+        result.symbols = symbols
+        result.images = images
+        return result
 
-                # Look up that element in b, and determine the result of applying b
-                result_ba = b_dict[next_a.symbol].next
-                result_symbol = result_ba.symbol
+    # Returns a new permutation in reversed form
+    def inverse(self):
+        result = Permutation('', [])
+        result.symbols = self.symbols
+        result.images = array(self.images.typecode, self.images)
+        for index, image in enumerate(self.images):
+            result.images[image] = index
+        return result
 
-                # Create an element in the seed's cycle, link it, add it to structures
-                resultChainedSymbol = ChainedSymbol(result_symbol)
-                symbol_dict[result_symbol] = resultChainedSymbol  # Add to dictionary
-                current_chained_symbol_ba.next = resultChainedSymbol
-                resultChainedSymbol.previous = current_chained_symbol_ba
+    # Prints in standard notation. Symbols are separated by commas when any of
+    # them is longer than one character
+    def __str__(self):
+        names = map(str, self.symbols)
+        separator = '' if all(len(name) == 1 for name in names) else ','
+        string_list = [
+            '(' + separator.join(names[index] for index in cycle) + ')'
+            for cycle in self.cycles() if len(cycle) > 1
+        ]
+        return (''.join(string_list) if len(string_list) else 'I')
 
-                # Advance the iterator in BA
-                current_chained_symbol_ba = resultChainedSymbol
+    # Permutations are equal when they move the same symbols the same way
+    def __eq__(self, other):
+        if isinstance(other, self.__class__):
+            return self.images == other.images and self.symbols == other.symbols
+        else:
+            return False
 
-                # Set iterator to the new chained symbol in a
-                current_chained_symbol_a = a_dict[result_symbol]
+    def __ne__(self, other):
+        return not self == other
 
-                # Break from the loop if we are back to where we started
-                if current_chained_symbol_a == seed_chained_symbol_a:
-                    break
-                else:
+    def __hash__(self):
+        return hash(self.images.tostring())
 
-                    # If we are not back to the beginning, we need to mark the symbol as explored
-                    symbols_left_to_map.remove(result_symbol)
+    # Returns the result of ba (permutations not strings). The result is over
+    # the sorted union of both permutations' symbols, and its cycles are
+    # always sorted, so sort_output is ignored. It is kept for old callers
+    @staticmethod
+    def compose(b, a, sort_output=True):
 
-            # Round out the cycle by connecting the last element to the first
-            current_chained_symbol_ba.previous.next = cycle_list[-1]
-            cycle_list[-1].previous = current_chained_symbol_ba.previous
-            symbol_dict[seed_symbol] = cycle_list[-1]  # Add the first chained symbol to the dict
+        # Bring both permutations onto the union of their symbols
+        if a.symbols != b.symbols:
+            symbols = sorted(set(a.symbols).union(b.symbols))
+            a = a.extended(symbols)
+            b = b.extended(symbols)
 
+        # Apply a, then b
+        b_images = b.images
         result = Permutation('', [])
-        result.cycle_list = cycle_list
-        result.symbol_dict = symbol_dict
+        result.symbols = a.symbols
+        result.images = array(a.images.typecode, [b_images[image] for image in a.images])
 
         return result
 
@@ -198,7 +320,52 @@ def permutation_tests():
     p = Permutation("(14)", symbols)
 
     assert str(Permutation.compose(pId, p)) == "(14)"
-
-    # ...
-
-     
\ No newline at end of file
+    assert str(Permutation.compose(p, pId, sort_output=False)) == "(14)"
+
+    # Composition applies the right permutation first
+    f = Permutation("(123)", symbols)
+    g = Permutation("(01)", symbols)
+    assert str(Permutation.compose(g, f)) == "(0123)"
+    assert str(Permutation.compose(f, g)) == "(0231)"
+    assert Permutation.compose(f, f.inverse()) == pId
+    assert str(f.inverse()) == "(132)"
+    assert hash(Permutation("(31)(24)", symbols)) == hash(Permutation("(13)(42)", symbols))
+
+    # The linked cycles are still available
+    assert str(f.symbol_dict["2"].next.symbol) == "3"
+    assert [str(cycle) for cycle in f.cycle_list] == ["(0)", "(123)", "(4)"]
+    assert not hasattr(f.cycle_list[0], "__dict__")
+    assert [str(cycle) for cycle in pickle.loads(pickle.dumps(f.cycle_list))] == ["(0)", "(123)", "(4)"]
+
+    # The linked cycles are read-only, and follow the images when they change
+    assert f.cycle_list is f.cycle_list and f.symbol_dict is f.symbol_dict
+    for change in [lambda: f.cycle_list.append(ChainedSymbol("5")), lambda: f.symbol_dict.pop("2"),
+                   lambda: f.symbol_dict.update({"5": ChainedSymbol("5")}), lambda: setattr(f.cycle_list[1], "next", f.cycle_list[0])]:
+        try:
+            change()
+            assert False
+        except (AttributeError, TypeError):
+            pass
+    changed = Permutation.compose(f, pId)
+    changed.images[1], changed.images[2] = changed.images[2], changed.images[1]
+    assert [str(cycle) for cycle in changed.cycle_list] == ["(0)", "(13)", "(2)", "(4)"]
+    assert pickle.loads(pickle.dumps(f.symbol_dict, 2))["2"].next.symbol == "3"
+
+    # Symbols missing from one side are fixed
+    h = Permutation("(12)", ["1", "2"])
+    assert str(Permutation.compose(h, f)) == "(23)"
+
+    # Integer and multi-character symbols
+    numbers = range(1, 13)
+    k = Permutation("(1, 10, 11)(2 12)", numbers)
+    assert str(k) == "(1,10,11)(2,12)"
+    assert Permutation(str(k), numbers) == k
+    assert str(Permutation.compose(k, k)) == "(1,11,10)"
+    names = ["a", "bb", "ccc"]
+    assert str(Permutation("(ccc, a)", names)) == "(a,ccc)"
+    assert str(Permutation("(041)", map(str, indices))) == "(041)"
+
+    # Many permutations at once
+    parsed = list(Permutation.parse_many(["(1 2)", "", "I", "(12, 11, 3)"], numbers))
+    assert len(parsed) == 3 and str(parsed[1]) == "I"
+    assert str(parsed[2]) == "(3,12,11)"
@@ -0,0 +1,455 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Products where either side has fewer coefficients than this are done the
+# schoolbook way rather than by splitting further
+KARATSUBA_CROSSOVER = 32
+
+# Products over prime fields where either side has fewer coefficients than
+# this multiply coefficient by coefficient rather than packing into integers
+KRONECKER_CROSSOVER = 32
+
+# Products over prime fields where both sides have at least this many
+# coefficients use the number theoretic transform, when p - 1 has a large
+# enough power of two and NumPy is there
+NTT_CROSSOVER = 2048
+
+# Divisions where the divisor and quotient both have at least this many
+# coefficients use a Newton iteration for the inverse of the divisor
+NEWTON_CROSSOVER = 64
+
+# Coefficient arithmetic for each field, made once per field class
+_arithmetics = {}
+
+# Gets the coefficient arithmetic of a field
+def arithmetic(field):
+    ops = _arithmetics.get(field)
+    if ops is None:
+        if field.r == 1:
+            ops = PrimeArithmetic(field)
+        elif field.get_int_tables() != None:
+            ops = TableArithmetic(field)
+        else:
+            ops = PackedArithmetic(field)
+        _arithmetics[field] = ops
+    return ops
+
+
+# Arithmetic on packed coefficients of a prime field. Sums and products of
+# lists are worked out over the integers and only reduced mod p at the end, so
+# the list operations are exact integer arithmetic
+class PrimeArithmetic(object):
+
+    def __init__(self, field):
+        super(PrimeArithmetic, self).__init__()
+        self.p = field.characteristic
+        self.primitive = field.primitive[0]
+
+    def add(self, a, b):
+        return (a + b) % self.p
+
+    def sub(self, a, b):
+        return (a - b) % self.p
+
+    def neg(self, a):
+        return -a % self.p
+
+    def mul(self, a, b):
+        return a * b % self.p
+
+    def inv(self, a):
+        if a % self.p == 0:
+            raise ZeroDivisionError("Zero has no inverse")
+        return pow(a, self.p - 2, self.p)
+
+    # Brings the result of list operations back into the field
+    def reduce(self, values):
+        p = self.p
+        return [value % p for value in values]
+
+    def add_lists(self, a, b):
+        if len(a) < len(b):
+            a, b = b, a
+        result = list(a)
+        for i, value in enumerate(b):
+            result[i] += value
+        return result
+
+    def sub_lists(self, a, b):
+        result = list(a) + [0] * (len(b) - len(a))
+        for i, value in enumerate(b):
+            result[i] -= value
+        return result
+
+    # Subtracts factor times values from result, starting at an offset
+    def submul(self, result, offset, factor, values):
+        p = self.p
+        for i, value in enumerate(values):
+            result[offset + i] = (result[offset + i] - factor * value) % p
+
+    # The integer product. Short lists multiply coefficient by coefficient,
+    # and longer ones as one product of large integers holding a coefficient
+    # every `bits` bits (Kronecker substitution). Lists can have negative
+    # entries in the middle of Karatsuba, so they are reduced first
+    def school(self, a, b):
+        if not a or not b:
+            return []
+        if min(len(a), len(b)) < KRONECKER_CROSSOVER:
+            result = [0] * (len(a) + len(b) - 1)
+            for i, factor in enumerate(b):
+                if factor:
+                    for j, value in enumerate(a):
+                        result[i + j] += factor * value
+            return result
+        p = self.p
+        a = [value % p for value in a]
+        b = [value % p for value in b]
+        bits = ((p - 1) ** 2 * min(len(a), len(b))).bit_length() + 1
+        product = pack_integer(a, bits) * pack_integer(b, bits)
+        return unpack_integer(product, bits, len(a) + len(b) - 1)
+
+
+# Arithmetic on packed coefficients of an extension field, through the flat
+# integer tables of the field. List operations give reduced results
+class TableArithmetic(object):
+
+    def __init__(self, field):
+        super(TableArithmetic, self).__init__()
+        tables = field.get_int_tables()
+        self.size = tables.size
+        self.add_table = tables.add_table
+        self.mult_table = tables.mult_table
+        self.neg_table = tables.neg_table
+        self.inv_table = tables.inv_table
+        self.xor = field.characteristic == 2
+
+    def add(self, a, b):
+        return self.add_table[a * self.size + b]
+
+    def sub(self, a, b):
+        return self.add_table[a * self.size + self.neg_table[b]]
+
+    def neg(self, a):
+        return self.neg_table[a]
+
+    def mul(self, a, b):
+        return self.mult_table[a * self.size + b]
+
+    def inv(self, a):
+        if a == 0:
+            raise ZeroDivisionError("Zero has no inverse")
+        return self.inv_table[a]
+
+    def reduce(self, values):
+        return values
+
+    def submul(self, result, offset, factor, values):
+        scaled = self.mult_table[factor * self.size:(factor + 1) * self.size]
+        if self.xor:
+            for i, value in enumerate(values):
+                result[offset + i] ^= scaled[value]
+        else:
+            add_table = self.add_table
+            neg_table = self.neg_table
+            size = self.size
+            for i, value in enumerate(values):
+                result[offset + i] = add_table[result[offset + i] * size + neg_table[scaled[value]]]
+
+    def add_lists(self, a, b):
+        if len(a) < len(b):
+            a, b = b, a
+        result = list(a)
+        if self.xor:
+            for i, value in enumerate(b):
+                result[i] ^= value
+        else:
+            add_table = self.add_table
+            size = self.size
+            for i, value in enumerate(b):
+                result[i] = add_table[result[i] * size + value]
+        return result
+
+    def sub_lists(self, a, b):
+        if self.xor:
+            return self.add_lists(a, b)
+        neg_table = self.neg_table
+        return self.add_lists(a, [neg_table[value] for value in b])
+
+    def school(self, a, b):
+        if not a or not b:
+            return []
+        if len(a) < len(b):
+            a, b = b, a
+        size = self.size
+        add_table = self.add_table
+        mult_table = self.mult_table
+        result = [0] * (len(a) + len(b) - 1)
+        for i, factor in enumerate(b):
+            if factor:
+                scaled = mult_table[factor * size:(factor + 1) * size]
+                if self.xor:
+                    for j, value in enumerate(a):
+                        result[i + j] ^= scaled[value]
+                else:
+                    for j, value in enumerate(a):
+                        result[i + j] = add_table[result[i + j] * size + scaled[value]]
+        return result
+
+
+# Arithmetic on packed coefficients of an extension field too large for
+# tables, through the field's packed arithmetic
+class PackedArithmetic(object):
+
+    def __init__(self, field):
+        super(PackedArithmetic, self).__init__()
+        self.field = field
+        self.add = field.packed_add
+        self.neg = field.packed_neg
+        self.mul = field.packed_mult
+        self.inv = field.packed_inverse
+
+    def sub(self, a, b):
+        return self.add(a, self.neg(b))
+
+    def reduce(self, values):
+        return values
+
+    def submul(self, result, offset, factor, values):
+        sub = self.sub
+        mul = self.mul
+        for i, value in enumerate(values):
+            result[offset + i] = sub(result[offset + i], mul(factor, value))
+
+    def add_lists(self, a, b):
+        if len(a) < len(b):
+            a, b = b, a
+        add = self.add
+        return [add(x, y) for x, y in zip(a, b)] + a[len(b):]
+
+    def sub_lists(self, a, b):
+        neg = self.neg
+        return self.add_lists(a, [neg(value) for value in b])
+
+    def school(self, a, b):
+        if not a or not b:
+            return []
+        add = self.add
+        mul = self.mul
+        result = [0] * (len(a) + len(b) - 1)
+        for i, factor in enumerate(b):
+            if factor:
+                for j, value in enumerate(a):
+                    result[i + j] = add(result[i + j], mul(factor, value))
+        return result
+
+
+# Packs non-negative integers into one integer, `bits` bits each, lowest first
+def pack_integer(values, bits):
+    return int("".join(format(value, "0" + str(bits) + "b") for value in reversed(values)) or "0", 2)
+
+# Unpacks `count` integers of `bits` bits each, lowest first
+def unpack_integer(value, bits, count):
+    digits = format(value, "b").zfill(bits * count)
+    end = len(digits)
+    return [int(digits[end - (i + 1) * bits:end - i * bits], 2) for i in xrange(count)]
+
+# Removes the zero coefficients from the top of a list
+def trim(coefficients):
+    end = len(coefficients)
+    while end and not coefficients[end - 1]:
+        end -= 1
+    return coefficients[:end] if end != len(coefficients) else coefficients
+
+# Multiplies lists by Karatsuba's method: with a = a0 + a1 x^h and
+# b = b0 + b1 x^h, the middle term a0 b1 + a1 b0 is (a0 + a1)(b0 + b1) less the
+# other two, so each split takes three products instead of four. The result is
+# not reduced
+def karatsuba(ops, a, b):
+    if len(a) < len(b):
+        a, b = b, a
+    if len(b) < KARATSUBA_CROSSOVER:
+        return ops.school(a, b)
+
+    half = len(a) // 2
+    a0, a1 = a[:half], a[half:]
+
+    # Only the longer side splits when the other fits in one half
+    if len(b) <= half:
+        low = karatsuba(ops, a0, b)
+        high = karatsuba(ops, a1, b)
+        result = low + [0] * (len(a) + len(b) - 1 - len(low))
+        result[half:half + len(high)] = ops.add_lists(result[half:half + len(high)], high)
+        return result
+
+    b0, b1 = b[:half], b[half:]
+    low = karatsuba(ops, a0, b0)
+    high = karatsuba(ops, a1, b1)
+    middle = karatsuba(ops, ops.add_lists(a0, a1), ops.add_lists(b0, b1))
+    middle = ops.sub_lists(ops.sub_lists(middle, low), high)
+
+    result = low + [0] * (len(a) + len(b) - 1 - len(low))
+    result[half:half + len(middle)] = ops.add_lists(result[half:half + len(middle)], middle)
+    start = 2 * half
+    result[start:start + len(high)] = ops.add_lists(result[start:start + len(high)], high)
+    return result[:len(a) + len(b) - 1]
+
+# Transforms an int64 array of length 2^k mod p, with a primitive 2^k-th root of
+# unity. Iterative radix-2 on inputs in bit-reversed order, with each stage done
+# as whole-array operations. Needs p < 2^31 so products fit in 64 bits
+def ntt(values, root, p):
+    n = len(values)
+    bits = n.bit_length() - 1
+    index = np.arange(n)
+    reversed_index = np.zeros(n, dtype=np.int64)
+    for bit in xrange(bits):
+        reversed_index |= ((index >> bit) & 1) << (bits - 1 - bit)
+    values = values[reversed_index]
+
+    # Powers of the root, of which each stage takes every (n / length)th
+    powers = [1] * max(n // 2, 1)
+    for i in xrange(1, n // 2):
+        powers[i] = powers[i - 1] * root % p
+    powers = np.array(powers, dtype=np.int64)
+
+    length = 2
+    while length <= n:
+        half = length // 2
+        blocks = values.reshape(n // length, length)
+        u = blocks[:, :half]
+        v = blocks[:, half:] * powers[::n // length][:half] % p
+        values = np.concatenate(((u + v) % p, (u - v) % p), axis=1).ravel()
+        length *= 2
+    return values
+
+# Multiplies lists over a prime field with the NTT, or returns None when p is
+# too large or p - 1 has too small a power of two for the length of the product
+def ntt_multiply(ops, a, b):
+    p = ops.p
+    count = len(a) + len(b) - 1
+    n = 1
+    while n < count:
+        n *= 2
+    if np is None or p >= 1 << 31 or (p - 1) % n:
+        return None
+
+    root = pow(ops.primitive, (p - 1) // n, p)
+    fa = np.zeros(n, dtype=np.int64)
+    fb = np.zeros(n, dtype=np.int64)
+    fa[:len(a)] = [value % p for value in a]
+    fb[:len(b)] = [value % p for value in b]
+    product = ntt(ntt(fa, root, p) * ntt(fb, root, p) % p, pow(root, p - 2, p), p)
+    return (product[:count] * pow(n, p - 2, p) % p).tolist()
+
+# Multiplies two lists of packed coefficients, giving a reduced, trimmed list.
+# Prime fields take one product of large integers (which CPython itself does
+# by Karatsuba), or the NTT for long products when p allows. Extension fields
+# use Karatsuba over the field tables
+def multiply(field, a, b):
+    if not a or not b:
+        return []
+    ops = arithmetic(field)
+    if field.r == 1:
+        if min(len(a), len(b)) >= NTT_CROSSOVER:
+            product = ntt_multiply(ops, a, b)
+            if product is not None:
+                return trim(product)
+        return trim(ops.reduce(ops.school(a, b)))
+    return trim(karatsuba(ops, a, b))
+
+# Gets the inverse of a power series mod x^precision, by Newton's iteration
+# g <- g (2 - f g), which doubles the number of correct coefficients each time
+def series_inverse(field, series, precision):
+    ops = arithmetic(field)
+    inverse = [ops.inv(series[0])]
+    known = 1
+    while known < precision:
+        known = min(2 * known, precision)
+        error = multiply(field, series[:known], inverse)[:known]
+        residual = trim(ops.reduce(ops.sub_lists([1], error)))
+        inverse = trim(ops.reduce(ops.add_lists(inverse, multiply(field, inverse, residual)[:known])))
+    return inverse
+
+# Divides lists of packed coefficients, giving the quotient and remainder
+def divide(field, a, b):
+    b = trim(b)
+    if not b:
+        raise ZeroDivisionError("Polynomial division by zero")
+    a = trim(a)
+    if len(a) < len(b):
+        return [], a
+
+    ops = arithmetic(field)
+    count = len(a) - len(b) + 1
+
+    # Large divisions find the quotient from the reversed polynomials: rev(a) / rev(b) mod x^count
+    if len(b) >= NEWTON_CROSSOVER and count >= NEWTON_CROSSOVER:
+        reversed_b = b[::-1]
+        inverse = series_inverse(field, reversed_b, count)
+        quotient = multiply(field, a[::-1][:count], inverse)[:count]
+        quotient = trim((quotient + [0] * (count - len(quotient)))[::-1])
+        remainder = trim(ops.reduce(ops.sub_lists(a, multiply(field, quotient, b)))[:len(b) - 1])
+        return quotient, remainder
+
+    # Otherwise long division, clearing the top coefficient each step
+    remainder = list(a)
+    quotient = [0] * count
+    lead_inverse = ops.inv(b[-1])
+    top = len(b) - 1
+    for power in xrange(count - 1, -1, -1):
+        coef = remainder[power + top]
+        if coef:
+            factor = ops.mul(coef, lead_inverse)
+            quotient[power] = factor
+            ops.submul(remainder, power, factor, b)
+    return trim(quotient), trim(remainder[:top])
+
+# Gets (g, s) for lists of packed coefficients, with g the monic greatest
+# common divisor of a and b and s a = g mod b. When both are zero, so is g
+def gcd_cofactor(field, a, b):
+    ops = arithmetic(field)
+    r0, r1 = trim(list(a)), trim(list(b))
+    s0, s1 = [1], []
+    while r1:
+        quotient, remainder = divide(field, r0, r1)
+        r0, r1 = r1, remainder
+        s0, s1 = s1, trim(ops.reduce(ops.sub_lists(s0, multiply(field, quotient, s1))))
+
+    if not r0:
+        return r0, s0
+    inverse = ops.inv(r0[-1])
+    return [ops.mul(value, inverse) for value in r0], [ops.mul(value, inverse) for value in s0]
+
+# Gets (g, s, t) for lists of packed coefficients, with g the monic greatest
+# common divisor of a and b and s a + t b = g. t is (g - s a) / b, which
+# divides exactly
+def extended_gcd(field, a, b):
+    g, s = gcd_cofactor(field, a, b)
+    if not trim(list(b)):
+        return g, s, []
+    ops = arithmetic(field)
+    return g, s, divide(field, trim(ops.reduce(ops.sub_lists(g, multiply(field, s, a)))), b)[0]
+
+# Gets the inverse of a list of packed coefficients mod another, which it must
+# share no factor with
+def inverse_mod(field, a, modulus):
+    g, s = gcd_cofactor(field, a, modulus)
+    if len(g) != 1:
+        raise ValueError("Polynomial has no inverse mod a polynomial it shares a factor with")
+    return divide(field, s, modulus)[1]
+
+# Raises a list of packed coefficients to a non-negative power mod another, by
+# square and multiply
+def power_mod(field, base, exponent, modulus):
+    if exponent < 0:
+        raise ValueError("Polynomials can only be raised to non-negative powers")
+    result = divide(field, [1], modulus)[1]
+    base = divide(field, base, modulus)[1]
+    while exponent:
+        if exponent & 1:
+            result = divide(field, multiply(field, result, base), modulus)[1]
+        exponent >>= 1
+        if exponent:
+            base = divide(field, multiply(field, base, base), modulus)[1]
+    return result
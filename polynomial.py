@@ -0,0 +1,344 @@
+from fields import *
+from polyarithmetic import *
+
+# A polynomial in one variable over a finite field. Coefficients are kept as
+# packed integers, lowest power first, with no zeros at the top, so the zero
+# polynomial has no coefficients. Polynomials never change once made
+class Polynomial(object):
+    __slots__ = ("field", "coefficients")
+
+    def __init__(self, field, coefficients=()):
+        super(Polynomial, self).__init__()
+        self.field = field
+        self.coefficients = trim(list(coefficients))
+
+    # The field is pickled as the arguments that make it
+    def __getstate__(self):
+        return (field_recipe(self.field), self.coefficients)
+
+    def __setstate__(self, state):
+        recipe, self.coefficients = state
+        self.field = field_from_recipe(recipe)
+
+    # Makes a polynomial from a list of field members, lowest power first
+    @staticmethod
+    def from_members(field, members):
+        return Polynomial(field, [member.value for member in members])
+
+    # The polynomial x
+    @staticmethod
+    def x(field):
+        return Polynomial(field, [0, 1])
+
+    # A polynomial of degree 0 (or the zero polynomial)
+    @staticmethod
+    def constant(field, member):
+        return Polynomial(field, [member.value])
+
+    # The monic polynomial with the given roots: (x - root) for each root
+    @staticmethod
+    def from_roots(field, roots):
+        result = Polynomial(field, [1])
+        for root in roots:
+            result = result * Polynomial(field, [(-root).value, 1])
+        return result
+
+    # The coefficients as field members, lowest power first
+    def to_members(self):
+        return [self.field.from_int(value) for value in self.coefficients]
+
+    # The degree, with -1 for the zero polynomial
+    def degree(self):
+        return len(self.coefficients) - 1
+
+    def is_zero(self):
+        return not self.coefficients
+
+    def leading(self):
+        return self.field.from_int(self.coefficients[-1]) if self.coefficients else self.field.add_id()
+
+    def is_monic(self):
+        return bool(self.coefficients) and self.coefficients[-1] == 1
+
+    # The polynomial scaled to have leading coefficient 1
+    def monic(self):
+        if self.is_monic() or self.is_zero():
+            return self
+        ops = arithmetic(self.field)
+        inverse = ops.inv(self.coefficients[-1])
+        return Polynomial(self.field, [ops.mul(value, inverse) for value in self.coefficients])
+
+    # The formal derivative. Each power is an integer below p, which is its own
+    # packed value, so it multiplies the coefficient directly
+    def derivative(self):
+        ops = arithmetic(self.field)
+        p = self.field.characteristic
+        return Polynomial(self.field, [ops.mul(value, power % p) for power, value in enumerate(self.coefficients[1:], 1)])
+
+    # Evaluates at a field member by Horner's rule
+    def __call__(self, member):
+        ops = arithmetic(self.field)
+        point = member.value
+        result = 0
+        for value in reversed(self.coefficients):
+            result = ops.add(ops.mul(result, point), value)
+        return self.field.from_int(result)
+
+    def check_field(self, other):
+        if not isinstance(other, Polynomial):
+            raise TypeError("Can only combine a polynomial with another polynomial")
+        if other.field is not self.field:
+            raise TypeError("Polynomials are over different fields")
+
+    def __add__(self, other):
+        self.check_field(other)
+        ops = arithmetic(self.field)
+        return Polynomial(self.field, ops.reduce(ops.add_lists(self.coefficients, other.coefficients)))
+
+    def __sub__(self, other):
+        self.check_field(other)
+        ops = arithmetic(self.field)
+        return Polynomial(self.field, ops.reduce(ops.sub_lists(self.coefficients, other.coefficients)))
+
+    def __neg__(self):
+        ops = arithmetic(self.field)
+        return Polynomial(self.field, [ops.neg(value) for value in self.coefficients])
+
+    # Multiplies by another polynomial or by a field member
+    def __mul__(self, other):
+        if isinstance(other, FiniteField):
+            ops = arithmetic(self.field)
+            factor = other.value
+            return Polynomial(self.field, [ops.mul(value, factor) for value in self.coefficients])
+        self.check_field(other)
+        return Polynomial(self.field, multiply(self.field, self.coefficients, other.coefficients))
+
+    __rmul__ = __mul__
+
+    def __divmod__(self, other):
+        self.check_field(other)
+        quotient, remainder = divide(self.field, self.coefficients, other.coefficients)
+        return Polynomial(self.field, quotient), Polynomial(self.field, remainder)
+
+    def __floordiv__(self, other):
+        return divmod(self, other)[0]
+
+    def __mod__(self, other):
+        return divmod(self, other)[1]
+
+    def __pow__(self, exponent, modulus=None):
+        if modulus is not None:
+            return self.powmod(exponent, modulus)
+        if exponent < 0:
+            raise ValueError("Polynomials can only be raised to non-negative powers")
+        result = Polynomial(self.field, [1])
+        base = self
+        while exponent:
+            if exponent & 1:
+                result = result * base
+            base = base * base
+            exponent >>= 1
+        return result
+
+    # Raises to a power mod another polynomial, by square and multiply
+    def powmod(self, exponent, modulus):
+        self.check_field(modulus)
+        return Polynomial(self.field, power_mod(self.field, self.coefficients, exponent, modulus.coefficients))
+
+    # The monic greatest common divisor
+    def gcd(self, other):
+        a, b = self, other
+        while not b.is_zero():
+            a, b = b, a % b
+        return a.monic()
+
+    # Gets (g, s, t) with g the monic greatest common divisor and s self + t other = g
+    def extended_gcd(self, other):
+        self.check_field(other)
+        return tuple(Polynomial(self.field, values) for values in extended_gcd(self.field, self.coefficients, other.coefficients))
+
+    # Gets the inverse mod another polynomial, which must be coprime to this one
+    def inverse_mod(self, modulus):
+        self.check_field(modulus)
+        return Polynomial(self.field, inverse_mod(self.field, self.coefficients, modulus.coefficients))
+
+    # Determines whether the polynomial has no factors of lower degree, by
+    # Rabin's test: with q the field size and n the degree, x^(q^n) = x mod
+    # the polynomial, and x^(q^(n/d)) - x shares no factor with it for every
+    # prime d dividing n
+    def is_irreducible(self):
+        n = self.degree()
+        if n < 1:
+            return False
+        if n == 1:
+            return True
+
+        q = self.field.size()
+        x = Polynomial.x(self.field)
+        checks = set(n // d for d in prime_factors(n))
+        power = x
+        for k in xrange(1, n + 1):
+            power = power.powmod(q, self)
+            if k in checks and (power - x).gcd(self).degree() != 0:
+                return False
+        return power == x % self
+
+    # Determines whether the polynomial is irreducible and x has order q^n - 1
+    # mod it, so that x generates the multiplicative group of the extension
+    # field it makes
+    def is_primitive(self):
+        n = self.degree()
+        if n < 1 or self.coefficients[0] == 0 or not self.is_irreducible():
+            return False
+        order = self.field.size() ** n - 1
+        x = Polynomial.x(self.field)
+        one = Polynomial(self.field, [1])
+        for factor in prime_factors(order):
+            if x.powmod(order // factor, self) == one:
+                return False
+        return True
+
+    def __eq__(self, other):
+        if isinstance(other, Polynomial):
+            return self.field is other.field and self.coefficients == other.coefficients
+        return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.field, tuple(self.coefficients)))
+
+    # Writes the polynomial as a string, in x over prime fields and in y over
+    # extension fields (whose members are already written in x)
+    def __unicode__(self):
+        if self.is_zero():
+            return "0"
+        variable = "x" if self.field.r == 1 else "y"
+        written_terms = []
+        for power, value in reversed(list(enumerate(self.coefficients))):
+            if value == 0:
+                continue
+            coef = unicode(self.field.from_int(value))
+            if " " in coef:
+                coef = "(" + coef + ")"
+            term = coef if value != 1 or power == 0 else ""
+            if power != 0:
+                term += variable
+            if power > 1:
+                term += "^" + str(power)
+            written_terms.append(term)
+        return " + ".join(written_terms)
+
+    def __repr__(self):
+        return "Polynomial(" + self.field.__name__ + ", " + self.__unicode__() + ")"
+
+
+# Gets the first monic polynomial of a degree over a field, in packed order of
+# the lower coefficients, that passes a test
+def search_polynomial(field, degree, test):
+    q = field.size()
+    lower = 1
+    while lower < q ** degree:
+        coefficients = []
+        value = lower
+        while len(coefficients) < degree:
+            coefficients.append(value % q)
+            value //= q
+        polynomial = Polynomial(field, coefficients + [1])
+        if test(polynomial):
+            return polynomial
+        lower += 1
+    raise ValueError("No polynomial found")
+
+# Finds an irreducible monic polynomial of a degree over a field
+def irreducible_polynomial(field, degree):
+    return search_polynomial(field, degree, Polynomial.is_irreducible)
+
+# Finds a primitive monic polynomial of a degree over a field
+def primitive_polynomial(field, degree):
+    return search_polynomial(field, degree, Polynomial.is_primitive)
+
+
+def polynomial_tests():
+
+    # Products agree with the field's own polynomial multiplication
+    a = Polynomial.from_members(F7, [F7("3"), F7("1")])
+    b = Polynomial.from_members(F7, [F7("4"), F7("6"), F7("1")])
+    assert (a * b).to_members() == [F7("5"), F7("1"), F7("2"), F7("1")]
+    assert unicode(a * b) == "x^3 + 2x^2 + x + 5"
+    assert unicode(Polynomial.from_members(F9, [F9("x + 1"), F9("0"), F9("2x")])) == "2xy^2 + (x + 1)"
+
+    # Karatsuba, the NTT and the schoolbook method agree
+    for field in [F7, F9, F16, GF(257)]:
+        ops = arithmetic(field)
+        a = [(i * 5 + 3) % field.size() for i in xrange(150)]
+        b = [(i * i + 1) % field.size() for i in xrange(131)]
+        school = trim(ops.reduce(ops.school(a, b)))
+        assert trim(ops.reduce(karatsuba(ops, a, b))) == school
+        assert multiply(field, a, b) == school
+        assert trim(ops.reduce(karatsuba(ops, a, b[:20]))) == trim(ops.reduce(ops.school(a, b[:20])))
+    if np is not None:
+        ops = arithmetic(GF(257))
+        a = [(i * 5 + 3) % 257 for i in xrange(100)]
+        assert ntt_multiply(ops, a, a[::-1]) == ops.reduce(ops.school(a, a[::-1]))
+    assert ntt_multiply(arithmetic(F7), [1] * 10, [1] * 10) is None
+
+    # Division: a = q b + r, with long division and the Newton inverse
+    for field, length in [(F5, 20), (F16, 200), (GF(257), 200)]:
+        a = Polynomial(field, [(i * 7 + 2) % field.size() for i in xrange(2 * length)])
+        b = Polynomial(field, [(i * 3 + 1) % field.size() for i in xrange(length)] + [1])
+        quotient, remainder = divmod(a, b)
+        assert quotient * b + remainder == a and remainder.degree() < b.degree()
+        assert divide(field, a.coefficients, b.coefficients) == (quotient.coefficients, remainder.coefficients)
+    try:
+        divmod(a, Polynomial(a.field))
+        assert False
+    except ZeroDivisionError:
+        pass
+
+    # Greatest common divisors and inverses
+    x = Polynomial.x(F5)
+    one = Polynomial(F5, [1])
+    f = (x + one) * (x + one) * (x - one)
+    g = (x + one) * (x * x + one + one)
+    assert f.gcd(g) == x + one
+    d, s, t = f.extended_gcd(g)
+    assert d == x + one and s * f + t * g == d
+    modulus = x * x * x + x + one
+    assert ((x * x).inverse_mod(modulus) * x * x) % modulus == one
+    assert x.powmod(5 ** 3, modulus) == x and x ** 3 == x * x * x
+
+    # Irreducible and primitive polynomials, including over an extension field
+    for (p, r), poly in CONWAY_POLYNOMIALS.items():
+        assert Polynomial(GF(p), poly).is_primitive()
+    assert not Polynomial(F2, [1, 0, 1]).is_irreducible()
+    assert Polynomial(F2, [1, 1, 1, 1, 1]).is_irreducible() and not Polynomial(F2, [1, 1, 1, 1, 1]).is_primitive()
+    assert primitive_polynomial(F2, 9).coefficients == find_primitive_poly(2, 9)
+    y = Polynomial.x(F4)
+    quadratic = irreducible_polynomial(F4, 2)
+    assert quadratic.is_irreducible() and all(quadratic(member) != F4("0") for member in F4.all_values())
+    assert not (y * y + Polynomial.constant(F4, F4("x"))).is_irreducible()
+
+    # Reed-Solomon: codewords are multiples of the generator, so vanish at its roots
+    alpha = F16("x")
+    roots = [alpha]
+    for i in xrange(3):
+        roots.append(roots[-1] * alpha)
+    generator = Polynomial.from_roots(F16, roots)
+    message = Polynomial.from_members(F16, [F16("x + 1"), F16("0"), F16("x^3"), F16("1")])
+    codeword = message * generator
+    assert all(codeword(root) == F16("0") for root in roots)
+    assert codeword // generator == message
+    assert pickle.loads(pickle.dumps(codeword)) == codeword
+    assert Polynomial(F16, [1, 1, 1]).derivative() == Polynomial(F16, [1])
+    assert Polynomial(F9, [1, 4, 5, 7, 2]).derivative() == Polynomial(F9, [4, 7, 0, 2])
+    large = GF(1000000007)
+    assert Polynomial(large, [5, 3, 0, 1000000006]).derivative() == Polynomial(large, [3, 0, 1000000004])
+
+    # Polynomials over fields without tables
+    field = GF(2, 16)
+    a = Polynomial(field, [(i * 7919 + 1) % field.size() for i in xrange(40)])
+    b = Polynomial(field, [(i * 104729 + 3) % field.size() for i in xrange(35)])
+    quotient, remainder = divmod(a * b + Polynomial(field, [5]), b)
+    assert isinstance(arithmetic(field), PackedArithmetic) and quotient == a and remainder == Polynomial(field, [5])
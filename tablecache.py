@@ -0,0 +1,167 @@
+import os
+import sys
+import mmap
+import zlib
+import struct
+import hashlib
+import tempfile
+from array import array
+
+# Bump whenever the file layout or the meaning of a table changes. Files with
+# another version are treated as stale and rebuilt
+VERSION = 1
+
+MAGIC = b"DMFTABLE"
+
+# Magic, version, byte order, key length, payload length, payload checksum
+HEADER = struct.Struct("<8sIBIQI")
+
+# The directory tables are cached in. None turns caching off
+cache_dir = os.environ.get("DISCRETE_MATH_TABLE_CACHE") or None
+
+# Turns the cache on (in the given directory) or off (None)
+def set_cache_dir(path):
+    global cache_dir
+    cache_dir = path
+
+# Describes the field a set of tables belongs to
+def table_key(characteristic, r, irreducible_poly, primitive):
+    return "%d;%d;%s;%s" % (characteristic, r, ",".join(map(str, irreducible_poly)), ",".join(map(str, primitive)))
+
+def cache_path(key):
+    digest = hashlib.sha1(key.encode("ascii")).hexdigest()[:20]
+    return os.path.join(cache_dir, "field-" + digest + ".tbl")
+
+# Loads the antilog, log and Zech tables for a field. The file is mapped rather
+# than read, the checksum is taken over the mapping itself, and each table is
+# filled straight from its part of the mapping. Returns None on a miss, and
+# removes files that are stale or fail their checksum
+def load_tables(key, size):
+    if cache_dir == None:
+        return None
+
+    path = cache_path(key)
+    try:
+        handle = open(path, "rb")
+    except IOError:
+        return None
+
+    try:
+        try:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            mapped = None
+        if mapped == None or len(mapped) < HEADER.size:
+            invalidate(key)
+            return None
+
+        try:
+            magic, version, big_endian, key_length, payload_length, checksum = HEADER.unpack_from(mapped, 0)
+            payload_start = HEADER.size + key_length
+            itemsize = array("i").itemsize
+            expected_length = (2 * (size - 1) + size) * itemsize
+
+            valid = (magic == MAGIC and version == VERSION and
+                     big_endian == (sys.byteorder == "big") and
+                     mapped[HEADER.size:payload_start] == key.encode("ascii") and
+                     payload_length == expected_length and
+                     len(mapped) == payload_start + payload_length)
+            if valid:
+                valid = zlib.crc32(buffer(mapped, payload_start)) & 0xffffffff == checksum
+            if not valid:
+                invalidate(key)
+                return None
+
+            # Split the payload into its three tables
+            tables = []
+            offset = payload_start
+            for length in (size - 1, size, size - 1):
+                table = array("i")
+                table.fromstring(buffer(mapped, offset, length * itemsize))
+                tables.append(table)
+                offset += length * itemsize
+            return tables
+
+        finally:
+            mapped.close()
+    finally:
+        handle.close()
+
+# Saves the antilog, log and Zech tables for a field. Writes to a temporary
+# file first so other processes never map a half-written table
+def store_tables(key, int_log_table, int_log_table_reverse, zech_table):
+    if cache_dir == None:
+        return
+
+    payload = b"".join(array("i", table).tostring() for table in (int_log_table, int_log_table_reverse, zech_table))
+    key_bytes = key.encode("ascii")
+    header = HEADER.pack(MAGIC, VERSION, sys.byteorder == "big", len(key_bytes), len(payload), zlib.crc32(payload) & 0xffffffff)
+
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as handle:
+            handle.write(header)
+            handle.write(key_bytes)
+            handle.write(payload)
+        os.rename(temp_path, cache_path(key))
+
+    # A cache that cannot be written just means tables get rebuilt next time
+    except (IOError, OSError):
+        pass
+
+# Removes the cached tables for a field
+def invalidate(key):
+    if cache_dir == None:
+        return
+    try:
+        os.remove(cache_path(key))
+    except OSError:
+        pass
+
+# Removes every cached table
+def clear_cache():
+    if cache_dir == None or not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if name.startswith("field-") and name.endswith(".tbl"):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def table_cache_tests():
+
+    from fields import GF, FieldTables
+
+    previous_dir = cache_dir
+    set_cache_dir(tempfile.mkdtemp())
+    try:
+        field = GF(3, 4)
+        key = table_key(field.characteristic, field.r, field.irreducible_poly, field.primitive)
+        clear_cache()
+
+        # Building the tables stores them, and a second build maps them back
+        built = FieldTables(field)
+        loaded = load_tables(key, field.size())
+        assert list(loaded[0]) == list(built.int_log_table)
+        assert list(loaded[1]) == list(built.int_log_table_reverse)
+        assert list(loaded[2]) == list(built.zech_table)
+        assert FieldTables(field).mult_table == built.mult_table
+
+        # Loading the tables does not make the flat tables until they are used
+        assert "add_table" not in vars(FieldTables(field))
+
+        # A corrupted file fails its checksum and is removed
+        with open(cache_path(key), "r+b") as handle:
+            handle.seek(-1, os.SEEK_END)
+            handle.write(b"\x7f")
+        assert load_tables(key, field.size()) == None
+        assert not os.path.exists(cache_path(key))
+
+    finally:
+        clear_cache()
+        os.rmdir(cache_dir)
+        set_cache_dir(previous_dir)